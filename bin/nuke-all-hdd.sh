@@ -1,13 +1,8 @@
 #!/bin/bash
 
-cd /tmp
-hdds=$(ls -1 *.vdi 2>/dev/null)
-if [ "$?" -ne "0" ]; then
-	echo "No hdd to nuke."
-	exit 0
-fi
-for hdd in $(ls -1 *.vdi); do
-	echo -n "Nuking hdd $hdd "
-	rm $hdd
-	echo "done"
-done
+# delete the unregistered .vdi images left in /tmp, --orphaned-media also
+# closes and deletes every hard disk on the host no vm uses, see
+# virtbox/teardown.py for the options
+cd "$(dirname "$0")/.." || exit 1
+exec bin/virtual-env-exec python -m virtbox.teardown --no-vms \
+	--stray-dir /tmp --extension .vdi "$@"
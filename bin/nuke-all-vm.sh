@@ -1,12 +1,6 @@
 #!/bin/bash
 
-vms=$(VBoxManage list vms | cut -d' ' -f 1 | sed -e 's/"//g')
-if [ -z "$vms" ] ; then
-	echo "No vms to nuke."
-	exit 0
-fi
-for v in $vms; do
-	echo -n "Nuking VM $v "
-	VBoxManage unregistervm $v --delete
-	echo "done."
-done
+# power off, unregister and delete every vm, see virtbox/teardown.py for
+# the options, e.g. --prefix, --older-than and --dry-run
+cd "$(dirname "$0")/.." || exit 1
+exec bin/virtual-env-exec python -m virtbox.teardown "$@"
@@ -18,3 +18,13 @@ formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s')
 hdlr.setFormatter(formatter)
 logger.addHandler(hdlr)
 logger.setLevel(logging.DEBUG)
+
+
+def catch(exception_class, func, *args, **kwargs):
+    """ Call func and return the exception_class instance it raised.
+    """
+    try:
+        func(*args, **kwargs)
+    except exception_class as exc:
+        return exc
+    raise AssertionError('%s not raised' % exception_class.__name__)
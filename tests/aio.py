@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the unit tests for the aio module.
+
+:copyright: (c) 2012 by Sean Plaice
+:license: ISC, see LICENSE for more details.
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import testify
+
+from virtbox import aio, cache, commands, events
+from virtbox.errors import CommandError, CommandTimeout, CommandCancelled
+from virtbox.retry import RetryPolicy
+from virtbox.utils import deadline
+from virtbox.parsers import parse_createhd
+
+from tests import catch
+
+
+# setup module level logger
+logger = logging.getLogger(__name__)
+
+
+CREATEHD_OUT = 'Disk image created. UUID: e0bfd47f-5a29-4c5e-b325-79c4d032a02f'
+
+SIMULATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+    'tools', 'vboxmanage_sim.py')
+
+
+class RunCmdTestCase(testify.TestCase):
+    @testify.teardown
+    def reset_concurrency(self):
+        aio.set_concurrency(aio.DEFAULT_CONCURRENCY)
+
+    def test_run_cmd(self):
+        stdout, stderr = asyncio.run(aio.run_cmd([sys.executable, '-c',
+            'print("hello")']))
+        testify.assert_equal(stdout, 'hello\n')
+
+    def test_run_cmd_failure(self):
+        argv = [sys.executable, '-c', 'import sys; sys.exit(2)']
+        exc = catch(CommandError, asyncio.run, aio.run_cmd(argv))
+        testify.assert_equal(exc.status_code, 2)
+
+    def test_run_cmd_missing_binary(self):
+        exc = catch(CommandError, asyncio.run,
+                aio.run_cmd(['/nonexistent/VBoxManage']))
+        testify.assert_equal(exc.status_code, 127)
+
+    def test_concurrency_limit(self):
+        aio.set_concurrency(2)
+        argv = [sys.executable, '-c', 'import time; time.sleep(0.2)']
+
+        async def run_many():
+            await asyncio.gather(*[aio.run_cmd(argv) for _ in range(4)])
+
+        start = time.time()
+        asyncio.run(run_many())
+        testify.assert_gte(time.time() - start, 0.4)
+
+    def test_run_cmd_timeout(self):
+        argv = [sys.executable, '-c', 'import time; time.sleep(30)']
+        start = time.time()
+        exc = catch(CommandTimeout, asyncio.run,
+                aio.run_cmd(argv, timeout=0.2))
+        testify.assert_equal(exc.timeout, 0.2)
+        testify.assert_lt(time.time() - start, 5)
+
+    def test_run_cmd_cancelled(self):
+        argv = [sys.executable, '-c', 'import time; time.sleep(30)']
+        cancel = threading.Event()
+
+        async def run():
+            with deadline(cancel=cancel):
+                await aio.run_cmd(argv)
+
+        threading.Timer(0.2, cancel.set).start()
+        start = time.time()
+        catch(CommandCancelled, asyncio.run, run())
+        testify.assert_lt(time.time() - start, 5)
+
+    def test_retry_backoff_cancelled(self):
+        argv = [sys.executable, '-c',
+            'import sys; sys.exit("VBoxManage: error: The session is busy")']
+        policy = RetryPolicy(base_delay=30, jitter=False)
+        cancel = threading.Event()
+
+        async def run():
+            with deadline(cancel=cancel):
+                await aio.run_cmd(argv, retry=policy)
+
+        threading.Timer(0.2, cancel.set).start()
+        start = time.time()
+        catch(CommandCancelled, asyncio.run, run())
+        testify.assert_lt(time.time() - start, 5)
+
+
+class CommandTestCase(testify.TestCase):
+    def test_command_parses_output(self):
+        def build(filename=None):
+            return [sys.executable, '-c', 'print(%r)' % CREATEHD_OUT]
+
+        createhd = aio._command(build, parse_createhd)
+        result = asyncio.run(createhd(filename='/tmp/test.vdi'))
+        testify.assert_equal(result['uuid'],
+                'e0bfd47f-5a29-4c5e-b325-79c4d032a02f')
+
+
+class ManageParityTestCase(testify.TestCase):
+    @testify.setup
+    def setup(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.saved_state = os.environ.get('VBOXSIM_STATE')
+        os.environ['VBOXSIM_STATE'] = os.path.join(self.tmp_dir, 'sim.json')
+        commands.set_vboxmanage_path(SIMULATOR)
+        self.saved_cache_dir = cache._cache_dir
+        cache.set_cache_dir(None)
+        cache.clear_memo()
+        self.seen = []
+        events.subscribe(self.handler)
+
+    @testify.teardown
+    def teardown(self):
+        events.unsubscribe(self.handler)
+        cache.set_cache_dir(self.saved_cache_dir)
+        cache.clear_memo()
+        commands.set_vboxmanage_path(None)
+        if self.saved_state is None:
+            os.environ.pop('VBOXSIM_STATE', None)
+        else:
+            os.environ['VBOXSIM_STATE'] = self.saved_state
+        shutil.rmtree(self.tmp_dir)
+
+    def handler(self, command, result, kwargs):
+        self.seen.append((command, kwargs))
+
+    def test_commands_emit_events(self):
+        async def provision():
+            vm = await aio.createvm(name='jangofett')
+            await aio.startvm(vm_uuid=vm['uuid'], start_type='headless')
+            await aio.controlvm(vm_uuid=vm['uuid'], action='poweroff')
+            return vm
+
+        vm = asyncio.run(provision())
+        testify.assert_equal([command for command, _ in self.seen],
+                ['createvm', 'startvm', 'controlvm'])
+        testify.assert_equal(self.seen[1][1], {'vm_uuid': vm['uuid'],
+            'vm_name': None, 'start_type': 'headless'})
+
+    def test_list_ostypes_is_cached(self):
+        async def list_twice():
+            return (await aio.list_ostypes(), await aio.list_ostypes())
+
+        first, second = asyncio.run(list_twice())
+        testify.assert_gt(len(first), 0)
+        testify.assert_is(first, second)
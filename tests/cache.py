@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the unit tests for the cache module.
+
+:copyright: (c) 2012 by Sean Plaice
+:license: ISC, see LICENSE for more details.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import testify
+
+from virtbox import cache, commands
+
+
+# setup module level logger
+logger = logging.getLogger(__name__)
+
+
+# stands in for VBoxManage, logging each run so tests can count them
+FAKE_VBOXMANAGE = """#!/bin/sh
+echo run >> "%s"
+echo 4.2.6r82870
+"""
+
+
+class CachedTestCase(testify.TestCase):
+    @testify.setup
+    def setup(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.log = os.path.join(self.tmp_dir, 'runs.log')
+        self.binary = os.path.join(self.tmp_dir, 'VBoxManage')
+        with open(self.binary, 'w') as fn:
+            fn.write(FAKE_VBOXMANAGE % self.log)
+        os.chmod(self.binary, 0o755)
+
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        self.saved = (cache._cache_dir, cache._binary)
+        cache.set_cache_dir(self.cache_dir)
+        cache.clear_memo()
+        cache._binary = self.binary
+
+        self.calls = 0
+
+        @cache.cached('ostypes')
+        def list_ostypes():
+            self.calls += 1
+            return [{'os_type': 'Other', 'os_desc': 'Other/Unknown'}]
+
+        self.list_ostypes = list_ostypes
+
+    @testify.teardown
+    def teardown(self):
+        cache.clear_memo()
+        cache._cache_dir, cache._binary = self.saved
+        shutil.rmtree(self.tmp_dir)
+
+    def runs(self):
+        if not os.path.exists(self.log):
+            return 0
+        with open(self.log) as fn:
+            return len(fn.readlines())
+
+    def new_process(self):
+        # a fresh process has neither the memo nor the resolved binary
+        cache.clear_memo()
+        cache._binary = self.binary
+
+    def test_memo_hit(self):
+        expected = [{'os_type': 'Other', 'os_desc': 'Other/Unknown'}]
+        testify.assert_equal(self.list_ostypes(), expected)
+        testify.assert_equal(self.list_ostypes(), expected)
+        testify.assert_equal(self.calls, 1)
+        testify.assert_equal(self.runs(), 1)
+
+    def test_disk_hit_across_processes(self):
+        self.list_ostypes()
+        self.new_process()
+        testify.assert_equal(self.list_ostypes()[0]['os_type'], 'Other')
+        testify.assert_equal(self.calls, 1)
+        # the version was read from disk as well
+        testify.assert_equal(self.runs(), 1)
+
+    def test_binary_change_invalidates(self):
+        self.list_ostypes()
+        stat = os.stat(self.binary)
+        os.utime(self.binary, ns=(stat.st_atime_ns,
+                stat.st_mtime_ns + 10 ** 9))
+        self.list_ostypes()
+        testify.assert_equal(self.calls, 2)
+        testify.assert_equal(self.runs(), 2)
+
+        self.new_process()
+        self.list_ostypes()
+        testify.assert_equal(self.calls, 2)
+
+    def test_clear(self):
+        self.list_ostypes()
+        cache.clear()
+        cache._binary = self.binary
+        self.list_ostypes()
+        testify.assert_equal(self.calls, 2)
+
+    def test_without_cache_dir(self):
+        cache.set_cache_dir(None)
+        self.list_ostypes()
+        self.list_ostypes()
+        testify.assert_equal(self.calls, 1)
+        self.new_process()
+        self.list_ostypes()
+        testify.assert_equal(self.calls, 2)
+        testify.assert_equal(os.path.exists(self.cache_dir), False)
+
+    def test_uncached(self):
+        self.list_ostypes()
+        self.list_ostypes.uncached()
+        testify.assert_equal(self.calls, 2)
+
+    def test_relative_binary_path(self):
+        cache._binary = None
+        commands.set_vboxmanage_path(os.path.relpath(self.binary))
+        try:
+            stamp = cache.binary_stamp()
+        finally:
+            commands.set_vboxmanage_path(None)
+        testify.assert_equal(stamp[0], os.path.abspath(self.binary))
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the unit tests for the cassette module.
+
+:copyright: (c) 2012 by Sean Plaice
+:license: ISC, see LICENSE for more details.
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import testify
+
+from virtbox import aio, commands, manage
+from virtbox.cassette import load, recording, replaying
+from virtbox.errors import CassetteError, CommandError
+from virtbox.utils import run_cmd
+
+from tests import catch
+
+
+# setup module level logger
+logger = logging.getLogger(__name__)
+
+
+SIMULATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+    'tools', 'vboxmanage_sim.py')
+
+
+class CassetteTestCase(testify.TestCase):
+    @testify.setup
+    def setup(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.saved_state = os.environ.get('VBOXSIM_STATE')
+        os.environ['VBOXSIM_STATE'] = os.path.join(self.tmp_dir, 'sim.json')
+        self.path = os.path.join(self.tmp_dir, 'provision.jsonl.gz')
+
+    @testify.teardown
+    def teardown(self):
+        commands.set_vboxmanage_path(None)
+        if self.saved_state is None:
+            os.environ.pop('VBOXSIM_STATE', None)
+        else:
+            os.environ['VBOXSIM_STATE'] = self.saved_state
+        shutil.rmtree(self.tmp_dir)
+
+    def provision(self):
+        vm = manage.createvm(name='jangofett', ostype='Ubuntu_64')
+        manage.modifyvm(vm_uuid=vm['uuid'], memory='256')
+        return (vm, manage.showvminfo(uuid=vm['uuid']), manage.iter_vms(),
+                catch(CommandError, manage.showvminfo, name='bobafett'))
+
+    def test_record_and_replay(self):
+        commands.set_vboxmanage_path(SIMULATOR)
+        with recording(self.path) as recorder:
+            vm, vm_info, listed, missing = self.provision()
+            listed = list(listed)
+        testify.assert_equal(recorder.count, 5)
+        entries = load(self.path)
+        testify.assert_equal(entries[0]['argv'][:3],
+                ['createvm', '--name', 'jangofett'])
+        # iter_vms only runs list vms once it is consumed
+        testify.assert_equal([entry['status'] for entry in entries],
+                [0, 0, 0, 1, 0])
+
+        # VirtualBox is gone, the cassette answers
+        commands.set_vboxmanage_path('/nonexistent/VBoxManage')
+        with replaying(self.path) as replayer:
+            replayed = self.provision()
+            testify.assert_equal(list(replayed[2]), listed)
+        testify.assert_equal(replayer.count, 5)
+        testify.assert_equal(replayed[0], vm)
+        testify.assert_equal(replayed[1], vm_info)
+        testify.assert_equal(replayed[3].error_code, missing.error_code)
+
+    def test_replay_order(self):
+        entries = [
+            {'argv': ['list', 'runningvms'], 'status': 0, 'stdout': '',
+             'stderr': '', 'duration': 0.5},
+            {'argv': ['list', 'runningvms'], 'status': 0,
+             'stdout': '"jangofett" {f4b0a749-820b-43c2-967e-a7a5f539cfd7}\n',
+             'stderr': '', 'duration': 0.5},
+        ]
+        with replaying(entries):
+            outputs = [run_cmd(['VBoxManage', 'list', 'runningvms'])[0]
+                    for _ in range(3)]
+            exc = catch(CassetteError, run_cmd, ['VBoxManage', 'list',
+                'vms'])
+        testify.assert_equal(outputs, ['', entries[1]['stdout'], ''])
+        testify.assert_equal(exc.reason, 'not recorded: VBoxManage list vms')
+
+    def test_replay_aio(self):
+        entries = [{'argv': ['createhd', '--filename', 'jangofett',
+            '--size', '128'], 'status': 0, 'stdout': 'Disk image created. '
+            'UUID: e0bfd47f-5a29-4c5e-b325-79c4d032a02f\n', 'stderr': '',
+            'duration': 0.1}]
+        with replaying(entries):
+            hdd = asyncio.run(aio.createhd(filename='jangofett',
+                size='128'))
+        testify.assert_equal(hdd['uuid'],
+                'e0bfd47f-5a29-4c5e-b325-79c4d032a02f')
+
+    def test_invalid_cassette(self):
+        path = os.path.join(self.tmp_dir, 'bogus.jsonl')
+        with open(path, 'w') as fn:
+            fn.write('{"cassette": 99}\n')
+        exc = catch(CassetteError, load, path)
+        testify.assert_equal(exc.path, path)
+        catch(CassetteError, load, os.path.join(self.tmp_dir, 'missing'))
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the unit tests for the dag module.
+
+:copyright: (c) 2012 by Sean Plaice
+:license: ISC, see LICENSE for more details.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import testify
+
+from virtbox import commands, manage
+from virtbox.dag import Graph, provision, ref, timeline
+from virtbox.errors import VirtboxManageError
+from virtbox.scheduler import Scheduler
+
+from tests import catch
+
+
+# setup module level logger
+logger = logging.getLogger(__name__)
+
+
+SIMULATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+    'tools', 'vboxmanage_sim.py')
+
+
+def sleeper(seconds=0, value=None, fail=False):
+    time.sleep(seconds)
+    if fail:
+        raise RuntimeError('failed')
+    return value
+
+
+class GraphTestCase(testify.TestCase):
+    def test_independent_steps_overlap(self):
+        running = []
+        overlapped = threading.Event()
+
+        def step(name):
+            running.append(name)
+            if len(running) > 1:
+                overlapped.set()
+            overlapped.wait(1)
+            return {'uuid': name}
+
+        graph = Graph(workers=4)
+        graph.add('createvm', step, {'name': 'vm'})
+        graph.add('createhd', step, {'name': 'hd'})
+        graph.add('attach', sleeper, {'value': ref('createhd', 'uuid')},
+                after=['createvm'])
+        report = graph.run()
+
+        testify.assert_equal(overlapped.is_set(), True)
+        testify.assert_equal(report['results']['attach'], 'hd')
+        testify.assert_equal([entry['status'] for entry in
+            report['steps']], ['ok', 'ok', 'ok'])
+        testify.assert_equal(report['critical_path'][-1], 'attach')
+
+    def test_failure_cancels_dependents(self):
+        graph = Graph(workers=4)
+        graph.add('createvm', sleeper, {'fail': True})
+        graph.add('createhd', sleeper, {'seconds': 0.05, 'value': 'hd'})
+        graph.add('storagectl', sleeper, after=['createvm'])
+        graph.add('attach', sleeper, {'value': ref('createhd')},
+                after=['storagectl'])
+        graph.add('other', sleeper, {'value': ref('createhd')})
+        report = graph.run()
+
+        testify.assert_equal(report['failed'], ['createvm'])
+        testify.assert_equal(report['cancelled'], ['storagectl', 'attach'])
+        testify.assert_equal(report['results'], {'createhd': 'hd',
+            'other': 'hd'})
+        testify.assert_equal(report['steps'][0]['error'], 'failed')
+
+    def test_critical_path(self):
+        graph = Graph(workers=4)
+        graph.add('fast', sleeper, {'seconds': 0.01})
+        graph.add('slow', sleeper, {'seconds': 0.1})
+        graph.add('join', sleeper, after=['fast', 'slow'])
+        report = graph.run()
+        testify.assert_equal(report['critical_path'], ['slow', 'join'])
+
+        text = timeline(report, width=20)
+        testify.assert_equal(text.splitlines()[1].startswith('* slow |'),
+                True)
+        testify.assert_equal(len(text.splitlines()), 4)
+
+    def test_invalid_graphs(self):
+        graph = Graph()
+        graph.add('a', sleeper, after=['b'])
+        graph.add('b', sleeper, after=['a'])
+        exc = catch(VirtboxManageError, graph.run)
+        testify.assert_equal(exc.reason, 'dependency cycle among a, b')
+
+        catch(VirtboxManageError, graph.add, 'a', sleeper)
+        graph = Graph()
+        graph.add('a', sleeper, {'value': ref('missing')})
+        catch(VirtboxManageError, graph.run)
+
+    def test_shared_scheduler_shut_down(self):
+        scheduler = Scheduler(limit=2)
+        started, release = threading.Event(), threading.Event()
+
+        def createvm(name=None):
+            started.set()
+            release.wait(1)
+            return {'uuid': name}
+
+        graph = Graph(scheduler=scheduler)
+        graph.add('createvm', createvm, {'name': 'vm'})
+        graph.add('modifyvm', sleeper, {'vm_uuid': 'vm'})
+        graph.add('startvm', sleeper, {'vm_uuid': ref('createvm', 'uuid')},
+                after=['modifyvm'])
+
+        def stop():
+            started.wait(1)
+            scheduler.shutdown(wait=False)
+            release.set()
+
+        stopper = threading.Thread(target=stop)
+        stopper.start()
+        report = graph.run()
+        stopper.join()
+        testify.assert_equal(report['results'], {'createvm': {'uuid':
+            'vm'}})
+        testify.assert_equal(report['failed'], ['modifyvm'])
+        testify.assert_equal(report['cancelled'], ['startvm'])
+
+
+class ProvisionTestCase(testify.TestCase):
+    @testify.setup
+    def setup(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.saved_state = os.environ.get('VBOXSIM_STATE')
+        os.environ['VBOXSIM_STATE'] = os.path.join(self.tmp_dir, 'sim.json')
+        commands.set_vboxmanage_path(SIMULATOR)
+
+    @testify.teardown
+    def teardown(self):
+        commands.set_vboxmanage_path(None)
+        if self.saved_state is None:
+            os.environ.pop('VBOXSIM_STATE', None)
+        else:
+            os.environ['VBOXSIM_STATE'] = self.saved_state
+        shutil.rmtree(self.tmp_dir)
+
+    def test_provision(self):
+        disks = [{'filename': '/tmp/jangofett%d.vdi' % i, 'size': '128'}
+                for i in range(2)]
+        graph = provision('jangofett', disks=disks, options={'memory':
+            '256'}, start_type='headless')
+        report = graph.run()
+        testify.assert_equal(report['failed'], [])
+        testify.assert_equal(report['critical_path'][-1], 'startvm')
+
+        vm_info = manage.showvminfo(name='jangofett')
+        testify.assert_equal(vm_info['vmstate'], 'running')
+        testify.assert_equal(vm_info.memory, 256)
+        testify.assert_equal(sorted(vm_info.storage[0]['attachments']),
+                [(0, 0), (1, 0)])
+        testify.assert_equal(vm_info['primary-imageuuid-1-0'],
+                report['results']['createhd1']['uuid'])
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the unit tests for the diskusage module.
+
+:copyright: (c) 2012 by Sean Plaice
+:license: ISC, see LICENSE for more details.
+"""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import testify
+
+from virtbox import diskusage
+from virtbox.diskusage import DiskUsage, parse_in_use_by
+
+
+# setup module level logger
+logger = logging.getLogger(__name__)
+
+
+HDIMAGE_DIR = os.path.join('parser_test_data', 'hdimage')
+
+JANGOFETT_UUID = 'f4b0a749-820b-43c2-967e-a7a5f539cfd7'
+BOBAFETT_UUID = '9a1c3e5d-7b2f-4e61-8c0a-3d5f7e9b1c2d'
+BASE_UUID = '00bfd47f-5a29-4c5e-b325-79c4d032a02f'
+DIFF_UUID = '7c1f0b55-9a0e-4f77-8d0c-5b1b9e1c3d22'
+VMDK_UUID = '3b4c5d6e-7f80-4912-a3b4-c5d6e7f80912'
+MISSING_UUID = '5c6d7e8f-0a1b-4c2d-8e3f-4a5b6c7d8e9f'
+
+
+def allocated(path):
+    return os.stat(path).st_blocks * 512
+
+
+class DiskUsageTestCase(testify.TestCase):
+    @testify.setup
+    def setup(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.vm_dir = os.path.join(self.tmp_dir, 'jangofett')
+        self.snapshots = os.path.join(self.vm_dir, 'Snapshots')
+        os.makedirs(self.snapshots)
+        self.base = os.path.join(self.vm_dir, 'jangofett.vdi')
+        self.diff = os.path.join(self.snapshots, '{%s}.vdi' % DIFF_UUID)
+        self.vmdk = os.path.join(self.tmp_dir, 'bobafett.vmdk')
+        shutil.copy(os.path.join(HDIMAGE_DIR, 'jangofett.vdi'), self.base)
+        shutil.copy(os.path.join(HDIMAGE_DIR, 'jangofett-diff.vdi'),
+                self.diff)
+        shutil.copy(os.path.join(HDIMAGE_DIR, 'sparse.vmdk'), self.vmdk)
+        self.cache_path = os.path.join(self.tmp_dir, 'cache',
+                'diskusage.json')
+        self.records = [
+            {'uuid': BASE_UUID, 'parent_uuid': 'base',
+             'location': self.base, 'storage_format': 'VDI',
+             'capacity': '128 MBytes',
+             'in_use_by_vms': 'jangofett (UUID: %s) [installed (UUID: '
+                '3b4c5d6e-0000-4912-a3b4-c5d6e7f80912)]' % JANGOFETT_UUID},
+            {'uuid': DIFF_UUID, 'parent_uuid': BASE_UUID,
+             'location': self.diff, 'storage_format': 'VDI',
+             'capacity': '128 MBytes',
+             'in_use_by_vms': 'jangofett (UUID: %s)' % JANGOFETT_UUID},
+            {'uuid': VMDK_UUID, 'parent_uuid': 'base',
+             'location': self.vmdk, 'storage_format': 'VMDK',
+             'capacity': '64 MBytes',
+             'in_use_by_vms': 'bobafett (UUID: %s)' % BOBAFETT_UUID},
+            {'uuid': MISSING_UUID, 'parent_uuid': 'base',
+             'location': os.path.join(self.tmp_dir, 'missing.vhd'),
+             'storage_format': 'VHD', 'capacity': '8192 MBytes'},
+        ]
+        self.usage = DiskUsage(workers=2, cache_path=self.cache_path,
+                listing=lambda: self.records)
+
+    @testify.teardown
+    def teardown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_parse_in_use_by(self):
+        testify.assert_equal(parse_in_use_by(
+            'jangofett (UUID: %s) [a, b (UUID: 1234)], bobafett (UUID: %s)'
+            % (JANGOFETT_UUID, BOBAFETT_UUID)),
+            [('jangofett', JANGOFETT_UUID), ('bobafett', BOBAFETT_UUID)])
+        testify.assert_equal(parse_in_use_by(None), [])
+
+    def test_media_and_chains(self):
+        media = self.usage.report()['media']
+        base = media[BASE_UUID]
+        diff = media[DIFF_UUID]
+        testify.assert_equal(base['size'], 1024)
+        testify.assert_equal(base['logical_size'], 128 * 1024 * 1024)
+        testify.assert_equal(base['allocated'], allocated(self.base))
+        testify.assert_equal(diff['parent_uuid'], BASE_UUID)
+        testify.assert_equal(diff['chain_size'], 2048)
+        testify.assert_equal(diff['tree_size'], 1024)
+        testify.assert_equal(base['chain_size'], 1024)
+        testify.assert_equal(base['tree_size'], 2048)
+        testify.assert_equal(base['vms'], [JANGOFETT_UUID])
+        # sized from the list hdds record only
+        missing = media[MISSING_UUID]
+        testify.assert_equal(missing['size'], 0)
+        testify.assert_equal(missing['logical_size'], 8192 * 1024 * 1024)
+
+    def test_vms_directories_and_total(self):
+        report = self.usage.report()
+        jangofett = report['vms'][JANGOFETT_UUID]
+        testify.assert_equal(jangofett['name'], 'jangofett')
+        testify.assert_equal(jangofett['media'], [BASE_UUID, DIFF_UUID])
+        testify.assert_equal(jangofett['size'], 2048)
+        testify.assert_equal(jangofett['allocated'],
+                allocated(self.base) + allocated(self.diff))
+        testify.assert_equal(report['vms'][BOBAFETT_UUID]['size'], 10752)
+        testify.assert_equal(report['directories'][self.snapshots],
+                {'media': 1, 'size': 1024,
+                 'allocated': allocated(self.diff)})
+        testify.assert_equal(report['total']['media'], 4)
+        testify.assert_equal(report['total']['size'], 2048 + 10752)
+        testify.assert_equal(list(report['errors']),
+                [self.records[3]['location']])
+
+    def test_incremental(self):
+        self.usage.report()
+        testify.assert_equal(self.usage.stats, {'measured': 3, 'cached': 0})
+        self.usage.report()
+        testify.assert_equal(self.usage.stats, {'measured': 0, 'cached': 3})
+
+        with open(self.diff, 'ab') as fn:
+            fn.write(b'\0' * 512)
+        # a fresh process picks the measurements up from cache_path
+        usage = DiskUsage(cache_path=self.cache_path,
+                listing=lambda: self.records)
+        report = usage.report()
+        testify.assert_equal(usage.stats, {'measured': 1, 'cached': 2})
+        testify.assert_equal(report['media'][DIFF_UUID]['size'], 1536)
+
+        usage.clear()
+        testify.assert_equal(os.path.exists(self.cache_path), False)
+        usage.report()
+        testify.assert_equal(usage.stats, {'measured': 3, 'cached': 0})
+
+    def test_cache_forgets_removed_images(self):
+        self.usage.report()
+        os.remove(self.vmdk)
+        self.usage.report()
+        with open(self.cache_path) as fn:
+            entries = json.load(fn)['entries']
+        testify.assert_equal(sorted(entry['location']
+            for entry in entries.values()), sorted([self.base, self.diff]))
+
+    def test_report_json(self):
+        report = json.loads(self.usage.report_json())
+        testify.assert_equal(report['media'][VMDK_UUID]['logical_size'],
+                64 * 1024 * 1024)
+        testify.assert_equal(report['vms'][BOBAFETT_UUID]['media'],
+                [VMDK_UUID])
+
+    def test_default_listing(self):
+        testify.assert_equal(DiskUsage(cache_path=None)._listing,
+                diskusage._list_hdds)
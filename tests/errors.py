@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the unit tests for the errors module.
+
+:copyright: (c) 2012 by Sean Plaice
+:license: ISC, see LICENSE for more details.
+"""
+
+import logging
+import testify
+
+from virtbox.errors import CommandError, classify_error
+
+
+# setup module level logger
+logger = logging.getLogger(__name__)
+
+
+LOCKED = """VBoxManage: error: The machine 'foo' is already locked for a \
+session (or being unlocked)
+VBoxManage: error: Details: code VBOX_E_INVALID_OBJECT_STATE (0x80bb0007), \
+component MachineWrap, interface IMachine, callee nsISupports
+"""
+
+NOT_FOUND = """VBoxManage: error: Could not find a registered machine named \
+'foo'
+VBoxManage: error: Details: code VBOX_E_OBJECT_NOT_FOUND (0x80bb0001), \
+component VirtualBoxWrap, interface IVirtualBox, callee nsISupports
+"""
+
+SVC_DOWN = """VBoxManage: error: Failed to create the VirtualBox object!
+VBoxManage: error: Code NS_ERROR_ABORT (0x80004004) - Operation aborted \
+(extended info not available)
+"""
+
+NOT_READY = """VBoxManage: error: The object is not ready
+VBoxManage: error: Details: code E_ACCESSDENIED (0x80070005), component \
+SessionMachine, interface IMachine, callee nsISupports
+"""
+
+ACCESS_DENIED = """VBoxManage: error: Could not create the directory \
+'/vms/foo' (VERR_ACCESS_DENIED)
+VBoxManage: error: Details: code E_ACCESSDENIED (0x80070005), component \
+MachineWrap, interface IMachine, callee nsISupports
+"""
+
+SESSION_BUSY = """VBoxManage: error: The session is busy
+VBoxManage: error: Details: code VBOX_E_INVALID_OBJECT_STATE (0x80bb0007), \
+component SessionWrap, interface ISession, callee nsISupports
+"""
+
+OPEN_SESSION_FAILED = """VBoxManage: error: Failed to open session for \
+'foo': the machine is inaccessible
+"""
+
+
+class ClassifyErrorTestCase(testify.TestCase):
+    def test_transient(self):
+        testify.assert_equal(classify_error(1, LOCKED), ('object_locked',
+            'transient', 'VBOX_E_INVALID_OBJECT_STATE'))
+        testify.assert_equal(classify_error(1, SVC_DOWN),
+            ('vboxsvc_unavailable', 'transient', 'NS_ERROR_ABORT'))
+        testify.assert_equal(classify_error(1, NOT_READY),
+            ('object_not_ready', 'transient', 'E_ACCESSDENIED'))
+        testify.assert_equal(classify_error(1, SESSION_BUSY), ('session_busy',
+            'transient', 'VBOX_E_INVALID_OBJECT_STATE'))
+
+    def test_permanent(self):
+        testify.assert_equal(classify_error(1, NOT_FOUND), ('not_found',
+            'permanent', 'VBOX_E_OBJECT_NOT_FOUND'))
+        testify.assert_equal(classify_error(127, 'No such file')[:2],
+            ('command_not_found', 'permanent'))
+        testify.assert_equal(classify_error(1, ACCESS_DENIED),
+            ('access_denied', 'permanent', 'E_ACCESSDENIED'))
+
+    def test_unknown(self):
+        testify.assert_equal(classify_error(1, 'something odd'),
+            ('unknown', 'unknown', None))
+        testify.assert_equal(classify_error(1, OPEN_SESSION_FAILED)[:2],
+            ('unknown', 'unknown'))
+        testify.assert_equal(classify_error(1, None),
+            ('unknown', 'unknown', None))
+
+
+class CommandErrorTestCase(testify.TestCase):
+    def test_classified_attributes(self):
+        exc = CommandError(status_code=1, cmd='VBoxManage modifyvm foo',
+                stderr=LOCKED)
+        testify.assert_equal(exc.error_code, 'object_locked')
+        testify.assert_equal(exc.transient, True)
+        testify.assert_equal(exc.as_dict()['category'], 'transient')
+        testify.assert_equal(CommandError(1, stderr=NOT_FOUND).transient,
+            False)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the unit tests for the events module.
+
+:copyright: (c) 2012 by Sean Plaice
+:license: ISC, see LICENSE for more details.
+"""
+
+import logging
+import testify
+
+from virtbox import events
+
+
+# setup module level logger
+logger = logging.getLogger(__name__)
+
+
+class EventsTestCase(testify.TestCase):
+    @testify.setup
+    def setup(self):
+        self.seen = []
+        events.subscribe(self.handler)
+
+    @testify.teardown
+    def teardown(self):
+        events.unsubscribe(self.handler)
+        events.unsubscribe(self.broken)
+
+    def handler(self, command, result, kwargs):
+        self.seen.append((command, result, kwargs))
+
+    def broken(self, command, result, kwargs):
+        raise RuntimeError('broken handler')
+
+    def test_emit(self):
+        events.emit('startvm', {'uuid': 'abc'}, vm_name='jangofett')
+        testify.assert_equal(self.seen, [('startvm', {'uuid': 'abc'},
+            {'vm_name': 'jangofett'})])
+
+    def test_unsubscribe(self):
+        events.unsubscribe(self.handler)
+        events.emit('startvm', {'uuid': 'abc'})
+        testify.assert_equal(self.seen, [])
+
+    def test_failing_handler_is_isolated(self):
+        events.unsubscribe(self.handler)
+        events.subscribe(self.broken)
+        events.subscribe(self.handler)
+        events.emit('controlvm', '', action='poweroff')
+        testify.assert_equal(len(self.seen), 1)
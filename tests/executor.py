@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the unit tests for the executor module.
+
+:copyright: (c) 2012 by Sean Plaice
+:license: ISC, see LICENSE for more details.
+"""
+
+import logging
+import subprocess
+import sys
+import threading
+import time
+import testify
+
+from virtbox.errors import CommandError, CommandTimeout, CommandCancelled
+from virtbox.executor import execute, stream, Cancelled
+from virtbox.utils import (run_cmd, iter_cmd, format_cmd, deadline,
+        remaining_time)
+
+from tests import catch
+
+
+# setup module level logger
+logger = logging.getLogger(__name__)
+
+
+SCRIPT = ('import sys; sys.stdout.write(sys.argv[1]); '
+    'sys.stderr.write("err"); sys.exit(int(sys.argv[2]))')
+
+
+class ExecuteTestCase(testify.TestCase):
+    def test_execute_collects_streams(self):
+        status_code, stdout, stderr = execute([sys.executable, '-c', SCRIPT,
+            'out put', '0'])
+        testify.assert_equal(status_code, 0)
+        testify.assert_equal(stdout, 'out put')
+        testify.assert_equal(stderr, 'err')
+
+    def test_execute_large_output(self):
+        script = 'import sys; sys.stdout.write("x" * 1000000)'
+        status_code, stdout, stderr = execute([sys.executable, '-c', script])
+        testify.assert_equal(len(stdout), 1000000)
+        testify.assert_equal(stderr, '')
+
+
+# prints the pid of a grandchild sleeping in the same process group
+SPAWNER = ('import subprocess, sys, time; '
+    'p = subprocess.Popen([sys.executable, "-c", "import time; '
+    'time.sleep(30)"]); print(p.pid, flush=True); time.sleep(30)')
+
+
+def pid_alive(pid):
+    try:
+        with open('/proc/%d/stat' % pid) as stat:
+            return stat.read().split()[2] != 'Z'
+    except IOError:
+        return False
+
+
+class ExecuteTimeoutTestCase(testify.TestCase):
+    def test_timeout_kills_process_group(self):
+        start = time.time()
+        try:
+            execute([sys.executable, '-c', SPAWNER], timeout=0.5)
+        except subprocess.TimeoutExpired as exc:
+            grandchild = int(exc.output.split()[0])
+        else:
+            raise AssertionError('TimeoutExpired not raised')
+        testify.assert_lt(time.time() - start, 5)
+        time.sleep(0.2)
+        testify.assert_equal(pid_alive(grandchild), False)
+
+    def test_cancel(self):
+        cancel = threading.Event()
+        threading.Timer(0.2, cancel.set).start()
+        testify.assert_raises(Cancelled, execute,
+                [sys.executable, '-c', 'import time; time.sleep(30)'],
+                cancel=cancel)
+
+
+# prints a line, waits for the parent to read it, then prints another
+SLOW_LINES = ('import sys, time; print("first", flush=True); time.sleep(0.5); '
+    'sys.stdout.write("last"); sys.stderr.write("err"); sys.exit(3)')
+
+
+class StreamTestCase(testify.TestCase):
+    def test_stream_yields_lines_as_they_arrive(self):
+        lines = stream([sys.executable, '-c', SLOW_LINES])
+        started = time.time()
+        testify.assert_equal(next(lines), 'first')
+        testify.assert_lt(time.time() - started, 0.4)
+        testify.assert_equal(next(lines), 'last')
+        result = catch(StopIteration, next, lines)
+        testify.assert_equal(result.value, (3, 'err'))
+
+    def test_stream_close_kills_child(self):
+        lines = stream([sys.executable, '-c', SPAWNER])
+        grandchild = int(next(lines))
+        lines.close()
+        time.sleep(0.2)
+        testify.assert_equal(pid_alive(grandchild), False)
+
+    def test_iter_cmd_raises_after_output(self):
+        lines = iter_cmd([sys.executable, '-c', SLOW_LINES])
+        testify.assert_equal(next(lines), 'first')
+        testify.assert_equal(next(lines), 'last')
+        exc = catch(CommandError, next, lines)
+        testify.assert_equal(exc.status_code, 3)
+
+    def test_iter_cmd_timeout(self):
+        lines = iter_cmd([sys.executable, '-c', 'import time; time.sleep(5)'],
+                timeout=0.2)
+        testify.assert_raises(CommandTimeout, list, lines)
+
+
+class RunCmdTestCase(testify.TestCase):
+    def test_run_cmd_argv_is_not_tokenized(self):
+        stdout, stderr = run_cmd([sys.executable, '-c', SCRIPT,
+            'a "quoted" arg', '0'])
+        testify.assert_equal(stdout, 'a "quoted" arg')
+
+    def test_run_cmd_string(self):
+        stdout, stderr = run_cmd(format_cmd([sys.executable, '-c', SCRIPT,
+            'two words', '0']))
+        testify.assert_equal(stdout, 'two words')
+
+    def test_run_cmd_failure(self):
+        exc = catch(CommandError, run_cmd,
+            [sys.executable, '-c', SCRIPT, 'out', '3'])
+        testify.assert_equal(exc.status_code, 3)
+        testify.assert_equal(exc.stderr, 'err')
+
+    def test_run_cmd_missing_binary(self):
+        exc = catch(CommandError, run_cmd,
+            ['/nonexistent/VBoxManage', '--version'])
+        testify.assert_equal(exc.status_code, 127)
+
+
+class DeadlineTestCase(testify.TestCase):
+    def test_run_cmd_timeout(self):
+        exc = catch(CommandTimeout, run_cmd, [sys.executable, '-c',
+            'import time; time.sleep(30)'], timeout=0.2)
+        testify.assert_equal(exc.timeout, 0.2)
+        testify.assert_equal(exc.error_code, 'timeout')
+
+    def test_deadline_applies_to_run_cmd(self):
+        with deadline(0.3):
+            testify.assert_lte(remaining_time(), 0.3)
+            testify.assert_raises(CommandTimeout, run_cmd,
+                    [sys.executable, '-c', 'import time; time.sleep(30)'])
+        testify.assert_equal(remaining_time(), None)
+
+    def test_nested_deadline_only_shortens(self):
+        with deadline(0.5):
+            with deadline(60):
+                testify.assert_lte(remaining_time(), 0.5)
+
+    def test_expired_deadline_does_not_spawn(self):
+        with deadline(0):
+            testify.assert_raises(CommandTimeout, run_cmd,
+                    ['/nonexistent/VBoxManage'])
+
+    def test_deadline_cancel(self):
+        cancel = threading.Event()
+        threading.Timer(0.2, cancel.set).start()
+        with deadline(cancel=cancel):
+            testify.assert_raises(CommandCancelled, run_cmd,
+                    [sys.executable, '-c', 'import time; time.sleep(30)'])
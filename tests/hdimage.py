@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the unit tests for the hdimage module.
+
+:copyright: (c) 2012 by Sean Plaice
+:license: ISC, see LICENSE for more details.
+"""
+
+import logging
+import os
+import testify
+
+from tests import catch
+from virtbox.errors import ImageFormatError
+from virtbox.hdimage import read_header, iter_headers
+from virtbox.parsers import parse_showhdinfo
+
+
+# setup module level logger
+logger = logging.getLogger(__name__)
+
+
+HDIMAGE_DIR = os.path.join('parser_test_data', 'hdimage')
+SHOWHDINFO = os.path.join('parser_test_data', 'equivalence',
+    'showhdinfo-basic.txt')
+
+
+def image(name):
+    return os.path.join(HDIMAGE_DIR, name)
+
+
+class ReadHeaderTestCase(testify.TestCase):
+    def test_vdi_matches_showhdinfo(self):
+        with open(SHOWHDINFO) as stdout:
+            expected = parse_showhdinfo(stdout.read(), '')
+        hd_info = read_header(image('jangofett.vdi'))
+        for key in expected:
+            if key != 'location':
+                testify.assert_equal(hd_info[key], expected[key])
+        testify.assert_equal(hd_info['location'],
+                os.path.abspath(image('jangofett.vdi')))
+        testify.assert_equal(hd_info['parent_uuid'], 'base')
+
+    def test_vdi_differencing(self):
+        hd_info = read_header(image('jangofett-diff.vdi'))
+        testify.assert_equal(hd_info['uuid'],
+                '7c1f0b55-9a0e-4f77-8d0c-5b1b9e1c3d22')
+        testify.assert_equal(hd_info['parent_uuid'],
+                '00bfd47f-5a29-4c5e-b325-79c4d032a02f')
+        testify.assert_equal(hd_info['type'], 'normal (differencing)')
+
+    def test_vhd(self):
+        fixed = read_header(image('fixed.vhd'))
+        testify.assert_equal(fixed['storage_format'], 'VHD')
+        testify.assert_equal(fixed['format_variant'], 'fixed default')
+        testify.assert_equal(fixed['uuid'],
+                '5c6d7e8f-0a1b-4c2d-8e3f-4a5b6c7d8e9f')
+        diff = read_header(image('diff.vhd'))
+        testify.assert_equal(diff['format_variant'], 'dynamic default')
+        testify.assert_equal(diff['parent_uuid'], fixed['uuid'])
+
+    def test_vmdk(self):
+        flat = read_header(image('flat.vmdk'))
+        testify.assert_equal(flat['storage_format'], 'VMDK')
+        testify.assert_equal(flat['format_variant'], 'fixed default')
+        testify.assert_equal(flat['logical_size'], '200 MBytes')
+        testify.assert_equal(flat['parent_uuid'], 'base')
+        testify.assert_equal(flat['uuid'],
+                '1d2e3f4a-5b6c-4d7e-8f9a-0b1c2d3e4f5a')
+        sparse = read_header(image('sparse.vmdk'))
+        testify.assert_equal(sparse['format_variant'], 'dynamic default')
+        testify.assert_equal(sparse['logical_size'], '64 MBytes')
+        testify.assert_equal(sparse['uuid'],
+                '3b4c5d6e-7f80-4912-a3b4-c5d6e7f80912')
+        testify.assert_not_in('extents', sparse)
+
+    def test_raw_and_unknown(self):
+        raw = read_header(image('blank.img'))
+        testify.assert_equal(raw['storage_format'], 'RAW')
+        testify.assert_equal(raw['uuid'], None)
+        catch(ImageFormatError, read_header, image('notes.txt'))
+        catch(ImageFormatError, read_header, image('flat-flat.vmdk'))
+        catch(OSError, read_header, image('missing.vdi'))
+
+    def test_iter_headers(self):
+        results = dict(iter_headers([image('jangofett.vdi'),
+            image('notes.txt')]))
+        testify.assert_equal(results[image('jangofett.vdi')]['storage_format'],
+                'VDI')
+        testify.assert_isinstance(results[image('notes.txt')],
+                ImageFormatError)
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the unit tests for the import cost of the virtbox
+package.
+
+:copyright: (c) 2012 by Sean Plaice
+:license: ISC, see LICENSE for more details.
+"""
+
+import logging
+import subprocess
+import sys
+import testify
+
+
+# setup module level logger
+logger = logging.getLogger(__name__)
+
+
+# cumulative import time budget for virtbox.manage, in milliseconds
+IMPORT_BUDGET_MS = 50
+
+# modules short lived scripts calling version() must not pay for
+HEAVY_MODULES = ('pyparsing', 'envoy', 'asyncio', 'concurrent.futures',
+    'xml.etree.ElementTree')
+
+
+def import_time(module):
+    """
+    Return the cumulative time in ms importing module takes in a fresh
+    interpreter.
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+        'import %s' % module], stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+    for line in proc.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1000.0
+
+
+def imported_modules(code):
+    """
+    Return the modules loaded after running code in a fresh interpreter.
+    """
+    proc = subprocess.run([sys.executable, '-c',
+        '%s; import sys; print("\\n".join(sys.modules))' % code],
+        stdout=subprocess.PIPE, universal_newlines=True, check=True)
+    return set(proc.stdout.split())
+
+
+class ImportTimeTestCase(testify.TestCase):
+    def test_manage_import_budget(self):
+        # best of a few runs, a loaded machine only makes single runs slower
+        best = min(import_time('virtbox.manage') for _ in range(5))
+        testify.assert_lt(best, IMPORT_BUDGET_MS)
+
+    def test_manage_import_is_light(self):
+        modules = imported_modules('import virtbox.manage')
+        for name in HEAVY_MODULES:
+            testify.assert_not_in(name, modules)
+
+    def test_pyparsing_loaded_on_first_grammar(self):
+        modules = imported_modules('from virtbox.parsers import '
+            'parse_createhd; parse_createhd("Disk image created. UUID: '
+            'e0bfd47f-5a29-4c5e-b325-79c4d032a02f", "")')
+        testify.assert_not_in('pyparsing', modules)
+        modules = imported_modules('from virtbox.parsers import '
+            'parse_createhd; parse_createhd("Disk image created. UUID: '
+            'e0bfd47f-5a29-4c5e-b325-79c4d032a02f", "", engine="pyparsing")')
+        testify.assert_in('pyparsing', modules)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the unit tests for the inventory module.
+
+:copyright: (c) 2012 by Sean Plaice
+:license: ISC, see LICENSE for more details.
+"""
+
+import logging
+import os
+import codecs
+import shutil
+import tempfile
+import testify
+
+from virtbox import commands, events, settings
+from virtbox.inventory import Inventory
+from virtbox.models import VMInfo
+from virtbox.parsers import parse_list_vms_long
+
+
+# setup module level logger
+logger = logging.getLogger(__name__)
+
+
+VBOXMANAGE_LIST_LONG_VMS = os.path.join('parser_test_data',
+    'vboxmanage_list_long_vms.txt')
+
+SETTINGS_DIR = os.path.join('parser_test_data', 'settings')
+
+JANGOFETT_UUID = 'f4b0a749-820b-43c2-967e-a7a5f539cfd7'
+
+# stands in for VBoxManage showvminfo of a running vm
+FAKE_VBOXMANAGE = """#!/bin/sh
+echo 'name="jangofett"'
+echo 'UUID="%s"'
+echo 'VMState="running"'
+""" % JANGOFETT_UUID
+
+
+class InventoryTestCase(testify.TestCase):
+    @testify.setup
+    def setup(self):
+        with codecs.open(VBOXMANAGE_LIST_LONG_VMS, 'r', 'utf-8') as stdout:
+            self.vms = parse_list_vms_long(stdout.read(), '')
+        self.listings = 0
+        self.inventory = Inventory(ttl=3600, listing=self.listing)
+        self.first = self.vms[0]
+
+    @testify.teardown
+    def teardown(self):
+        self.inventory.close()
+
+    def listing(self):
+        self.listings += 1
+        return self.vms
+
+    def test_lookups_list_once(self):
+        testify.assert_equal(self.inventory.uuid(self.first['name']),
+                self.first['uuid'])
+        testify.assert_equal(self.inventory.get(uuid=self.first['uuid']),
+                self.first)
+        testify.assert_equal(self.inventory.exists(name='missing'), False)
+        testify.assert_equal(
+                self.inventory.is_running(uuid=self.vms[1]['uuid']), True)
+        testify.assert_equal(len(self.inventory), len(self.vms))
+        testify.assert_equal(self.listings, 1)
+
+    def test_ttl_refresh(self):
+        self.inventory.ttl = 0
+        self.inventory.exists(name=self.first['name'])
+        self.inventory.exists(name=self.first['name'])
+        testify.assert_equal(self.listings, 2)
+
+    def test_createvm_and_unregistervm(self):
+        self.inventory.refresh()
+        events.emit('createvm', {'name': 'bobafett', 'uuid': 'b0ba',
+            'file_path': '/tmp/bobafett.vbox'}, name='bobafett')
+        testify.assert_equal(self.inventory.uuid('bobafett'), 'b0ba')
+        testify.assert_equal(self.inventory.is_running(name='bobafett'),
+                False)
+
+        events.emit('unregistervm', '', name='bobafett', uuid=None)
+        testify.assert_equal(self.inventory.exists(uuid='b0ba'), False)
+        testify.assert_equal(self.listings, 1)
+
+    def test_modifyvm_rename(self):
+        self.inventory.refresh()
+        events.emit('modifyvm', '', vm_name=None, vm_uuid=self.first['uuid'],
+                name='bobafett')
+        testify.assert_equal(self.inventory.uuid('bobafett'),
+                self.first['uuid'])
+        testify.assert_equal(self.inventory.uuid(self.first['name']), None)
+        testify.assert_equal(self.inventory.get(name='bobafett')['memory'],
+                self.first['memory'])
+
+    def test_state_changes(self):
+        self.inventory.refresh()
+        events.emit('startvm', {'uuid': self.first['uuid']})
+        testify.assert_equal(
+                self.inventory.is_running(name=self.first['name']), True)
+        events.emit('controlvm', '', vm_name=self.first['name'],
+                action='savestate')
+        testify.assert_equal(self.inventory.get(
+            uuid=self.first['uuid'])['vmstate'], 'saved')
+        testify.assert_equal(self.listings, 1)
+
+    def test_unknown_outcome_relists(self):
+        self.inventory.refresh()
+        events.emit('controlvm', '', vm_uuid=self.first['uuid'],
+                action='acpipowerbutton')
+        self.inventory.exists(uuid=self.first['uuid'])
+        testify.assert_equal(self.listings, 2)
+
+    def test_close(self):
+        self.inventory.refresh()
+        self.inventory.close()
+        events.emit('unregistervm', '', uuid=self.first['uuid'])
+        testify.assert_equal(self.inventory.exists(uuid=self.first['uuid']),
+                True)
+
+
+class SettingsBackendTestCase(testify.TestCase):
+    @testify.setup
+    def setup(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.home = os.path.join(self.tmp_dir, 'VirtualBox')
+        shutil.copytree(SETTINGS_DIR, self.home)
+        binary = os.path.join(self.tmp_dir, 'VBoxManage')
+        with open(binary, 'w') as fn:
+            fn.write(FAKE_VBOXMANAGE)
+        os.chmod(binary, 0o755)
+        commands.set_vboxmanage_path(binary)
+        settings.clear()
+        settings.set_registry_path(os.path.join(self.home, 'VirtualBox.xml'))
+        settings._ostypes = {}
+        settings.set_read_backend('settings')
+
+    @testify.teardown
+    def teardown(self):
+        settings.set_read_backend('vboxmanage')
+        settings.set_registry_path(None)
+        settings.clear()
+        commands.set_vboxmanage_path(None)
+        shutil.rmtree(self.tmp_dir)
+
+    def listing(self):
+        return [VMInfo({'name': 'jangofett', 'uuid': JANGOFETT_UUID,
+            'vmstate': 'running'})]
+
+    def test_changed_settings_keep_vmstate(self):
+        with Inventory(ttl=3600, listing=self.listing) as inventory:
+            testify.assert_equal(inventory.is_running(uuid=JANGOFETT_UUID),
+                    True)
+            events.emit('settings_changed', None, uuid=JANGOFETT_UUID,
+                    path=os.path.join(self.home, 'jangofett',
+                        'jangofett.vbox'))
+            testify.assert_equal(inventory.is_running(uuid=JANGOFETT_UUID),
+                    True)
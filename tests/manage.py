@@ -21,6 +21,7 @@ from virtbox.manage import (
         createvm,
         startvm,
         showvminfo,
+        showvminfo_many,
         modifyvm,
         controlvm,
         storageattach,
@@ -29,6 +30,7 @@ from virtbox.manage import (
         showhdinfo,
         createhd,
         )
+from virtbox.errors import CommandError
 from virtbox.utils import (
         id_generator,
         generate_vm,
@@ -67,6 +69,13 @@ class ListVMSTestCase(testify.TestCase):
         vm_uuid = uuid.UUID('{%s}' % vms[0]['uuid'])
         testify.assert_equal(type(vm_uuid), type(uuid.uuid4()), 'no uuid set')
 
+    def test_list_vms_long(self):
+        vms = list_vms(long=True)
+        vm_details = showvminfo(name=self.vms[0]['name'])
+        testify.assert_equal(vms[0]['name'], vm_details['name'])
+        testify.assert_equal(vms[0]['uuid'], vm_details['uuid'])
+        testify.assert_equal(vms[0].memory, vm_details.memory)
+
 
 class ListVMSManyTestCase(testify.TestCase):
     @testify.setup
@@ -172,6 +181,24 @@ class ShowVMInfoTestCase(testify.TestCase):
         testify.assert_equal(vm_details['uuid'], self.vm_info['uuid'])
 
 
+class ShowVMInfoManyTestCase(testify.TestCase):
+    @testify.setup
+    def create_vms(self):
+        self.vms = [generate_vm() for _ in range(3)]
+
+    @testify.teardown
+    def destroy_vms(self):
+        for vm in self.vms:
+            delete_vm(**vm)
+
+    def test_showvminfo_many(self):
+        keys = [vm['uuid'] for vm in self.vms] + ['missing']
+        results = dict(showvminfo_many(keys, workers=2))
+        for vm in self.vms:
+            testify.assert_equal(results[vm['uuid']]['name'], vm['name'])
+        testify.assert_isinstance(results['missing'], CommandError)
+
+
 class UnregisterTestCase(testify.TestCase):
     @testify.setup
     def setup_unregistervm(self):
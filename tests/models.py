@@ -5,3 +5,80 @@ This module contains the unit tests for the models module.
 :copyright: (c) 2012 by Sean Plaice
 :license: ISC, see LICENSE for more details.
 """
+
+import logging
+import os
+import codecs
+import testify
+
+from virtbox.models import VMInfo
+from virtbox.parsers import parse_showvminfo
+
+
+# setup module level logger
+logger = logging.getLogger(__name__)
+
+
+VBOXMANAGE_SHOWVMINFO = os.path.join('parser_test_data',
+    'vboxmanage_showvminfo.txt')
+
+
+class VMInfoTestCase(testify.TestCase):
+    @testify.setup
+    def setup(self):
+        with codecs.open(VBOXMANAGE_SHOWVMINFO, 'r', 'utf-8') as stdout:
+            self.vm_info = parse_showvminfo(stdout.read(), '')
+
+    def test_mapping_returns_raw_strings(self):
+        testify.assert_equal(self.vm_info['memory'], '256')
+        testify.assert_equal(self.vm_info['rtcuseutc'], 'on')
+        testify.assert_equal(self.vm_info['uuid'],
+                'f4b0a749-820b-43c2-967e-a7a5f539cfd7')
+        testify.assert_equal(self.vm_info['primary-0-0'], '/tmp/abc123.vdi')
+        testify.assert_in('cfgfile', list(self.vm_info))
+        testify.assert_equal(dict(self.vm_info)['name'], 'jangofett')
+
+    def test_values_with_equals_and_newlines(self):
+        testify.assert_equal(self.vm_info['description'],
+                'kernel args: console=ttyS0 root=/dev/sda1\n'
+                'second line with a "quote"')
+        testify.assert_equal(self.vm_info['forwarding(0)'],
+                'ssh,tcp,,2222,,22')
+        testify.assert_equal(self.vm_info['guestmemoryballoon'], '0')
+
+    def test_typed_attributes(self):
+        testify.assert_equal(self.vm_info.memory, 256)
+        testify.assert_equal(self.vm_info.cpus, 1)
+        testify.assert_equal(self.vm_info.hwvirtex, True)
+        testify.assert_equal(self.vm_info.hpet, False)
+        testify.assert_equal(self.vm_info.ostype, 'Other/Unknown')
+        testify.assert_equal(self.vm_info.uuid,
+                'f4b0a749-820b-43c2-967e-a7a5f539cfd7')
+        testify.assert_raises(AttributeError, getattr, self.vm_info,
+                'nosuchfield')
+
+    def test_nics(self):
+        nics = self.vm_info.nics
+        testify.assert_equal([nic['index'] for nic in nics], [1, 2])
+        testify.assert_equal(nics[0]['nic'], 'nat')
+        testify.assert_equal(nics[0]['cableconnected'], True)
+        testify.assert_equal(nics[1]['hostonlyadapter'], 'vboxnet0')
+        testify.assert_equal(nics[1]['cableconnected'], False)
+        testify.assert_equal(self.vm_info.nics is nics, True)
+
+    def test_storage(self):
+        storage = self.vm_info.storage
+        testify.assert_equal(len(storage), 1)
+        testify.assert_equal(storage[0]['name'], 'primary')
+        testify.assert_equal(storage[0]['portcount'], 2)
+        testify.assert_equal(storage[0]['bootable'], True)
+        testify.assert_equal(storage[0]['attachments'][(0, 0)],
+                {'medium': '/tmp/abc123.vdi',
+                 'uuid': 'e0bfd47f-5a29-4c5e-b325-79c4d032a02f'})
+        testify.assert_equal(storage[0]['attachments'][(1, 0)]['medium'],
+                'none')
+
+    def test_slots(self):
+        testify.assert_raises(AttributeError, setattr, self.vm_info,
+                'memory', 512)
+        testify.assert_equal(VMInfo({'memory': '1'}), {'memory': '1'})
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the unit tests for the options module.
+
+:copyright: (c) 2012 by Sean Plaice
+:license: ISC, see LICENSE for more details.
+"""
+
+import logging
+import testify
+
+from virtbox.errors import VirtboxManageError
+from virtbox.options import (
+        Option,
+        OptionSpec,
+        MODIFYVM_OPTIONS,
+        STORAGEATTACH_OPTIONS,
+        CREATEHD_OPTIONS,
+        )
+
+
+# setup module level logger
+logger = logging.getLogger(__name__)
+
+
+class OptionSpecTestCase(testify.TestCase):
+    @testify.setup
+    def setup_spec(self):
+        self.spec = OptionSpec(
+            Option('memory'),
+            Option('ctl_type', flag='--add', choices=('sata', 'ide')),
+            Option('speed', fmt='%d'),
+            Option('removeall', switch=True),
+            Option('uart', multi=True))
+
+    def test_build_in_call_order(self):
+        argv = self.spec.build(['modifyvm'], {'speed': 100, 'memory': '64'})
+        testify.assert_equal(argv,
+                ['modifyvm', '--speed', '100', '--memory', '64'])
+
+    def test_build_skips_unset(self):
+        argv = self.spec.build([], {'memory': None, 'removeall': False})
+        testify.assert_equal(argv, [])
+
+    def test_build_switch_and_multi(self):
+        argv = self.spec.build([], {'removeall': True, 'uart': '0x3F8 4'})
+        testify.assert_equal(argv, ['--removeall', '--uart', '0x3F8', '4'])
+
+    def test_build_choices(self):
+        argv = self.spec.build([], {'ctl_type': 'sata'})
+        testify.assert_equal(argv, ['--add', 'sata'])
+        testify.assert_raises(VirtboxManageError, self.spec.build, [],
+                {'ctl_type': 'floppy'})
+
+    def test_build_unknown_option(self):
+        testify.assert_raises(VirtboxManageError, self.spec.build, [],
+                {'bogus': 'on'})
+
+
+class CommandSpecsTestCase(testify.TestCase):
+    def test_modifyvm_flags(self):
+        argv = MODIFYVM_OPTIONS.build([], {'ioapic': 'on',
+            'teleporterpassword': 'secret', 'cabelconnected1': 'on',
+            'nic7': 'nat'})
+        testify.assert_equal(argv, ['--ioapic', 'on',
+            '--teleporterpassword', 'secret', '--cableconnected1', 'on',
+            '--nic7', 'nat'])
+
+    def test_modifyvm_choices(self):
+        testify.assert_raises(VirtboxManageError, MODIFYVM_OPTIONS.build, [],
+                {'nictype1': 'e1000'})
+
+    def test_storageattach_flags(self):
+        argv = STORAGEATTACH_OPTIONS.build([], {'name': 'primary',
+            'storage_type': 'hdd', 'mtype': 'immutable',
+            'forceunmount': True})
+        testify.assert_equal(argv, ['--storagectl', 'primary', '--type',
+            'hdd', '--mtype', 'immutable', '--forceunmount'])
+
+    def test_createhd_flags(self):
+        argv = CREATEHD_OPTIONS.build([], {'hd_format': 'VMDK',
+            'variant': 'Fixed'})
+        testify.assert_equal(argv, ['--format', 'VMDK', '--variant',
+            'Fixed'])
@@ -9,10 +9,19 @@ This module contains the unit tests for the parsers module.
 import logging
 import os
 import codecs
+import threading
+import time
 import testify
 
+from pyparsing import Word, alphas, ParseException
 
-from virtbox.parsers import parse_createhd, parse_list_ostypes, parse_startvm
+from virtbox.parsers import (parse_createhd, parse_list_ostypes,
+        parse_startvm, parse_list_vms, iter_parse_list_vms,
+        iter_parse_list_ostypes, iter_parse_list_hdds, grammar, get_grammar,
+        clear_grammars, set_parser_engine, get_parser_engine,
+        parse_machinereadable, parse_showvminfo, iter_parse_list_vms_long,
+        parse_list_systemproperties, parse_list_hddbackends)
+from virtbox import parsers
 
 
 # setup module level logger
@@ -23,6 +32,18 @@ VBOXMANAGE_LIST_OSTYPES = os.path.join('parser_test_data',
     'vboxmanage_list_ostypes.txt')
 VBOXMANAGE_STARTVM = os.path.join('parser_test_data',
     'vboxmanage_startvm.txt')
+VBOXMANAGE_LIST_HDDS = os.path.join('parser_test_data',
+    'vboxmanage_list_hdds.txt')
+VBOXMANAGE_SHOWVMINFO = os.path.join('parser_test_data',
+    'vboxmanage_showvminfo.txt')
+VBOXMANAGE_LIST_LONG_VMS = os.path.join('parser_test_data',
+    'vboxmanage_list_long_vms.txt')
+VBOXMANAGE_LIST_SYSTEMPROPERTIES = os.path.join('parser_test_data',
+    'vboxmanage_list_systemproperties.txt')
+VBOXMANAGE_LIST_HDDBACKENDS = os.path.join('parser_test_data',
+    'vboxmanage_list_hddbackends.txt')
+# <parser>-<case>.txt outputs both parser engines must agree on
+EQUIVALENCE_CORPUS = os.path.join('parser_test_data', 'equivalence')
 
 
 class ParseListOSTypesTestCase(testify.TestCase):
@@ -38,6 +59,121 @@ class ParseListOSTypesTestCase(testify.TestCase):
         testify.assert_equal(ostypes[0]['os_desc'], 'Other/Unknown')
         testify.assert_equal(ostypes[0]['os_type'], 'Other')
 
+    def test_iter_parse_ostypes_matches_list(self):
+        lines = iter(self.stdout.splitlines())
+        ostypes = iter_parse_list_ostypes(lines)
+        testify.assert_equal(next(ostypes), {'os_type': 'Other',
+            'os_desc': 'Other/Unknown'})
+        # only the first block has been consumed
+        testify.assert_equal(next(lines), 'ID:          Windows31')
+        testify.assert_equal(
+                list(iter_parse_list_ostypes(self.stdout.splitlines())),
+                parse_list_ostypes(self.stdout, self.stderr))
+
+
+class ParseMachineReadableTestCase(testify.TestCase):
+    def test_quoting(self):
+        stdout = ('name="a=b"\r\n'
+            '"SATA-0-0"="/tmp/x.vdi"\r\n'
+            'memory=128\r\n'
+            'description="say "hi""\r\n'
+            'escaped="C:\\\\vms \\"x\\""\r\n'
+            'empty=""\r\n')
+        testify.assert_equal(parse_machinereadable(stdout), {
+            'name': 'a=b',
+            'SATA-0-0': '/tmp/x.vdi',
+            'memory': '128',
+            'description': 'say "hi"',
+            'escaped': 'C:\\vms "x"',
+            'empty': ''})
+
+
+class IterParseListVMsTestCase(testify.TestCase):
+    def test_iter_parse_list_vms(self):
+        stdout = ('"jangofett" {f4b0a749-820b-43c2-967e-a7a5f539cfd7}\n'
+            '"bobafett" {00b0a749-820b-43c2-967e-a7a5f539cfd7}\n')
+        vms = list(iter_parse_list_vms(stdout.splitlines()))
+        testify.assert_equal(vms, parse_list_vms(stdout, ''))
+
+    def test_iter_parse_list_vms_odd_names(self):
+        stdout = '"my \"vm\" {1}" {f4b0a749-820b-43c2-967e-a7a5f539cfd7}\n'
+        vms = list(iter_parse_list_vms(stdout.splitlines()))
+        testify.assert_equal(vms[0]['name'], 'my "vm" {1}')
+
+
+class IterParseListVMsLongTestCase(testify.TestCase):
+    @testify.setup
+    def setup(self):
+        with codecs.open(VBOXMANAGE_LIST_LONG_VMS, 'r', 'utf-8') as stdout:
+            self.vms = list(iter_parse_list_vms_long(stdout))
+
+    def test_one_record_per_vm(self):
+        testify.assert_equal([vm['name'] for vm in self.vms],
+                ['jangofett', 'bobafett'])
+        testify.assert_equal(self.vms[1]['uuid'],
+                '00b0a749-820b-43c2-967e-a7a5f539cfd7')
+
+    def test_matches_showvminfo_record(self):
+        with codecs.open(VBOXMANAGE_SHOWVMINFO, 'r', 'utf-8') as stdout:
+            vm_info = parse_showvminfo(stdout.read(), '')
+        for key, value in self.vms[0].items():
+            testify.assert_equal((key, value), (key, vm_info[key]))
+        for nic, expected in zip(self.vms[0].nics, vm_info.nics):
+            for key, value in nic.items():
+                testify.assert_equal(value, expected[key])
+        testify.assert_equal(self.vms[0].storage[0]['attachments'][(0, 0)],
+                vm_info.storage[0]['attachments'][(0, 0)])
+
+    def test_conversions(self):
+        testify.assert_equal(self.vms[1].memory, 1024)
+        testify.assert_equal(self.vms[1]['rtcuseutc'], 'off')
+        testify.assert_equal(self.vms[1]['vmstate'], 'running')
+        testify.assert_equal(self.vms[1].nics[0]['bridgeadapter'], 'eth0')
+        testify.assert_equal(self.vms[1].nics[0]['nicspeed'], '1000000')
+
+
+class IterParseListHDDsTestCase(testify.TestCase):
+    @testify.setup
+    def setup(self):
+        with codecs.open(VBOXMANAGE_LIST_HDDS, 'r', 'utf-8') as stdout:
+            self.hdds = list(iter_parse_list_hdds(stdout))
+
+    def test_iter_parse_list_hdds(self):
+        testify.assert_equal(len(self.hdds), 2)
+        testify.assert_equal(self.hdds[0]['uuid'],
+                '2e7b1d2a-4c3f-4b7e-9d53-0f7e2b6f2a11')
+        testify.assert_equal(self.hdds[0]['location'],
+                '/home/virtbox/VirtualBox VMs/jangofett/jangofett.vdi')
+        testify.assert_equal(self.hdds[1]['parent_uuid'],
+                self.hdds[0]['uuid'])
+        testify.assert_equal(self.hdds[1]['storage_format'], 'VDI')
+        testify.assert_equal(self.hdds[1]['capacity'], '8192 MBytes')
+
+
+class ParseListSystemPropertiesTestCase(testify.TestCase):
+    def test_parse_list_systemproperties(self):
+        with codecs.open(VBOXMANAGE_LIST_SYSTEMPROPERTIES, 'r',
+                'utf-8') as stdout:
+            properties = parse_list_systemproperties(stdout.read(), '')
+        testify.assert_equal(properties['default_machine_folder'],
+                '/home/jangofett/VirtualBox VMs')
+        testify.assert_equal(properties['maximum_guest_cpu_count'], '32')
+        testify.assert_equal(properties['virtual_disk_limit_info'],
+                '2199022206976 Bytes')
+        testify.assert_equal(properties['default_frontend'], '')
+
+
+class ParseListHDDBackendsTestCase(testify.TestCase):
+    def test_parse_list_hddbackends(self):
+        with codecs.open(VBOXMANAGE_LIST_HDDBACKENDS, 'r', 'utf-8') as stdout:
+            backends = parse_list_hddbackends(stdout.read(), '')
+        testify.assert_equal([backend['id'] for backend in backends],
+                ['VDI', 'VMDK', 'VHD', 'iSCSI'])
+        testify.assert_equal(backends[0]['capabilities'], '0x1bf')
+        testify.assert_equal(backends[0]['config'], 'none')
+        testify.assert_equal(backends[3]['index'], 3)
+        testify.assert_in('WriteSplit=262144', backends[3]['config'])
+
 
 class ParseStartVMTestCase(testify.TestCase):
     @testify.setup
@@ -63,3 +199,88 @@ class ParseCreateHDTestCase(testify.TestCase):
                 '00bfd47f-5a29-4c5e-b325-79c4d032a02f')
         testify.assert_equal(out['uuid'],
                 'e0bfd47f-5a29-4c5e-b325-79c4d032a02f')
+
+
+class GrammarRegistryTestCase(testify.TestCase):
+    @testify.setup
+    def register_grammar(self):
+        self.builds = 0
+
+        @grammar('test_word')
+        def build():
+            self.builds += 1
+            time.sleep(0.05)
+            return Word(alphas)
+
+    @testify.teardown
+    def unregister_grammar(self):
+        del parsers._grammar_builders['test_word']
+        clear_grammars()
+
+    def test_grammar_built_once(self):
+        element = get_grammar('test_word')
+        testify.assert_equal(get_grammar('test_word') is element, True)
+        testify.assert_equal(self.builds, 1)
+
+    def test_grammar_built_once_under_threads(self):
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(get_grammar('test_word')))
+            for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        testify.assert_equal(self.builds, 1)
+        testify.assert_equal(len(set(map(id, results))), 1)
+
+    def test_clear_grammars_rebuilds(self):
+        get_grammar('test_word')
+        clear_grammars()
+        get_grammar('test_word')
+        testify.assert_equal(self.builds, 2)
+
+
+def parse_corpus(engine):
+    results = {}
+    for filename in sorted(os.listdir(EQUIVALENCE_CORPUS)):
+        parse = getattr(parsers, 'parse_%s' % filename.split('-')[0])
+        with codecs.open(os.path.join(EQUIVALENCE_CORPUS, filename), 'r',
+                'utf-8') as stdout:
+            try:
+                results[filename] = parse(stdout.read(), '', engine=engine)
+            except ParseException:
+                results[filename] = ParseException
+    return results
+
+
+class ParserEngineTestCase(testify.TestCase):
+    @testify.teardown
+    def reset_engine(self):
+        set_parser_engine('fast')
+
+    def test_engines_agree_on_corpus(self):
+        fast = parse_corpus('fast')
+        pyparsing = parse_corpus('pyparsing')
+        testify.assert_gte(len(fast), 20)
+        for filename in fast:
+            testify.assert_equal((filename, fast[filename]),
+                    (filename, pyparsing[filename]))
+
+    def test_fast_path_matches_common_outputs(self):
+        for filename in os.listdir(EQUIVALENCE_CORPUS):
+            if not filename.endswith(('-basic.txt', '-captured.txt')):
+                continue
+            parse = getattr(parsers, 'parse_%s' % filename.split('-')[0])
+            with codecs.open(os.path.join(EQUIVALENCE_CORPUS, filename), 'r',
+                    'utf-8') as stdout:
+                testify.assert_not_equal(parse.fast(stdout.read()), None)
+
+    def test_set_parser_engine(self):
+        set_parser_engine('pyparsing')
+        testify.assert_equal(get_parser_engine(), 'pyparsing')
+        testify.assert_raises(ValueError, set_parser_engine, 'regex')
+
+    def test_unknown_engine_per_call(self):
+        testify.assert_raises(ValueError, parse_createhd,
+                'Disk image created. UUID: x', '', engine='regex')
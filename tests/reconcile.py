@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the unit tests for the reconcile module.
+
+:copyright: (c) 2012 by Sean Plaice
+:license: ISC, see LICENSE for more details.
+"""
+
+import codecs
+import logging
+import os
+import shutil
+import tempfile
+import testify
+
+from virtbox import commands
+from virtbox.cassette import Recorder
+from virtbox.errors import VirtboxManageError
+from virtbox.parsers import parse_showvminfo
+from virtbox.reconcile import VMSpec, plan, reconcile, reconcile_many
+from virtbox.utils import get_executor, set_executor
+
+from tests import catch
+
+
+# setup module level logger
+logger = logging.getLogger(__name__)
+
+
+SIMULATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+    'tools', 'vboxmanage_sim.py')
+
+
+def jangofett(**hardware):
+    # the vm in parser_test_data/vboxmanage_showvminfo.txt
+    options = {'memory': 256, 'cpus': 1, 'ioapic': False, 'firmware': 'bios'}
+    options.update(hardware)
+    return VMSpec('jangofett', ostype='Other', hardware=options,
+            nics=[{'nic': 'nat', 'macaddress': '08:00:27:a1:b2:c3'},
+                  {'nic': 'hostonly', 'hostonlyadapter': 'vboxnet0',
+                   'cableconnected': False}],
+            controllers=[{'name': 'primary', 'ctl_type': 'sata'}],
+            disks=[{'controller': 'primary', 'port': 0, 'device': 0,
+                    'filename': '/tmp/abc123.vdi', 'size': '128'}])
+
+
+class PlanTestCase(testify.TestCase):
+    @testify.setup
+    def setup(self):
+        with codecs.open(os.path.join('parser_test_data',
+                'vboxmanage_showvminfo.txt'), 'r', 'utf-8') as fn:
+            self.info = parse_showvminfo(fn.read(), '')
+        self.uuid = self.info['uuid']
+
+    def test_unchanged(self):
+        testify.assert_equal(plan(jangofett(), self.info,
+            {'Other': 'Other/Unknown'}), [])
+
+    def test_changes_fold_into_one_modifyvm(self):
+        spec = jangofett(memory=512, ioapic=True, vram=8)
+        spec.disks.append({'controller': 'primary', 'port': 1,
+            'device': 0, 'medium': 'e0bfd47f-0000-4c5e-b325-79c4d032a02f',
+            'storage_type': 'hdd'})
+        testify.assert_equal(plan(spec, self.info,
+            {'Other': 'Other/Unknown'}), [
+            ('modifyvm', {'vm_uuid': self.uuid, 'ioapic': 'on',
+                'memory': '512'}),
+            ('storageattach', {'uuid': self.uuid, 'name': 'primary',
+                'port': '1', 'device': '0', 'storage_type': 'hdd',
+                'medium': 'e0bfd47f-0000-4c5e-b325-79c4d032a02f'}),
+        ])
+
+    def test_new_vm(self):
+        steps = plan(jangofett(), None)
+        testify.assert_equal([command for command, _ in steps],
+                ['createvm', 'modifyvm', 'storagectl_add', 'createhd',
+                    'storageattach'])
+        testify.assert_equal(steps[1][1]['vm_name'], 'jangofett')
+        testify.assert_equal(steps[1][1]['cabelconnected2'], 'off')
+        testify.assert_equal(steps[2][1], {'vmname': 'jangofett',
+            'name': 'primary', 'ctl_type': 'sata'})
+
+    def test_conflicts(self):
+        spec = VMSpec('jangofett', controllers=[{'name': 'primary',
+            'ctl_type': 'ide'}])
+        exc = catch(VirtboxManageError, plan, spec, self.info)
+        testify.assert_equal(exc.reason,
+                'controller primary of jangofett is sata, not ide')
+
+        spec = VMSpec('jangofett', disks=[{'controller': 'secondary',
+            'port': 0, 'device': 0, 'medium': 'emptydrive'}])
+        catch(VirtboxManageError, plan, spec, self.info)
+        catch(VirtboxManageError, VMSpec, 'jangofett',
+                hardware={'bogus': 1})
+
+
+class ReconcileTestCase(testify.TestCase):
+    @testify.setup
+    def setup(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.saved_state = os.environ.get('VBOXSIM_STATE')
+        os.environ['VBOXSIM_STATE'] = os.path.join(self.tmp_dir, 'sim.json')
+        commands.set_vboxmanage_path(SIMULATOR)
+
+    @testify.teardown
+    def teardown(self):
+        set_executor(None)
+        commands.set_vboxmanage_path(None)
+        if self.saved_state is None:
+            os.environ.pop('VBOXSIM_STATE', None)
+        else:
+            os.environ['VBOXSIM_STATE'] = self.saved_state
+        shutil.rmtree(self.tmp_dir)
+
+    def spec(self, name, memory=256):
+        # the simulator creates no files, the images always look missing
+        return VMSpec(name, hardware={'memory': memory, 'cpus': 2},
+                nics=[{'nic': 'hostonly', 'hostonlyadapter': 'vboxnet0'}],
+                controllers=[{'name': 'primary', 'ctl_type': 'sata',
+                    'sataportcount': 2}],
+                disks=[{'controller': 'primary', 'port': 0, 'device': 0,
+                    'filename': os.path.join('/tmp', name + '.vdi'),
+                    'size': '128'}])
+
+    def test_reapply_costs_one_read(self):
+        spec = self.spec('jangofett')
+        testify.assert_equal(len(reconcile(spec)), 5)
+
+        recorder = Recorder(os.path.join(self.tmp_dir, 'cassette.jsonl'),
+                get_executor())
+        set_executor(recorder)
+        testify.assert_equal(reconcile(spec), [])
+        testify.assert_equal(recorder.count, 1)
+
+        steps = reconcile(self.spec('jangofett', memory=512))
+        testify.assert_equal([command for command, _ in steps],
+                ['modifyvm'])
+        testify.assert_equal(recorder.count, 3)
+        recorder.close()
+
+    def test_reconcile_many(self):
+        specs = [self.spec(name) for name in ('jangofett', 'bobafett')]
+        reconcile(specs[0])
+        results = dict((spec.name, steps)
+                for spec, steps in reconcile_many(specs, workers=2))
+        testify.assert_equal(results['jangofett'], [])
+        testify.assert_equal(len(results['bobafett']), 5)
+
+        recorder = Recorder(os.path.join(self.tmp_dir, 'cassette.jsonl'),
+                get_executor())
+        set_executor(recorder)
+        results = list(reconcile_many(specs, dry_run=True))
+        testify.assert_equal([steps for _, steps in results], [[], []])
+        testify.assert_equal(recorder.count, 1)
+        recorder.close()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the unit tests for the retry module.
+
+:copyright: (c) 2012 by Sean Plaice
+:license: ISC, see LICENSE for more details.
+"""
+
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import testify
+
+from virtbox.errors import CommandError, CommandTimeout, CommandCancelled
+from virtbox.retry import RetryPolicy, retry_metrics, reset_retry_metrics
+from virtbox.utils import run_cmd, deadline
+
+from tests import catch
+from tests.errors import LOCKED, NOT_FOUND
+
+
+# setup module level logger
+logger = logging.getLogger(__name__)
+
+
+# fails with LOCKED on stderr until it has been run argv[2] times
+FLAKY = """import os, sys
+path, failures = sys.argv[1], int(sys.argv[2])
+count = int(open(path).read() or 0) if os.path.exists(path) else 0
+open(path, 'w').write(str(count + 1))
+if count < failures:
+    sys.stderr.write(sys.argv[3])
+    sys.exit(1)
+print('ok')
+"""
+
+
+class RetryPolicyTestCase(testify.TestCase):
+    @testify.setup
+    def setup_policy(self):
+        reset_retry_metrics()
+        self.policy = RetryPolicy(max_attempts=3, base_delay=0.001)
+        self.calls = 0
+
+    def failing(self, failures, stderr):
+        self.calls += 1
+        if self.calls <= failures:
+            raise CommandError(status_code=1, stderr=stderr)
+        return 'done'
+
+    def test_retries_transient(self):
+        testify.assert_equal(self.policy.call(self.failing, 2, LOCKED),
+                'done')
+        metrics = retry_metrics()
+        testify.assert_equal(metrics['retries'], 2)
+        testify.assert_equal(metrics['recovered'], 1)
+        testify.assert_equal(metrics['retries_by_code'],
+                {'object_locked': 2})
+
+    def test_gives_up_after_max_attempts(self):
+        testify.assert_raises(CommandError, self.policy.call, self.failing,
+                5, LOCKED)
+        testify.assert_equal(self.calls, 3)
+        testify.assert_equal(retry_metrics()['exhausted'], 1)
+
+    def test_permanent_not_retried(self):
+        testify.assert_raises(CommandError, self.policy.call, self.failing,
+                1, NOT_FOUND)
+        testify.assert_equal(self.calls, 1)
+        testify.assert_equal(retry_metrics()['retries'], 0)
+
+    def test_deadline(self):
+        policy = RetryPolicy(max_attempts=10, base_delay=1, jitter=False,
+                deadline=0.5)
+        testify.assert_raises(CommandError, policy.call, self.failing, 5,
+                LOCKED)
+        testify.assert_equal(self.calls, 1)
+
+    def test_enclosing_deadline(self):
+        policy = RetryPolicy(max_attempts=10, base_delay=1, jitter=False)
+        start = time.monotonic()
+        with deadline(0.5):
+            exc = catch(CommandTimeout, policy.call, self.failing, 5,
+                    LOCKED)
+        testify.assert_lt(time.monotonic() - start, 0.5)
+        testify.assert_lte(exc.timeout, 0.5)
+        testify.assert_equal(self.calls, 1)
+        testify.assert_equal(retry_metrics()['exhausted'], 1)
+
+    def test_cancel_interrupts_backoff(self):
+        policy = RetryPolicy(max_attempts=10, base_delay=5, jitter=False)
+        cancel = threading.Event()
+        threading.Timer(0.05, cancel.set).start()
+        start = time.monotonic()
+        with deadline(cancel=cancel):
+            catch(CommandCancelled, policy.call, self.failing, 5, LOCKED)
+        testify.assert_lt(time.monotonic() - start, 1)
+        testify.assert_equal(self.calls, 1)
+
+    def test_backoff_is_capped(self):
+        policy = RetryPolicy(base_delay=1, max_delay=4, jitter=False)
+        testify.assert_equal([policy.backoff(n) for n in range(1, 6)],
+                [1, 2, 4, 4, 4])
+
+
+class RunCmdRetryTestCase(testify.TestCase):
+    def test_run_cmd_retry(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            argv = [sys.executable, '-c', FLAKY, path, '2', LOCKED]
+            stdout, stderr = run_cmd(argv,
+                    retry=RetryPolicy(base_delay=0.001))
+            testify.assert_equal(stdout, 'ok\n')
+        finally:
+            os.remove(path)
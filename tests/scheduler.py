@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the unit tests for the scheduler module.
+
+:copyright: (c) 2012 by Sean Plaice
+:license: ISC, see LICENSE for more details.
+"""
+
+import logging
+import threading
+import time
+import testify
+
+from virtbox.errors import CommandError
+from virtbox.scheduler import Scheduler, vm_key
+
+from tests import catch
+
+
+# setup module level logger
+logger = logging.getLogger(__name__)
+
+
+def showvminfo(name=None, uuid=None):
+    return name
+
+
+def showhdinfo(uuid=None, filename=None):
+    return uuid
+
+
+def storageattach(uuid=None, vmname=None, name=None):
+    return uuid
+
+
+class VMKeyTestCase(testify.TestCase):
+    def test_vm_key_args(self):
+        testify.assert_equal(vm_key(None, {'vm_uuid': 'a', 'name': 'b'}), 'a')
+        testify.assert_equal(vm_key(None, {'vmname': 'foo',
+            'name': 'primary'}), 'foo')
+        testify.assert_equal(vm_key(None, {'name': 'primary'}), None)
+
+    def test_vm_key_name_commands(self):
+        testify.assert_equal(vm_key(showvminfo, {'name': 'foo'}), 'foo')
+
+    def test_vm_key_uuid_commands(self):
+        testify.assert_equal(vm_key(storageattach, {'uuid': 'a',
+            'name': 'SATA'}), 'a')
+        testify.assert_equal(vm_key(showvminfo, {'uuid': 'a'}), 'a')
+        testify.assert_equal(vm_key(showhdinfo, {'uuid': 'a'}), None)
+
+
+class SchedulerTestCase(testify.TestCase):
+    @testify.setup
+    def setup_scheduler(self):
+        self.scheduler = Scheduler(limit=4)
+        self.lock = threading.Lock()
+        self.active = {}
+        self.overlap = False
+        self.order = []
+
+    @testify.teardown
+    def shutdown_scheduler(self):
+        self.scheduler.shutdown()
+
+    def modifyvm(self, vm_uuid=None, step=None, fail=False):
+        with self.lock:
+            if self.active.get(vm_uuid):
+                self.overlap = True
+            self.active[vm_uuid] = True
+            self.order.append((vm_uuid, step))
+        time.sleep(0.02)
+        with self.lock:
+            self.active[vm_uuid] = False
+        if fail:
+            raise CommandError(status_code=1, stderr='locked')
+        return step
+
+    def test_same_vm_runs_in_order(self):
+        futures = [self.scheduler.submit(self.modifyvm, vm_uuid='a', step=i)
+                for i in range(5)]
+        testify.assert_equal([f.result() for f in futures], list(range(5)))
+        testify.assert_equal(self.order, [('a', i) for i in range(5)])
+        testify.assert_equal(self.overlap, False)
+
+    def test_different_vms_run_concurrently(self):
+        start = time.time()
+        futures = [self.scheduler.submit(self.modifyvm, vm_uuid=str(i))
+                for i in range(4)]
+        for future in futures:
+            future.result()
+        testify.assert_lt(time.time() - start, 0.07)
+
+    def test_failure_releases_vm(self):
+        failed = self.scheduler.submit(self.modifyvm, vm_uuid='a', fail=True)
+        after = self.scheduler.submit(self.modifyvm, vm_uuid='a', step=1)
+        testify.assert_raises(CommandError, failed.result)
+        testify.assert_equal(after.result(), 1)
+
+    def test_stats(self):
+        futures = [self.scheduler.submit(self.modifyvm, vm_uuid='a', step=i)
+                for i in range(3)]
+        stats = self.scheduler.stats()
+        testify.assert_equal(stats['queue_depth'], {'a': 2})
+        for future in futures:
+            future.result()
+        self.scheduler.shutdown()
+        stats = self.scheduler.stats()
+        testify.assert_equal(stats['completed'], 3)
+        testify.assert_equal(stats['queued'], 0)
+        testify.assert_gt(stats['wait_time_max'], 0.0)
+
+    def test_context_manager_drains_queues(self):
+        with Scheduler(limit=4) as scheduler:
+            futures = [scheduler.submit(self.modifyvm, vm_uuid='a', step=i)
+                    for i in range(3)]
+        testify.assert_equal([f.done() for f in futures], [True] * 3)
+        testify.assert_equal([f.result() for f in futures], [0, 1, 2])
+
+    def test_shutdown_without_wait_cancels_queued(self):
+        started, release = threading.Event(), threading.Event()
+
+        def startvm(vm_uuid=None):
+            started.set()
+            release.wait(1)
+            return vm_uuid
+
+        futures = [self.scheduler.submit(startvm, vm_uuid='a')]
+        futures.extend(self.scheduler.submit(self.modifyvm, vm_uuid='a',
+            step=i) for i in range(2))
+        started.wait(1)
+        self.scheduler.shutdown(wait=False)
+        release.set()
+        testify.assert_equal(futures[0].result(), 'a')
+        testify.assert_equal([f.cancelled() for f in futures[1:]],
+                [True, True])
+        catch(RuntimeError, self.scheduler.submit, self.modifyvm,
+                vm_uuid='a')
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the unit tests for the settings module.
+
+:copyright: (c) 2012 by Sean Plaice
+:license: ISC, see LICENSE for more details.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import testify
+
+from tests import catch
+from virtbox import commands, settings, manage
+from virtbox.errors import SettingsUnavailable, VirtboxMissingArgument
+
+
+# setup module level logger
+logger = logging.getLogger(__name__)
+
+
+SETTINGS_DIR = os.path.join('parser_test_data', 'settings')
+
+JANGOFETT_UUID = 'f4b0a749-820b-43c2-967e-a7a5f539cfd7'
+BOBAFETT_UUID = '9a1c3e5d-7b2f-4e61-8c0a-3d5f7e9b1c2d'
+BOBAFETT_HDD_UUID = '2e7b1d2a-4c3f-4b7e-9d53-0f7e2b6f2a11'
+
+
+class SettingsTestCase(testify.TestCase):
+    @testify.setup
+    def setup(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.home = os.path.join(self.tmp_dir, 'VirtualBox')
+        shutil.copytree(SETTINGS_DIR, self.home)
+        self.registry = os.path.join(self.home, 'VirtualBox.xml')
+        self.jangofett = os.path.join(self.home, 'jangofett',
+                'jangofett.vbox')
+        settings.clear()
+        settings.set_registry_path(self.registry)
+        settings._ostypes = {'Other': 'Other/Unknown',
+                'Ubuntu_64': 'Ubuntu (64 bit)'}
+
+    @testify.teardown
+    def teardown(self):
+        settings.set_registry_path(None)
+        settings.set_read_backend('vboxmanage')
+        settings.clear()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_list_vms(self):
+        testify.assert_equal(settings.list_vms(), [
+            {'name': 'jangofett', 'uuid': JANGOFETT_UUID},
+            {'name': 'bobafett', 'uuid': BOBAFETT_UUID}])
+
+    def test_showvminfo(self):
+        vm_info = settings.showvminfo(name='jangofett')
+        testify.assert_equal(vm_info['uuid'], JANGOFETT_UUID)
+        testify.assert_equal(vm_info['ostype'], 'Other/Unknown')
+        testify.assert_equal(vm_info['cfgfile'], self.jangofett)
+        testify.assert_equal(vm_info.memory, 256)
+        testify.assert_equal(vm_info.cpus, 1)
+        testify.assert_equal([nic['nic'] for nic in vm_info.nics],
+                ['nat', 'hostonly'])
+        testify.assert_equal(vm_info.nics[1]['hostonlyadapter'], 'vboxnet0')
+        testify.assert_equal(vm_info.nics[1]['cableconnected'], False)
+        testify.assert_equal(vm_info.storage[0]['name'], 'primary')
+        testify.assert_equal(vm_info.storage[0]['attachments'][(0, 0)],
+                {'medium': '/tmp/abc123.vdi',
+                 'uuid': 'e0bfd47f-5a29-4c5e-b325-79c4d032a02f'})
+        testify.assert_equal(vm_info['description'],
+                'kernel args: console=ttyS0 root=/dev/sda1\n'
+                'second line with a "quote"')
+        testify.assert_not_in('vmstate', vm_info)
+
+    def test_showvminfo_skips_snapshots(self):
+        vm_info = settings.showvminfo(uuid=BOBAFETT_UUID)
+        testify.assert_equal(vm_info.memory, 1024)
+        testify.assert_equal(vm_info['vmstate'], 'saved')
+        testify.assert_equal(vm_info['ostype'], 'Ubuntu (64 bit)')
+        testify.assert_equal(vm_info.nics[0]['bridgeadapter'], 'eth0')
+        attachments = vm_info.storage[0]['attachments']
+        testify.assert_equal(attachments[(0, 0)]['uuid'],
+                '7c1f0b55-9a0e-4f77-8d0c-5b1b9e1c3d22')
+        # a medium in the global registry
+        testify.assert_equal(attachments[(1, 0)]['medium'],
+                '/srv/iso/ubuntu-12.04-server-amd64.iso')
+
+    def test_list_hdds(self):
+        hdds = dict((hdd['uuid'], hdd) for hdd in settings.list_hdds())
+        testify.assert_equal(len(hdds), 4)
+        child = hdds['7c1f0b55-9a0e-4f77-8d0c-5b1b9e1c3d22']
+        testify.assert_equal(child['parent_uuid'],
+                '2e7b1d2a-4c3f-4b7e-9d53-0f7e2b6f2a11')
+        testify.assert_equal(child['type'], 'normal (differencing)')
+        testify.assert_equal(hdds['2e7b1d2a-4c3f-4b7e-9d53-0f7e2b6f2a11'][
+            'location'], os.path.join(self.home, 'bobafett', 'bobafett.vdi'))
+        testify.assert_equal(hdds['5c6d7e8f-0a1b-4c2d-8e3f-4a5b6c7d8e9f'][
+            'type'], 'immutable (base)')
+
+    def test_parse_cached_until_changed(self):
+        first = settings.showvminfo(name='jangofett')
+        parsed = settings._parsed[self.jangofett]
+        settings.showvminfo(name='jangofett')
+        testify.assert_is(settings._parsed[self.jangofett], parsed)
+
+        with open(self.jangofett) as fn:
+            content = fn.read()
+        with open(self.jangofett, 'w') as fn:
+            fn.write(content.replace('RAMSize="256"', 'RAMSize="512"'))
+        # same size, so make sure the mtime moves on coarse filesystems
+        stat = os.stat(self.jangofett)
+        os.utime(self.jangofett, ns=(stat.st_atime_ns,
+                stat.st_mtime_ns + 10 ** 9))
+        testify.assert_equal(first.memory, 256)
+        testify.assert_equal(settings.showvminfo(name='jangofett').memory,
+                512)
+
+    def test_unavailable(self):
+        with open(self.jangofett + settings.WRITE_SUFFIX, 'w'):
+            pass
+        catch(SettingsUnavailable, settings.showvminfo, name='jangofett')
+        os.remove(self.jangofett + settings.WRITE_SUFFIX)
+
+        with open(self.jangofett, 'w') as fn:
+            fn.write('<?xml version="1.0"?>\n<VirtualBox><Machine')
+        catch(SettingsUnavailable, settings.list_vms)
+
+        os.remove(self.jangofett)
+        catch(SettingsUnavailable, settings.list_vms)
+        catch(SettingsUnavailable, settings.showvminfo, name='missing')
+
+    def test_showhdinfo(self):
+        hd_info = settings.showhdinfo(filename=os.path.join('parser_test_data',
+            'hdimage', 'jangofett.vdi'))
+        testify.assert_equal(hd_info['logical_size'], '128 MBytes')
+        testify.assert_equal(hd_info['type'], 'normal (base)')
+        catch(SettingsUnavailable, settings.showhdinfo,
+                uuid='00000000-0000-0000-0000-000000000001')
+        # registered, but the image itself is missing
+        catch(SettingsUnavailable, settings.showhdinfo,
+                uuid='5c6d7e8f-0a1b-4c2d-8e3f-4a5b6c7d8e9f')
+        catch(VirtboxMissingArgument, settings.showhdinfo)
+
+    def test_manage_reads_settings(self):
+        settings.set_read_backend('settings')
+        testify.assert_equal(manage.showvminfo(uuid=JANGOFETT_UUID)['name'],
+                'jangofett')
+        testify.assert_equal(len(manage.list_vms()), 2)
+
+    def test_showhdinfo_many_by_uuid(self):
+        shutil.copy(os.path.join('parser_test_data', 'hdimage',
+            'jangofett.vdi'), os.path.join(self.home, 'bobafett',
+                'bobafett.vdi'))
+        settings.set_read_backend('settings')
+        # VBoxManage must not be needed
+        commands.set_vboxmanage_path('/nonexistent/VBoxManage')
+        try:
+            results = dict(manage.showhdinfo_many([BOBAFETT_HDD_UUID]))
+        finally:
+            commands.set_vboxmanage_path(None)
+        testify.assert_equal(results[BOBAFETT_HDD_UUID]['logical_size'],
+                '128 MBytes')
+
+    def test_showvminfo_many_by_uuid_and_name(self):
+        settings.set_read_backend('settings')
+        results = dict(manage.showvminfo_many([JANGOFETT_UUID, 'bobafett']))
+        testify.assert_equal(results[JANGOFETT_UUID]['name'], 'jangofett')
+        testify.assert_equal(results['bobafett']['uuid'], BOBAFETT_UUID)
+
+    def test_set_read_backend(self):
+        catch(ValueError, settings.set_read_backend, 'registry')
+        testify.assert_equal(settings.get_read_backend(), 'vboxmanage')
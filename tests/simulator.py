@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the unit tests for tools/vboxmanage_sim.py, driving
+virtbox.manage against it.
+
+:copyright: (c) 2012 by Sean Plaice
+:license: ISC, see LICENSE for more details.
+"""
+
+import importlib.util
+import logging
+import os
+import shutil
+import tempfile
+import testify
+
+from tests import catch
+from virtbox import commands, manage
+from virtbox.errors import CommandError
+from virtbox.parsers import parse_list_vms_long
+
+
+# setup module level logger
+logger = logging.getLogger(__name__)
+
+
+SIMULATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+    'tools', 'vboxmanage_sim.py')
+
+
+def load_simulator():
+    spec = importlib.util.spec_from_file_location('vboxmanage_sim',
+            SIMULATOR)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class SimulatorTestCase(testify.TestCase):
+    @testify.setup
+    def setup(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.saved_env = dict((key, os.environ.get(key)) for key in
+                ('VBOXSIM_STATE', 'VBOXSIM_FAIL_RATE'))
+        os.environ['VBOXSIM_STATE'] = os.path.join(self.tmp_dir, 'sim.json')
+        commands.set_vboxmanage_path(SIMULATOR)
+
+    @testify.teardown
+    def teardown(self):
+        commands.set_vboxmanage_path(None)
+        for key, value in self.saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        shutil.rmtree(self.tmp_dir)
+
+    def create(self, name):
+        # in the default machine folder, the simulator writes no files
+        vm = manage.createvm(name=name, ostype='Ubuntu_64')
+        manage.storagectl_add(uuid=vm['uuid'], name='primary',
+                ctl_type='sata', sataportcount=2)
+        hdd = manage.createhd(filename=os.path.join(
+            os.path.dirname(vm['file_path']), name), size='128')
+        manage.storageattach(uuid=vm['uuid'], name='primary', port='0',
+                device='0', storage_type='hdd', medium=hdd['uuid'])
+        return vm, hdd
+
+    def test_provision(self):
+        testify.assert_equal(commands.version()[0], SIMULATOR)
+        vm, hdd = self.create('jangofett')
+        folder = os.path.dirname(vm['file_path'])
+        testify.assert_equal(os.path.basename(vm['file_path']),
+                'jangofett.vbox')
+        manage.modifyvm(vm_uuid=vm['uuid'], memory='256', nic2='hostonly',
+                hostonlyadapter2='vboxnet0')
+
+        vm_info = manage.showvminfo(uuid=vm['uuid'])
+        testify.assert_equal(vm_info['name'], 'jangofett')
+        testify.assert_equal(vm_info['ostype'], 'Ubuntu (64 bit)')
+        testify.assert_equal(vm_info.memory, 256)
+        testify.assert_equal(vm_info.nics[1]['hostonlyadapter'], 'vboxnet0')
+        testify.assert_equal(vm_info.storage[0]['attachments'][(0, 0)],
+                {'medium': os.path.join(folder, 'jangofett.vdi'),
+                 'uuid': hdd['uuid']})
+        testify.assert_equal(manage.list_vms(), [{'name': 'jangofett',
+            'uuid': vm['uuid']}])
+
+        hd_info = manage.showhdinfo(uuid=hdd['uuid'])
+        testify.assert_equal(hd_info['logical_size'], '128 MBytes')
+
+    def test_list_long_matches_showvminfo(self):
+        vm, _ = self.create('jangofett')
+        manage.startvm(vm_uuid=vm['uuid'], start_type='headless')
+        vm_info = manage.showvminfo(uuid=vm['uuid'])
+        listed = manage.list_vms(long=True)[0]
+        for key in ('name', 'uuid', 'ostype', 'cfgfile', 'memory', 'cpus',
+                'vmstate', 'nic1', 'macaddress1', 'storagecontrollername0',
+                'primary-imageuuid-0-0'):
+            testify.assert_equal(listed[key], vm_info[key])
+        testify.assert_equal(vm_info['vmstate'], 'running')
+
+    def test_lifecycle(self):
+        vm, hdd = self.create('jangofett')
+        other, _ = self.create('bobafett')
+        manage.startvm(vm_uuid=vm['uuid'])
+        testify.assert_equal(len(manage.list_runningvms()), 1)
+
+        exc = catch(CommandError, manage.unregistervm, uuid=vm['uuid'])
+        testify.assert_equal(exc.error_code, 'object_locked')
+        exc = catch(CommandError, manage.closemedium, medium_type='disk',
+                uuid=hdd['uuid'])
+        testify.assert_equal(exc.error_code, 'object_in_use')
+
+        manage.controlvm(vm_uuid=vm['uuid'], action='poweroff')
+        manage.unregistervm(uuid=vm['uuid'], delete=True)
+        testify.assert_equal(manage.list_vms(), [{'name': 'bobafett',
+            'uuid': other['uuid']}])
+        # --delete took the disk along
+        testify.assert_equal(len(manage.list_hdds()), 1)
+        exc = catch(CommandError, manage.showvminfo, uuid=vm['uuid'])
+        testify.assert_equal(exc.error_code, 'not_found')
+
+    def test_injected_failures(self):
+        os.environ['VBOXSIM_FAIL_RATE'] = '1'
+        exc = catch(CommandError, manage.list_vms)
+        testify.assert_equal(exc.transient, True)
+        # --version is never failed
+        manage.version()
+
+    def test_in_process(self):
+        sim = load_simulator()
+        simulator = sim.Simulator(seed=1)
+        status, stdout, _ = simulator.run(['createvm', '--name', 'bobafett',
+            '--register'])
+        testify.assert_equal(status, 0)
+        status, stdout, stderr = simulator.run(['list', '--long', 'vms'])
+        testify.assert_equal(parse_list_vms_long(stdout, stderr)[0]['name'],
+                'bobafett')
+        status, _, stderr = simulator.run(['bogus'])
+        testify.assert_equal(status, 2)
+        testify.assert_equal(stderr, "Syntax error: Invalid command 'bogus'\n")
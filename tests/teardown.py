@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the unit tests for the teardown module.
+
+:copyright: (c) 2012 by Sean Plaice
+:license: ISC, see LICENSE for more details.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import testify
+
+from virtbox.errors import CommandError
+from virtbox.models import VMInfo
+from virtbox.retry import RetryPolicy
+from virtbox.teardown import Teardown
+
+
+# setup module level logger
+logger = logging.getLogger(__name__)
+
+
+NO_DELAY = RetryPolicy(max_attempts=3, base_delay=0, jitter=False)
+
+
+class FakeManage(object):
+    """ The manage functions Teardown uses, over a list of vms and media.
+    """
+    def __init__(self, vms, hdds):
+        self.vms = vms
+        self.hdds = hdds
+        self.calls = []
+        # uuid -> stderr of the failures the next unregistervm calls raise
+        self.failures = {}
+        self.lock = threading.Lock()
+
+    def list_vms(self, long=False):
+        return [VMInfo(dict(vm)) for vm in self.vms]
+
+    def iter_hdds(self):
+        return iter([dict(hdd) for hdd in self.hdds])
+
+    def controlvm(self, vm_uuid=None, vm_name=None, action=None):
+        with self.lock:
+            self.calls.append(('controlvm', vm_uuid, action))
+
+    def unregistervm(self, name=None, uuid=None, delete=True):
+        with self.lock:
+            self.calls.append(('unregistervm', uuid, delete))
+            failures = self.failures.get(uuid)
+            if failures:
+                raise CommandError(status_code=1, cmd='unregistervm',
+                        stderr=failures.pop(0))
+            self.vms = [vm for vm in self.vms if vm['UUID'] != uuid]
+            self.hdds = [hdd for hdd in self.hdds
+                    if uuid not in hdd.get('in_use_by_vms', '')]
+
+    def closemedium(self, medium_type=None, uuid=None, filename=None,
+            delete=False):
+        with self.lock:
+            self.calls.append(('closemedium', uuid, delete))
+            self.hdds = [hdd for hdd in self.hdds if hdd['uuid'] != uuid]
+
+
+class TeardownTestCase(testify.TestCase):
+    @testify.setup
+    def setup(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cfgfiles = {}
+        for name in ('ci-jangofett', 'ci-bobafett', 'keeper'):
+            self.cfgfiles[name] = os.path.join(self.tmp_dir, name + '.vbox')
+            with open(self.cfgfiles[name], 'w'):
+                pass
+        vms = [
+            {'name': 'ci-jangofett', 'UUID': 'vm-1', 'VMState': 'running',
+             'CfgFile': self.cfgfiles['ci-jangofett']},
+            {'name': 'ci-bobafett', 'UUID': 'vm-2', 'VMState': 'poweroff',
+             'CfgFile': self.cfgfiles['ci-bobafett']},
+            {'name': 'keeper', 'UUID': 'vm-3', 'VMState': 'running',
+             'CfgFile': self.cfgfiles['keeper']},
+        ]
+        hdds = [
+            {'uuid': 'hd-1', 'parent_uuid': 'base',
+             'location': os.path.join(self.tmp_dir, 'ci-jangofett.vdi'),
+             'in_use_by_vms': 'ci-jangofett (UUID: vm-1)'},
+            {'uuid': 'hd-2', 'parent_uuid': 'base',
+             'location': os.path.join(self.tmp_dir, 'ci-base.vdi')},
+            {'uuid': 'hd-3', 'parent_uuid': 'hd-2',
+             'location': os.path.join(self.tmp_dir, 'ci-child.vdi')},
+            {'uuid': 'hd-4', 'parent_uuid': 'base',
+             'location': os.path.join(self.tmp_dir, 'keeper.vdi'),
+             'in_use_by_vms': 'keeper (UUID: vm-3)'},
+        ]
+        self.manage = FakeManage(vms, hdds)
+
+    @testify.teardown
+    def teardown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def teardown_engine(self, **kwargs):
+        kwargs.setdefault('prefix', 'ci-')
+        return Teardown(workers=2, retry=NO_DELAY, manage=self.manage,
+                **kwargs)
+
+    def test_removes_vms_then_orphans(self):
+        report = self.teardown_engine(media=True).run()
+        testify.assert_equal(sorted((vm['name'], vm['powered_off'])
+            for vm in report['vms']),
+            [('ci-bobafett', False), ('ci-jangofett', True)])
+        testify.assert_equal([hdd['uuid'] for hdd in report['media']],
+                ['hd-3', 'hd-2'])
+        testify.assert_equal(report['errors'], [])
+
+        vm_calls = [call for call in self.manage.calls if call[1] == 'vm-1']
+        testify.assert_equal(vm_calls, [('controlvm', 'vm-1', 'poweroff'),
+            ('unregistervm', 'vm-1', True)])
+        testify.assert_equal([vm['name'] for vm in self.manage.vms],
+                ['keeper'])
+        testify.assert_equal([hdd['uuid'] for hdd in self.manage.hdds],
+                ['hd-4'])
+
+    def test_dry_run(self):
+        report = self.teardown_engine(dry_run=True, media=True).run()
+        testify.assert_equal(self.manage.calls, [])
+        testify.assert_equal(report['dry_run'], True)
+        testify.assert_equal(sorted(vm['uuid'] for vm in report['vms']),
+                ['vm-1', 'vm-2'])
+        testify.assert_equal(sorted(hdd['uuid'] for hdd in report['media']),
+                ['hd-2', 'hd-3'])
+
+    def test_media_left_alone_by_default(self):
+        report = self.teardown_engine(vms=False).run()
+        testify.assert_equal(report['media'], [])
+        testify.assert_equal(self.manage.calls, [])
+        testify.assert_equal(len(self.manage.hdds), 4)
+
+    def test_waits_out_session_lock(self):
+        self.manage.failures['vm-1'] = [
+            "VBoxManage: error: Cannot unregister the machine 'ci-jangofett'"
+            " while it is locked"]
+        report = self.teardown_engine(media=False).run()
+        testify.assert_equal(report['errors'], [])
+        testify.assert_equal(len(report['vms']), 2)
+        testify.assert_equal(self.manage.calls.count(
+            ('unregistervm', 'vm-1', True)), 2)
+
+    def test_reports_failures(self):
+        self.manage.failures['vm-2'] = [
+            'VBoxManage: error: Could not find a registered machine']
+        report = self.teardown_engine(media=False).run()
+        testify.assert_equal([vm['uuid'] for vm in report['vms']], ['vm-1'])
+        testify.assert_equal([error['vm'] for error in report['errors']],
+                ['vm-2'])
+
+    def test_older_than(self):
+        old = time.time() - 7200
+        os.utime(self.cfgfiles['ci-bobafett'], (old, old))
+        report = self.teardown_engine(older_than=3600, media=False).run()
+        testify.assert_equal([vm['name'] for vm in report['vms']],
+                ['ci-bobafett'])
+
+        report = self.teardown_engine(prefix=None, vms=False,
+                dry_run=True).run()
+        testify.assert_equal(report['vms'], [])
+
+    def test_stray_files(self):
+        for name in ('ci-base.vdi', 'ci-stray.vdi', 'ci-notes.txt',
+                'other.vmdk'):
+            with open(os.path.join(self.tmp_dir, name), 'w'):
+                pass
+        report = self.teardown_engine(vms=False, dry_run=True,
+                stray_dirs=[self.tmp_dir]).run()
+        stray = os.path.join(self.tmp_dir, 'ci-stray.vdi')
+        testify.assert_equal(report['files'], [stray])
+        testify.assert_equal(os.path.exists(stray), True)
+
+        report = self.teardown_engine(vms=False,
+                stray_dirs=[self.tmp_dir]).run()
+        testify.assert_equal(report['files'], [stray])
+        testify.assert_equal(os.path.exists(stray), False)
+        testify.assert_equal(os.path.exists(os.path.join(self.tmp_dir,
+            'other.vmdk')), True)
+
+        report = self.teardown_engine(prefix=None, vms=False, dry_run=True,
+                stray_dirs=[self.tmp_dir], extensions=['.VMDK']).run()
+        testify.assert_equal(report['files'], [os.path.join(self.tmp_dir,
+            'other.vmdk')])
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the unit tests for the utils module.
+
+:copyright: (c) 2012 by Sean Plaice
+:license: ISC, see LICENSE for more details.
+"""
+
+import logging
+import threading
+import time
+import testify
+
+from virtbox.errors import CommandError
+from virtbox.utils import fan_out
+
+
+# setup module level logger
+logger = logging.getLogger(__name__)
+
+
+class FanOutTestCase(testify.TestCase):
+    @testify.setup
+    def setup_counters(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def lookup(self, name=None):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.01)
+        with self.lock:
+            self.running -= 1
+        if name == 'broken':
+            raise CommandError(status_code=1, stderr='not found')
+        return {'name': name}
+
+    def test_fan_out_results(self):
+        keys = ['vm%d' % i for i in range(20)]
+        results = dict(fan_out(self.lookup, keys, 'name', workers=4))
+        testify.assert_equal(sorted(results), sorted(keys))
+        testify.assert_equal(results['vm3'], {'name': 'vm3'})
+        testify.assert_lte(self.peak, 4)
+
+    def test_fan_out_failure_does_not_abort(self):
+        keys = ['vm0', 'broken', 'vm1']
+        results = dict(fan_out(self.lookup, keys, 'name', workers=2))
+        testify.assert_equal(len(results), 3)
+        testify.assert_isinstance(results['broken'], CommandError)
+        testify.assert_equal(results['vm1'], {'name': 'vm1'})
+
+    def test_fan_out_lazy_keys(self):
+        keys = ('vm%d' % i for i in range(10))
+        results = list(fan_out(self.lookup, keys, 'name', workers=2))
+        testify.assert_equal(len(results), 10)
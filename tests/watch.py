@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the unit tests for the watch module.
+
+:copyright: (c) 2012 by Sean Plaice
+:license: ISC, see LICENSE for more details.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import testify
+
+from virtbox import events, settings
+from virtbox.inventory import Inventory
+from virtbox.watch import Watcher, _libc_inotify
+
+
+# setup module level logger
+logger = logging.getLogger(__name__)
+
+
+SETTINGS_DIR = os.path.join('parser_test_data', 'settings')
+
+JANGOFETT_UUID = 'f4b0a749-820b-43c2-967e-a7a5f539cfd7'
+BOBAFETT_UUID = '9a1c3e5d-7b2f-4e61-8c0a-3d5f7e9b1c2d'
+
+
+class WatcherTestCase(testify.TestCase):
+    @testify.setup
+    def setup(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.home = os.path.join(self.tmp_dir, 'VirtualBox')
+        shutil.copytree(SETTINGS_DIR, self.home)
+        self.registry = os.path.join(self.home, 'VirtualBox.xml')
+        self.jangofett = os.path.join(self.home, 'jangofett',
+                'jangofett.vbox')
+        self.changes = []
+        self.changed = threading.Event()
+        events.subscribe(self.handler)
+        settings.clear()
+
+    @testify.teardown
+    def teardown(self):
+        events.unsubscribe(self.handler)
+        settings.clear()
+        shutil.rmtree(self.tmp_dir)
+
+    def handler(self, command, result, kwargs):
+        if command == 'settings_changed':
+            self.changes.append((kwargs['uuid'], kwargs['path']))
+            self.changed.set()
+
+    def save(self, path, old, new):
+        # the way VirtualBox saves: write a -tmp file and rename it over
+        with open(path) as fn:
+            content = fn.read()
+        with open(path + '-tmp', 'w') as fn:
+            fn.write(content.replace(old, new))
+        os.rename(path, path + '-prev')
+        os.rename(path + '-tmp', path)
+
+    def test_watched_paths(self):
+        watcher = Watcher(registry=self.registry, use_inotify=False)
+        testify.assert_equal(watcher.paths(), sorted([self.registry,
+            self.jangofett,
+            os.path.join(self.home, 'bobafett', 'bobafett.vbox')]))
+
+    def test_check_reports_changed_vm(self):
+        watcher = Watcher(registry=self.registry, use_inotify=False)
+        testify.assert_equal(watcher.check(), [])
+        self.save(self.jangofett, 'RAMSize="256"', 'RAMSize="1024"')
+        testify.assert_equal(watcher.check(), [self.jangofett])
+        testify.assert_equal(self.changes, [(JANGOFETT_UUID, self.jangofett)])
+        testify.assert_equal(watcher.check(), [])
+
+    def test_registry_change_follows_machines(self):
+        watcher = Watcher(registry=self.registry, use_inotify=False)
+        self.save(self.registry, '<MachineEntry uuid="{%s}" '
+            'src="bobafett/bobafett.vbox"/>' % BOBAFETT_UUID, '')
+        watcher.check()
+        testify.assert_equal(self.changes, [(None, self.registry)])
+        testify.assert_equal(watcher.paths(), sorted([self.registry,
+            self.jangofett]))
+
+    def test_inventory_rereads_changed_vm_only(self):
+        reads = []
+
+        def listing():
+            return [settings.showvminfo(uuid=uuid)
+                    for uuid, _ in settings.machines(self.registry)]
+
+        def reader(uuid):
+            reads.append(uuid)
+            return settings.showvminfo(uuid=uuid)
+
+        settings.set_registry_path(self.registry)
+        settings._ostypes = {}
+        try:
+            with Inventory(listing=listing, reader=reader) as inventory:
+                watcher = Watcher(registry=self.registry, use_inotify=False)
+                testify.assert_equal(inventory.get(
+                    uuid=JANGOFETT_UUID).memory, 256)
+                self.save(self.jangofett, 'RAMSize="256"', 'RAMSize="1024"')
+                watcher.check()
+                testify.assert_equal(inventory.get(
+                    uuid=JANGOFETT_UUID).memory, 1024)
+                testify.assert_equal(reads, [JANGOFETT_UUID])
+        finally:
+            settings.set_registry_path(None)
+
+    def test_thread(self):
+        use_inotify = _libc_inotify() is not None
+        with Watcher(registry=self.registry, interval=0.05,
+                use_inotify=use_inotify) as watcher:
+            testify.assert_equal(watcher.backend,
+                    'inotify' if use_inotify else 'poll')
+            self.save(self.jangofett, 'RAMSize="256"', 'RAMSize="1024"')
+            testify.assert_equal(self.changed.wait(5), True)
+        testify.assert_equal(self.changes, [(JANGOFETT_UUID, self.jangofett)])
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""
+Measure the per call cost of building a modifyvm command line from
+virtbox.options.MODIFYVM_OPTIONS with 1, 10 and 100 options set, next to
+the repeated string formatting modifyvm used before.
+
+    tools/bench_argv.py [iterations]
+"""
+import sys
+import timeit
+
+from virtbox.options import MODIFYVM_OPTIONS
+
+
+def sample_options(count):
+    values = {}
+    for option in MODIFYVM_OPTIONS:
+        if len(values) == count:
+            break
+        if option.switch:
+            values[option.name] = True
+        elif option.choices:
+            values[option.name] = option.choices[0]
+        elif option.fmt == '%d':
+            values[option.name] = 1000
+        else:
+            values[option.name] = 'on'
+    return values
+
+
+def build_argv(values):
+    return MODIFYVM_OPTIONS.build(['VBoxManage', 'modifyvm', 'vm'], values)
+
+
+def build_string(values):
+    cmd = 'VBoxManage modifyvm vm'
+    for name, value in values.items():
+        if value:
+            cmd = '%s --%s %s' % (cmd, name, value)
+    return cmd
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for count in (1, 10, 100):
+        values = sample_options(count)
+        for label, func in (('argv', build_argv), ('string', build_string)):
+            elapsed = timeit.timeit(lambda: func(values), number=iterations)
+            print('%-7s %3d options %8.2f us/call' % (label, count,
+                elapsed / iterations * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""
+Compare the cost of running a command through virtbox.executor against the
+old envoy based path, using tools/stub-vboxmanage as VBoxManage.
+
+    tools/bench_executor.py [iterations]
+"""
+import os
+import sys
+import time
+
+from virtbox.executor import execute
+
+STUB = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    'stub-vboxmanage')
+ARGV = [STUB, 'list', 'vms']
+
+
+def bench(label, func, iterations):
+    func()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - start
+    print('%-10s %6d calls %8.3fs %9.1f us/call' % (label, iterations,
+        elapsed, elapsed / iterations * 1e6))
+    return elapsed
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    executor = bench('executor', lambda: execute(ARGV), iterations)
+
+    try:
+        import envoy
+    except ImportError:
+        print('envoy      not installed, skipping')
+        return
+
+    cmd = ' '.join(ARGV)
+    baseline = bench('envoy', lambda: envoy.run(cmd), iterations)
+    print('speedup    %.2fx' % (baseline / executor))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""
+Measure how many disk image headers virtbox.hdimage reads per second, over
+copies of the images in parser_test_data/hdimage.
+
+    tools/bench_hdimage.py [count]
+
+Exits non-zero if fewer than 10000 images per second are read.
+"""
+import os
+import sys
+import glob
+import shutil
+import tempfile
+import time
+
+from virtbox.hdimage import iter_headers
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'parser_test_data',
+    'hdimage')
+
+# images per second read_header must at least sustain
+MIN_RATE = 10000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    images = [path for path in sorted(glob.glob(os.path.join(DATA_DIR, '*')))
+        if path.endswith(('.vdi', '.vhd', '.vmdk', '.img')) and
+        not path.endswith('-flat.vmdk')]
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        paths = []
+        for i in range(count):
+            source = images[i % len(images)]
+            path = os.path.join(tmp_dir, '%d-%s' % (i,
+                os.path.basename(source)))
+            shutil.copyfile(source, path)
+            paths.append(path)
+
+        best = None
+        for _ in range(3):
+            started = time.time()
+            failed = sum(1 for _, info in iter_headers(paths)
+                if isinstance(info, Exception))
+            elapsed = time.time() - started
+            best = elapsed if best is None else min(best, elapsed)
+        rate = count / best
+        print('%d images in %.3fs, %.0f images/s, %d unreadable' % (count,
+            best, rate, failed))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    if rate < MIN_RATE:
+        print('slower than %d images/s' % MIN_RATE)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Measure the cost of importing virtbox modules in a fresh interpreter with
+python -X importtime, reporting the best of several runs and the modules
+that contribute most to it.
+
+    tools/bench_import.py [module] [runs]
+"""
+import os
+import sys
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# third party and optional modules an import should not pull in
+HEAVY_MODULES = ('pyparsing', 'envoy', 'asyncio', 'concurrent.futures',
+    'xml.etree.ElementTree')
+
+
+def importtime(module):
+    """
+    Return {module: (self us, cumulative us)} for importing module.
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+        'import %s' % module], cwd=ROOT, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main():
+    module = sys.argv[1] if len(sys.argv) > 1 else 'virtbox.manage'
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    samples = [importtime(module) for _ in range(runs)]
+    best = min(samples, key=lambda times: times[module][1])
+    totals = sorted(times[module][1] for times in samples)
+    print('import %s: best %.1f ms, median %.1f ms over %d runs' % (module,
+        totals[0] / 1000.0, totals[len(totals) // 2] / 1000.0, runs))
+
+    print('largest cumulative imports in the best run:')
+    for name, (_, cumulative) in sorted(best.items(),
+            key=lambda item: -item[1][1])[1:11]:
+        print('  %-30s %7.1f ms' % (name, cumulative / 1000.0))
+
+    heavy = [name for name in HEAVY_MODULES if name in best]
+    if heavy:
+        print('heavy modules imported: %s' % ', '.join(heavy))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
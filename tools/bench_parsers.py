@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Measure the per call cost of the virtbox.parsers functions over the
+captured outputs in parser_test_data and synthetic large outputs: with the
+pyparsing engine, once rebuilding every grammar per call as the parsers
+used to and once with the grammars built once by the registry, and with
+the fast engine.
+
+    tools/bench_parsers.py [iterations] [--packrat]
+
+Exits non-zero if a parser got slower with the registry or with the fast
+engine.
+"""
+import os
+import sys
+import codecs
+import timeit
+
+from virtbox import parsers
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'parser_test_data')
+
+UUID = 'f4b0a749-820b-43c2-967e-a7a5f539cfd7'
+
+CREATEVM = ("Virtual machine 'jangofett' is created and registered.\n"
+    "UUID: %s\n"
+    "Settings file: '/home/virtbox/VirtualBox VMs/jangofett/jangofett.vbox'\n"
+    % UUID)
+
+SHOWHDINFO = ('UUID:                 %s\n'
+    'Accessible:           yes\n'
+    'Logical size:         128 MBytes\n'
+    'Current size on disk: 0 MBytes\n'
+    'Type:                 normal (base)\n'
+    'Storage format:       VDI\n'
+    'Format variant:       dynamic default\n'
+    'Location:             /tmp/jangofett.vdi\n' % UUID)
+
+CREATEHD = 'Disk image created. UUID: %s\n' % UUID
+
+
+def read(name):
+    with codecs.open(os.path.join(DATA_DIR, name), 'r', 'utf-8') as fn:
+        return fn.read()
+
+
+def list_vms(count):
+    return ''.join('"vm%s" {%s}\n' % (''.join(chr(97 + int(c)) for c in
+        str(i)), UUID) for i in range(count))
+
+
+def cases():
+    ostypes = read('vboxmanage_list_ostypes.txt')
+    return [
+        ('list_vms 10', parsers.parse_list_vms, list_vms(10)),
+        ('list_vms 5000', parsers.parse_list_vms, list_vms(5000)),
+        ('list_ostypes', parsers.parse_list_ostypes, ostypes),
+        ('list_ostypes x20', parsers.parse_list_ostypes, ostypes * 20),
+        ('createvm', parsers.parse_createvm, CREATEVM),
+        ('startvm', parsers.parse_startvm, read('vboxmanage_startvm.txt')),
+        ('showhdinfo', parsers.parse_showhdinfo, SHOWHDINFO),
+        ('createhd', parsers.parse_createhd, CREATEHD),
+    ]
+
+
+def per_call(func, stdout, iterations, rebuild=False, engine='pyparsing'):
+    def run():
+        if rebuild:
+            parsers.clear_grammars()
+        func(stdout, '', engine=engine)
+
+    run()
+    # best of a few rounds to keep noise out of the regression check
+    return min(timeit.repeat(run, number=iterations, repeat=3)) / \
+            iterations * 1e6
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    iterations = int(args[0]) if args else 200
+    if '--packrat' in sys.argv:
+        parsers.enable_packrat()
+
+    slower = []
+    for label, func, stdout in cases():
+        # scale iterations down for the large outputs
+        count = max(iterations * 1000 // max(len(stdout), 1000), 3)
+        rebuild = per_call(func, stdout, count, rebuild=True)
+        registry = per_call(func, stdout, count)
+        fast = per_call(func, stdout, count * 10, engine='fast')
+        print('%-18s rebuild %10.1f  registry %10.1f  fast %8.1f us/call  '
+            '%8.1f MB/s' % (label, rebuild, registry, fast,
+                len(stdout) / fast))
+        # building a grammar is noise next to parsing a large output, only
+        # flag the registry when it is clearly slower
+        if registry > rebuild * 1.5 or fast > registry:
+            slower.append(label)
+
+    if slower:
+        print('regressed: %s' % ', '.join(slower))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
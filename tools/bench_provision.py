@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+"""
+End-to-end benchmark of provisioning through virtbox: the full
+generate_vm, generate_ctl, generate_hd, storageattach, startvm, controlvm
+poweroff, delete_vm flow, list vms and showvminfo sweeps over a fleet of
+vms, and parser-only throughput over the captured outputs in
+parser_test_data. Reports p50/p95/p99 latency and ops/s per operation and
+writes the results as JSON, compared against a baseline written by an
+earlier run when there is one.
+
+VBoxManage is tools/vboxmanage_sim.py over a scratch registry unless
+--vboxmanage names another binary, e.g. the real one on a test host.
+
+    tools/bench_provision.py [--iterations N] [--fleet N] [--workers N]
+        [--latency SECONDS] [--scenario NAME] [--output FILE]
+        [--baseline FILE] [--save-baseline] [--threshold FRACTION]
+        [--vboxmanage PATH]
+
+Exits non-zero if the p50 of an operation is more than threshold slower
+than in the baseline.
+"""
+import os
+import sys
+import json
+import time
+import codecs
+import shutil
+import argparse
+import platform
+import tempfile
+
+import virtbox
+from virtbox import commands, manage, parsers
+from virtbox.utils import (generate_vm, generate_ctl, generate_hd,
+    delete_vm)
+
+SIMULATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    'vboxmanage_sim.py')
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'parser_test_data')
+
+SCENARIOS = ('provision', 'sweep', 'parsers')
+
+# bump when the results change shape
+RESULTS_VERSION = 1
+
+PARSER_CASES = (
+    ('showvminfo', parsers.parse_showvminfo, 'vboxmanage_showvminfo.txt'),
+    ('list_vms_long', parsers.parse_list_vms_long,
+        'vboxmanage_list_long_vms.txt'),
+    ('list_hdds', parsers.parse_list_hdds, 'vboxmanage_list_hdds.txt'),
+    ('list_ostypes', parsers.parse_list_ostypes,
+        'vboxmanage_list_ostypes.txt'),
+    ('list_vms', parsers.parse_list_vms,
+        os.path.join('equivalence', 'list_vms-basic.txt')),
+    ('createvm', parsers.parse_createvm,
+        os.path.join('equivalence', 'createvm-basic.txt')),
+    ('showhdinfo', parsers.parse_showhdinfo,
+        os.path.join('equivalence', 'showhdinfo-basic.txt')),
+    ('startvm', parsers.parse_startvm, 'vboxmanage_startvm.txt'),
+)
+
+
+class Timer(object):
+    """ Collects the latency of every call made through it, per name.
+    """
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.samples = {}
+
+    def __call__(self, label, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.add(label, time.perf_counter() - start)
+        return result
+
+    def add(self, label, seconds, items=1):
+        self.samples.setdefault('%s.%s' % (self.prefix, label),
+            []).append((seconds, items))
+
+
+def percentile(ordered, percent):
+    # nearest rank
+    index = max(int(round(percent / 100.0 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def summarize(samples):
+    ordered = sorted(seconds for seconds, _ in samples)
+    total = sum(ordered)
+    items = sum(count for _, count in samples)
+    return {
+        'count': len(ordered),
+        'p50': percentile(ordered, 50),
+        'p95': percentile(ordered, 95),
+        'p99': percentile(ordered, 99),
+        'mean': total / len(ordered),
+        'ops_per_sec': items / total if total else None,
+    }
+
+
+def provision(timer, iterations):
+    for _ in range(iterations):
+        start = time.perf_counter()
+        vm = timer('generate_vm', generate_vm)
+        ctl = timer('generate_ctl', generate_ctl, uuid=vm['uuid'])
+        hd = timer('generate_hd', generate_hd)
+        timer('storageattach', manage.storageattach, uuid=vm['uuid'],
+            name=ctl['name'], port='0', device='0', storage_type='hdd',
+            medium=hd['filename'])
+        timer('startvm', manage.startvm, vm_uuid=vm['uuid'],
+            start_type='headless')
+        timer('poweroff', manage.controlvm, vm_uuid=vm['uuid'],
+            action='poweroff')
+        # deletes the attached disk along with the vm
+        timer('delete_vm', delete_vm, uuid=vm['uuid'])
+        timer.add('flow', time.perf_counter() - start)
+
+
+def sweep(timer, iterations, fleet, workers):
+    vms = [generate_vm(name='bench%d' % i) for i in range(fleet)]
+    uuids = [vm['uuid'] for vm in vms]
+    try:
+        for _ in range(iterations):
+            timer('list_vms', manage.list_vms)
+            timer('list_vms_long', manage.list_vms, long=True)
+            start = time.perf_counter()
+            for uuid in uuids:
+                manage.showvminfo(uuid=uuid)
+            timer.add('showvminfo_serial', time.perf_counter() - start,
+                len(uuids))
+            start = time.perf_counter()
+            list(manage.showvminfo_many(uuids, workers=workers))
+            timer.add('showvminfo_many', time.perf_counter() - start,
+                len(uuids))
+    finally:
+        for uuid in uuids:
+            delete_vm(uuid=uuid)
+
+
+def parse(timer, iterations):
+    for label, func, name in PARSER_CASES:
+        with codecs.open(os.path.join(DATA_DIR, name), 'r', 'utf-8') as fn:
+            stdout = fn.read()
+        # warm the grammars and the fast paths
+        func(stdout, '')
+        for _ in range(iterations * 20):
+            timer(label, func, stdout, '')
+
+
+def compare(results, baseline, threshold):
+    regressed = []
+    for name, stats in sorted(results.items()):
+        before = baseline.get(name)
+        if before is None or not before.get('p50'):
+            continue
+        ratio = stats['p50'] / before['p50']
+        stats['vs_baseline'] = round(ratio, 3)
+        if ratio > 1 + threshold:
+            regressed.append(name)
+    return regressed
+
+
+def report(results):
+    print('%-32s %6s %10s %10s %10s %10s %8s' % ('operation', 'count',
+        'p50 ms', 'p95 ms', 'p99 ms', 'ops/s', 'vs base'))
+    for name, stats in sorted(results.items()):
+        print('%-32s %6d %10.3f %10.3f %10.3f %10.1f %8s' % (name,
+            stats['count'], stats['p50'] * 1e3, stats['p95'] * 1e3,
+            stats['p99'] * 1e3, stats['ops_per_sec'] or 0,
+            '%.2fx' % stats['vs_baseline'] if 'vs_baseline' in stats
+            else '-'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--fleet', type=int, default=25,
+        help='vms created for the sweeps')
+    parser.add_argument('--workers', type=int, default=8,
+        help='workers for showvminfo_many')
+    parser.add_argument('--latency', default='0',
+        help='seconds every simulated command takes, or min:max')
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+        help='run only these scenarios, default all')
+    parser.add_argument('--output', help='write the JSON results to OUTPUT')
+    parser.add_argument('--baseline',
+        help='compare against the JSON results in BASELINE')
+    parser.add_argument('--save-baseline', action='store_true',
+        help='write the results to BASELINE instead of comparing')
+    parser.add_argument('--threshold', type=float, default=0.25,
+        help='fraction a p50 may grow before it counts as a regression')
+    parser.add_argument('--vboxmanage',
+        help='VBoxManage binary to run, default the simulator')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix='bench-provision')
+    if args.vboxmanage is None:
+        os.environ['VBOXSIM_STATE'] = os.path.join(tmp_dir, 'sim.json')
+        os.environ['VBOXSIM_LATENCY'] = args.latency
+    commands.set_vboxmanage_path(args.vboxmanage or SIMULATOR)
+
+    scenarios = args.scenario or SCENARIOS
+    samples = {}
+    try:
+        if 'provision' in scenarios:
+            timer = Timer('provision')
+            provision(timer, args.iterations)
+            samples.update(timer.samples)
+        if 'sweep' in scenarios:
+            timer = Timer('sweep')
+            sweep(timer, args.iterations, args.fleet, args.workers)
+            samples.update(timer.samples)
+        if 'parsers' in scenarios:
+            timer = Timer('parsers')
+            parse(timer, args.iterations)
+            samples.update(timer.samples)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    results = dict((name, summarize(values))
+        for name, values in samples.items())
+
+    regressed = []
+    if args.baseline and not args.save_baseline:
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as fn:
+                baseline = json.load(fn)
+            if baseline.get('version') == RESULTS_VERSION:
+                regressed = compare(results, baseline['results'],
+                    args.threshold)
+            else:
+                print('ignoring baseline %s: not version %d results' %
+                    (args.baseline, RESULTS_VERSION))
+        else:
+            print('no baseline at %s, run with --save-baseline to store '
+                'one' % args.baseline)
+
+    report(results)
+
+    document = {
+        'version': RESULTS_VERSION,
+        'virtbox': virtbox.__version__,
+        'python': platform.python_version(),
+        'vboxmanage': args.vboxmanage or 'simulator',
+        'created': time.time(),
+        'settings': {'iterations': args.iterations, 'fleet': args.fleet,
+            'workers': args.workers, 'latency': args.latency,
+            'scenarios': list(scenarios)},
+        'results': results,
+    }
+    outputs = [args.output] if args.output else []
+    if args.save_baseline and args.baseline:
+        outputs.append(args.baseline)
+    for path in outputs:
+        with open(path, 'w') as fn:
+            json.dump(document, fn, indent=2, sort_keys=True)
+            fn.write('\n')
+
+    if regressed:
+        print('regressed: %s' % ', '.join(regressed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
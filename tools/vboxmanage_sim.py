@@ -0,0 +1,1000 @@
+#!/usr/bin/env python
+"""
+Stand-in for VBoxManage that keeps a registry of vms, controllers and
+media, so virtbox can be tested and benchmarked at fleet scale on hosts
+without VirtualBox. Output is what VBoxManage 4.2 prints for the commands
+virtbox.manage implements: --version, list vms/runningvms/--long vms/hdds/
+ostypes/systemproperties/hddbackends, createvm, modifyvm, showvminfo
+--machinereadable, storagectl, storageattach, createhd, showhdinfo,
+closemedium, startvm, controlvm and unregistervm.
+
+    VIRTBOX_VBOXMANAGE=tools/vboxmanage_sim.py testify tests.functional
+    tools/vboxmanage_sim.py createvm --name jangofett --register
+
+The registry lives in the JSON file named by VBOXSIM_STATE, updated under
+a lock so concurrent invocations see each other's changes. Only the
+registry is simulated: no .vbox or image files are written or deleted.
+Environment:
+
+    VBOXSIM_STATE          registry file, default
+                           $TMPDIR/vboxmanage-sim-<uid>.json
+    VBOXSIM_LATENCY        seconds every command takes, or min:max to
+                           draw it uniformly
+    VBOXSIM_FAIL_RATE      fraction of commands failing with a session
+                           lock error, as a busy VirtualBox reports it
+    VBOXSIM_FAIL_COMMANDS  comma separated commands failures are injected
+                           into, default all but --version
+    VBOXSIM_SEED           seed for uuids, MACs and failures, making a
+                           sequence of commands reproducible
+
+Simulator runs the same commands in-process against an in-memory
+registry, Simulator().run(['list', 'vms']) returns (status, stdout,
+stderr).
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import tempfile
+
+VERSION = '4.2.6r82870'
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+    'parser_test_data')
+# output that does not depend on the registry, as captured from VBoxManage
+STATIC_OUTPUT = {
+    'ostypes': 'vboxmanage_list_ostypes.txt',
+    'systemproperties': 'vboxmanage_list_systemproperties.txt',
+    'hddbackends': 'vboxmanage_list_hddbackends.txt',
+}
+
+# settings of a new vm in showvminfo --machinereadable order, split around
+# the state, storage and nics; ints are printed unquoted
+HEAD_SETTINGS = [
+    ('memory', 128), ('pagefusion', 'off'), ('vram', 8),
+    ('cpuexecutioncap', 100), ('hpet', 'off'), ('chipset', 'piix3'),
+    ('firmware', 'BIOS'), ('cpus', 1), ('pae', 'on'), ('longmode', 'on'),
+    ('synthcpu', 'off'), ('bootmenu', 'messageandmenu'),
+    ('boot1', 'floppy'), ('boot2', 'dvd'), ('boot3', 'disk'),
+    ('boot4', 'none'), ('biossystemtimeoffset', 0), ('acpi', 'on'),
+    ('ioapic', 'off'), ('rtcuseutc', 'off'), ('hwvirtex', 'on'),
+    ('hwvirtexexcl', 'off'), ('nestedpaging', 'on'), ('largepages', 'off'),
+    ('vtxvpid', 'on'),
+]
+MIDDLE_SETTINGS = [
+    ('monitorcount', 1), ('accelerate3d', 'off'),
+    ('accelerate2dvideo', 'off'), ('teleporterenabled', 'off'),
+    ('teleporterport', 0), ('teleporteraddress', ''),
+    ('teleporterpassword', ''),
+]
+TAIL_SETTINGS = [
+    ('hidpointing', 'ps2mouse'), ('hidkeyboard', 'ps2kbd'),
+    ('uart1', 'off'), ('uart2', 'off'), ('audio', 'none'),
+    ('clipboard', 'disabled'), ('vrde', 'off'), ('usb', 'off'),
+]
+NIC_COUNT = 8
+NIC_SETTINGS = [('nictype', '82540EM'), ('cableconnected', 'on'),
+    ('nicspeed', '0'), ('nicbootprio', '0'), ('nicpromisc', 'deny')]
+# nic type -> setting naming its network, and its list -l vms attachment
+NIC_NETWORKS = {
+    'nat': (None, 'NAT'),
+    'hostonly': ('hostonlyadapter', 'Host-only Interface'),
+    'bridged': ('bridgeadapter', 'Bridged Interface'),
+    'intnet': ('intnet', 'Internal Network'),
+    'generic': ('nicgenericdrv', 'Generic'),
+    'null': (None, 'none'),
+}
+INT_SETTINGS = set(key for key, value in HEAD_SETTINGS + MIDDLE_SETTINGS
+    if isinstance(value, int)) | set(['GuestMemoryBalloon'])
+
+# modifyvm flags stored under another showvminfo key
+MODIFYVM_KEYS = {
+    'biosbootmenu': 'bootmenu',
+    'mouse': 'hidpointing',
+    'keyboard': 'hidkeyboard',
+    'guestmemoryballoon': 'GuestMemoryBalloon',
+    'teleporter': 'teleporterenabled',
+}
+# options taking no value
+SWITCHES = ('register', 'delete', 'cpuidremoveall', 'forceunmount',
+    'intnet', 'remove', 'machinereadable', 'details', 'long', 'l')
+
+# storagectl --add bus -> (controller type, max ports, devices per port)
+BUSES = {
+    'ide': ('PIIX4', 2, 2),
+    'sata': ('IntelAhci', 30, 1),
+    'scsi': ('LsiLogic', 16, 1),
+    'sas': ('LsiLogicSas', 8, 1),
+    'floppy': ('I82078', 1, 2),
+}
+HD_EXTENSIONS = {'VDI': '.vdi', 'VMDK': '.vmdk', 'VHD': '.vhd'}
+
+RUNNING_STATES = ('running', 'paused', 'stuck')
+LONG_STATES = {'poweroff': 'powered off', 'stuck': 'guru meditation'}
+LONG_BOOT_DEVICES = {'floppy': 'Floppy', 'dvd': 'DVD', 'disk': 'HardDisk',
+    'net': 'Network', 'none': 'Not Assigned'}
+LONG_BOOT_MENU = {'messageandmenu': 'message and menu',
+    'menuonly': 'menu only', 'disabled': 'disabled'}
+
+PROGRESS = '0%...10%...20%...30%...40%...50%...60%...70%...80%...90%...100%\n'
+
+# VirtualBox result codes
+VBOX_E_OBJECT_NOT_FOUND = ('VBOX_E_OBJECT_NOT_FOUND', '0x80bb0001')
+VBOX_E_INVALID_VM_STATE = ('VBOX_E_INVALID_VM_STATE', '0x80bb0002')
+VBOX_E_FILE_ERROR = ('VBOX_E_FILE_ERROR', '0x80bb0004')
+VBOX_E_INVALID_OBJECT_STATE = ('VBOX_E_INVALID_OBJECT_STATE', '0x80bb0007')
+VBOX_E_OBJECT_IN_USE = ('VBOX_E_OBJECT_IN_USE', '0x80bb000c')
+E_INVALIDARG = ('E_INVALIDARG', '0x80070057')
+
+
+class Failure(Exception):
+    """ A failed command, with VBoxManage's exit status and stderr.
+    """
+    def __init__(self, stderr, status=1):
+        Exception.__init__(self, stderr)
+        self.stderr = stderr
+        self.status = status
+
+
+def error(message, code=None, component='VirtualBox',
+        interface='IVirtualBox'):
+    """
+    Return a Failure with message as VBoxManage prints errors.
+    """
+    stderr = 'VBoxManage: error: %s\n' % message
+    if code is not None:
+        stderr += ('VBoxManage: error: Details: code %s (%s), component %s, '
+                'interface %s, callee nsISupports\n' % (code[0], code[1],
+                    component, interface))
+    return Failure(stderr)
+
+
+def syntax_error(message):
+    """
+    """
+    return Failure('Syntax error: %s\n' % message, status=2)
+
+
+def locked_error(name):
+    """
+    """
+    return error("The machine '%s' is already locked for a session (or "
+            "being unlocked)" % name, VBOX_E_INVALID_OBJECT_STATE,
+            'Machine', 'IMachine')
+
+
+def new_state():
+    """
+    Return an empty registry.
+    """
+    return {
+        'machine_folder': os.path.join(os.path.expanduser('~'),
+            'VirtualBox VMs'),
+        'vms': {},
+        'media': {},
+    }
+
+
+def parse_options(args):
+    """
+    Split args into positional arguments and a {flag: value} dict, values
+    of repeated flags collected in a list.
+    """
+    positional = []
+    options = {}
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if not arg.startswith('-') or arg == '-':
+            positional.append(arg)
+            continue
+        flag = arg.lstrip('-')
+        if flag in SWITCHES:
+            value = True
+        elif args:
+            value = args.pop(0)
+        else:
+            raise syntax_error("Missing argument to '%s'" % arg)
+        if flag in options:
+            if not isinstance(options[flag], list):
+                options[flag] = [options[flag]]
+            options[flag].append(value)
+        else:
+            options[flag] = value
+    return positional, options
+
+
+def _quote(value):
+    """
+    """
+    if isinstance(value, int):
+        return str(value)
+    return '"%s"' % value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _timestamp(now):
+    """
+    """
+    return '%s.%09d' % (time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(now)),
+            int(now % 1 * 1e9))
+
+
+class Simulator(object):
+    """ Runs VBoxManage commands against a registry dict.
+
+        latency is the seconds every command takes, a number or a (min,
+        max) pair; fail_rate the fraction of the fail_commands (default
+        all) that fail with a session lock error before doing anything.
+    """
+
+    def __init__(self, state=None, latency=0, fail_rate=0,
+            fail_commands=None, seed=None):
+        self.state = state if state is not None else new_state()
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.fail_commands = fail_commands
+        self.random = random.Random(seed)
+        # set once a command modified the registry
+        self.changed = False
+        self._ostypes = None
+
+    def run(self, argv):
+        """
+        Run argv, the arguments after VBoxManage, and return (status,
+        stdout, stderr).
+        """
+        self.delay()
+        try:
+            if not argv:
+                raise syntax_error('No command given')
+            self.inject_failure(argv)
+            stdout, stderr = self.dispatch(argv[0], argv[1:])
+        except Failure as exc:
+            return exc.status, '', exc.stderr
+        return 0, stdout, stderr
+
+    def delay(self):
+        """
+        Sleep for the configured latency.
+        """
+        latency = self.latency
+        if isinstance(latency, (tuple, list)):
+            latency = self.random.uniform(*latency)
+        if latency:
+            time.sleep(latency)
+
+    def inject_failure(self, argv):
+        """
+        """
+        command = argv[0]
+        if not self.fail_rate or command in ('--version', '-v'):
+            return
+        if self.fail_commands and command not in self.fail_commands:
+            return
+        if self.random.random() < self.fail_rate:
+            target = argv[1] if len(argv) > 1 else 'VBoxSim'
+            raise locked_error(target)
+
+    def dispatch(self, command, args):
+        """
+        """
+        if command in ('--version', '-v', '-version'):
+            return VERSION + '\n', ''
+        handler = getattr(self, 'cmd_%s' % command, None)
+        if handler is None:
+            raise syntax_error("Invalid command '%s'" % command)
+        return handler(args)
+
+    # helpers
+
+    def uuid(self):
+        """
+        """
+        return str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+
+    def ostypes(self):
+        """
+        Return the os type ids and descriptions of list ostypes.
+        """
+        if self._ostypes is None:
+            self._ostypes = {}
+            ostype = None
+            for line in _static('ostypes').splitlines():
+                key, _, value = line.partition(':')
+                if key == 'ID':
+                    ostype = value.strip()
+                elif key == 'Description' and ostype is not None:
+                    self._ostypes[ostype] = value.strip()
+        return self._ostypes
+
+    def find_vm(self, target):
+        """
+        Return the vm with uuid or else name target.
+        """
+        vms = self.state['vms']
+        if target in vms:
+            return vms[target]
+        for vm in vms.values():
+            if vm['name'] == target:
+                return vm
+        raise error("Could not find a registered machine named '%s'" %
+                target, VBOX_E_OBJECT_NOT_FOUND)
+
+    def find_medium(self, target):
+        """
+        Return the medium with uuid or location target, or None.
+        """
+        media = self.state['media']
+        if target in media:
+            return media[target]
+        location = os.path.abspath(target)
+        for medium in media.values():
+            if medium['location'] == location:
+                return medium
+        return None
+
+    def medium_users(self, medium_uuid):
+        """
+        Return the vms medium_uuid is attached to.
+        """
+        return [vm for vm in self.state['vms'].values()
+                if medium_uuid in vm['attachments'].values()]
+
+    def unlocked(self, vm):
+        """
+        Raise the session lock error for a running vm.
+        """
+        if vm['state'] in RUNNING_STATES:
+            raise locked_error(vm['name'])
+
+    def set_state(self, vm, state):
+        """
+        """
+        vm['state'] = state
+        vm['state_since'] = _timestamp(time.time())
+        self.changed = True
+
+    # list
+
+    def cmd_list(self, args):
+        """
+        """
+        positional, options = parse_options(args)
+        if not positional:
+            raise syntax_error('Missing argument for "list" command.')
+        what = positional[0]
+        if what in STATIC_OUTPUT:
+            return _static(what), ''
+        if what == 'vms':
+            if options.get('long') or options.get('l'):
+                return ''.join(self.long_vminfo(vm)
+                        for vm in self.state['vms'].values()), ''
+            return ''.join('"%s" {%s}\n' % (vm['name'], vm['uuid'])
+                    for vm in self.state['vms'].values()), ''
+        if what == 'runningvms':
+            return ''.join('"%s" {%s}\n' % (vm['name'], vm['uuid'])
+                    for vm in self.state['vms'].values()
+                    if vm['state'] in RUNNING_STATES), ''
+        if what == 'hdds':
+            return ''.join(self.list_hdd(medium) + '\n'
+                    for medium in self.state['media'].values()), ''
+        if what in ('dvds', 'floppies'):
+            return '', ''
+        raise syntax_error('Unknown subcommand "%s" for "list" command.' %
+                what)
+
+    def list_hdd(self, medium):
+        """
+        """
+        lines = [
+            ('UUID', medium['uuid']),
+            ('Parent UUID', medium['parent'] or 'base'),
+            ('State', 'created'),
+            ('Type', 'normal (%s)' % ('differencing' if medium['parent']
+                else 'base')),
+            ('Location', medium['location']),
+            ('Storage format', medium['format']),
+            ('Capacity', '%d MBytes' % medium['capacity']),
+        ]
+        users = self.medium_users(medium['uuid'])
+        if users:
+            lines.append(('In use by VMs', ', '.join('%s (UUID: %s)' %
+                (vm['name'], vm['uuid']) for vm in users)))
+        return ''.join('%-15s %s\n' % (key + ':', value)
+                for key, value in lines)
+
+    # vms
+
+    def cmd_createvm(self, args):
+        """
+        """
+        _, options = parse_options(args)
+        name = options.get('name')
+        if not name:
+            raise syntax_error('Parameter --name is required')
+        if not options.get('register'):
+            raise syntax_error('The simulator only supports --register')
+        ostype = options.get('ostype', 'Other')
+        if ostype not in self.ostypes():
+            raise error("Guest OS type '%s' is invalid" % ostype,
+                    E_INVALIDARG, 'VirtualBox', 'IVirtualBox')
+        vm_uuid = options.get('uuid') or self.uuid()
+        if vm_uuid in self.state['vms']:
+            raise error("A machine with UUID {%s} is already registered" %
+                    vm_uuid, E_INVALIDARG)
+
+        folder = os.path.join(options.get('basefolder') or
+                self.state['machine_folder'], name)
+        cfgfile = os.path.join(folder, '%s.vbox' % name)
+        for vm in self.state['vms'].values():
+            if vm['cfgfile'] == cfgfile:
+                raise error("Machine settings file '%s' already exists" %
+                        cfgfile, VBOX_E_FILE_ERROR, 'Machine', 'IMachine')
+
+        settings = dict(HEAD_SETTINGS + MIDDLE_SETTINGS + TAIL_SETTINGS)
+        settings['ostype'] = ostype
+        settings['GuestMemoryBalloon'] = 0
+        for index in range(1, NIC_COUNT + 1):
+            settings['nic%d' % index] = 'nat' if index == 1 else 'none'
+            settings['macaddress%d' % index] = '080027%06X' % \
+                    self.random.getrandbits(24)
+            for key, value in NIC_SETTINGS:
+                settings['%s%d' % (key, index)] = value
+        self.state['vms'][vm_uuid] = {
+            'name': name,
+            'uuid': vm_uuid,
+            'cfgfile': cfgfile,
+            'state': 'poweroff',
+            'state_since': _timestamp(time.time()),
+            'settings': settings,
+            'controllers': [],
+            'attachments': {},
+        }
+        self.changed = True
+        return ("Virtual machine '%s' is created and registered.\n"
+                "UUID: %s\nSettings file: '%s'\n" % (name, vm_uuid,
+                    cfgfile)), ''
+
+    def cmd_modifyvm(self, args):
+        """
+        """
+        positional, options = parse_options(args)
+        if not positional:
+            raise syntax_error('Not enough parameters')
+        vm = self.find_vm(positional[0])
+        self.unlocked(vm)
+        settings = vm['settings']
+        for flag, value in options.items():
+            if isinstance(value, list):
+                value = value[-1]
+            key = MODIFYVM_KEYS.get(flag, flag)
+            if key == 'name':
+                vm['name'] = value
+                vm['cfgfile'] = os.path.join(os.path.dirname(os.path.dirname(
+                    vm['cfgfile'])), value, '%s.vbox' % value)
+                continue
+            if key == 'ostype' and value not in self.ostypes():
+                raise error("Guest OS type '%s' is invalid" % value,
+                        E_INVALIDARG, 'Machine', 'IMachine')
+            if key in INT_SETTINGS:
+                try:
+                    value = int(value)
+                except ValueError:
+                    raise syntax_error("Invalid value '%s' for --%s" %
+                            (value, flag))
+            settings[key] = value
+        self.changed = True
+        return '', ''
+
+    def cmd_showvminfo(self, args):
+        """
+        """
+        positional, options = parse_options(args)
+        if not positional:
+            raise syntax_error('Incorrect number of parameters')
+        vm = self.find_vm(positional[0])
+        if not options.get('machinereadable'):
+            return self.long_vminfo(vm), ''
+        return self.machinereadable(vm), ''
+
+    def machinereadable(self, vm):
+        """
+        """
+        settings = vm['settings']
+        folder = os.path.dirname(vm['cfgfile'])
+        lines = [
+            ('name', vm['name']), ('groups', '/'),
+            ('ostype', self.ostypes().get(settings['ostype'],
+                settings['ostype'])),
+            ('UUID', vm['uuid']), ('CfgFile', vm['cfgfile']),
+            ('SnapFldr', os.path.join(folder, 'Snapshots')),
+            ('LogFldr', os.path.join(folder, 'Logs')),
+            ('hardwareuuid', vm['uuid']),
+        ]
+        lines.extend((key, settings[key]) for key, _ in HEAD_SETTINGS)
+        lines.append(('VMState', vm['state']))
+        lines.append(('VMStateChangeTime', vm['state_since']))
+        lines.extend((key, settings[key]) for key, _ in MIDDLE_SETTINGS)
+
+        for index, controller in enumerate(vm['controllers']):
+            lines.extend([
+                ('storagecontrollername%d' % index, controller['name']),
+                ('storagecontrollertype%d' % index, controller['type']),
+                ('storagecontrollerinstance%d' % index,
+                    str(controller['instance'])),
+                ('storagecontrollermaxportcount%d' % index,
+                    str(BUSES[controller['bus']][1])),
+                ('storagecontrollerportcount%d' % index,
+                    str(controller['portcount'])),
+                ('storagecontrollerbootable%d' % index,
+                    controller['bootable']),
+            ])
+        for controller in vm['controllers']:
+            for port, device in _slots(controller):
+                slot = '%s-%d-%d' % (controller['name'], port, device)
+                attached = vm['attachments'].get(slot)
+                medium = self.state['media'].get(attached)
+                if medium is not None:
+                    lines.append(('"%s"' % slot, medium['location']))
+                    lines.append(('"%s-ImageUUID-%d-%d"' % (
+                        controller['name'], port, device), medium['uuid']))
+                else:
+                    lines.append(('"%s"' % slot, attached or 'none'))
+
+        for index in range(1, NIC_COUNT + 1):
+            nic = settings['nic%d' % index]
+            if nic == 'none':
+                lines.append(('nic%d' % index, 'none'))
+                continue
+            network = NIC_NETWORKS.get(nic, (None, None))[0]
+            if nic == 'nat':
+                lines.append(('natnet%d' % index, 'nat'))
+            elif network is not None:
+                lines.append(('%s%d' % (network, index),
+                    settings.get('%s%d' % (network, index), '')))
+            lines.append(('macaddress%d' % index,
+                settings['macaddress%d' % index]))
+            lines.append(('cableconnected%d' % index,
+                settings['cableconnected%d' % index]))
+            lines.append(('nic%d' % index, nic))
+            for key in ('nictype', 'nicspeed', 'nicbootprio', 'nicpromisc'):
+                lines.append(('%s%d' % (key, index),
+                    settings['%s%d' % (key, index)]))
+
+        lines.extend((key, settings[key]) for key, _ in TAIL_SETTINGS)
+        if settings.get('description'):
+            lines.append(('description', settings['description']))
+        lines.append(('GuestMemoryBalloon', settings['GuestMemoryBalloon']))
+        return ''.join('%s=%s\n' % (key, _quote(value))
+                for key, value in lines)
+
+    def long_vminfo(self, vm):
+        """
+        Return the block of vm in list -l vms output.
+        """
+        settings = vm['settings']
+        folder = os.path.dirname(vm['cfgfile'])
+        lines = [
+            ('Name', vm['name']), ('Groups', '/'),
+            ('Guest OS', self.ostypes().get(settings['ostype'],
+                settings['ostype'])),
+            ('UUID', vm['uuid']), ('Config file', vm['cfgfile']),
+            ('Snapshot folder', os.path.join(folder, 'Snapshots')),
+            ('Log folder', os.path.join(folder, 'Logs')),
+            ('Hardware UUID', vm['uuid']),
+            ('Memory size', '%dMB' % settings['memory']),
+            ('Page Fusion', settings['pagefusion']),
+            ('VRAM size', '%dMB' % settings['vram']),
+            ('CPU exec cap', '%d%%' % settings['cpuexecutioncap']),
+            ('HPET', settings['hpet']),
+            ('Chipset', settings['chipset']),
+            ('Firmware', settings['firmware']),
+            ('Number of CPUs', settings['cpus']),
+            ('Synthetic Cpu', settings['synthcpu']),
+            ('CPUID overrides', 'None'),
+            ('Boot menu mode', LONG_BOOT_MENU.get(settings['bootmenu'],
+                settings['bootmenu'])),
+        ]
+        for index in range(1, 5):
+            boot = settings['boot%d' % index]
+            lines.append(('Boot Device (%d)' % index,
+                LONG_BOOT_DEVICES.get(boot, boot)))
+        lines.extend([
+            ('ACPI', settings['acpi']),
+            ('IOAPIC', settings['ioapic']),
+            ('PAE', settings['pae']),
+            ('Time offset', '%d ms' % settings['biossystemtimeoffset']),
+            ('RTC', 'UTC' if settings['rtcuseutc'] == 'on' else
+                'local time'),
+            ('Hardw. virt.ext', settings['hwvirtex']),
+            ('Hardw. virt.ext exclusive', settings['hwvirtexexcl']),
+            ('Nested Paging', settings['nestedpaging']),
+            ('Large Pages', settings['largepages']),
+            ('VT-x VPID', settings['vtxvpid']),
+            ('State', '%s (since %s)' % (LONG_STATES.get(vm['state'],
+                vm['state']), vm['state_since'])),
+            ('Monitor count', settings['monitorcount']),
+            ('3D Acceleration', settings['accelerate3d']),
+            ('2D Video Acceleration', settings['accelerate2dvideo']),
+            ('Teleporter Enabled', settings['teleporterenabled']),
+            ('Teleporter Port', settings['teleporterport']),
+            ('Teleporter Address', settings['teleporteraddress']),
+            ('Teleporter Password', settings['teleporterpassword']),
+        ])
+        for index, controller in enumerate(vm['controllers']):
+            lines.extend([
+                ('Storage Controller Name (%d)' % index, controller['name']),
+                ('Storage Controller Type (%d)' % index, controller['type']),
+                ('Storage Controller Instance Number (%d)' % index,
+                    controller['instance']),
+                ('Storage Controller Max Port Count (%d)' % index,
+                    BUSES[controller['bus']][1]),
+                ('Storage Controller Port Count (%d)' % index,
+                    controller['portcount']),
+                ('Storage Controller Bootable (%d)' % index,
+                    controller['bootable']),
+            ])
+        for controller in vm['controllers']:
+            for port, device in _slots(controller):
+                attached = vm['attachments'].get('%s-%d-%d' % (
+                    controller['name'], port, device))
+                if attached is None:
+                    continue
+                medium = self.state['media'].get(attached)
+                lines.append(('%s (%d, %d)' % (controller['name'], port,
+                    device), '%s (UUID: %s)' % (medium['location'],
+                        medium['uuid']) if medium is not None else 'Empty'))
+
+        for index in range(1, NIC_COUNT + 1):
+            nic = settings['nic%d' % index]
+            if nic == 'none':
+                lines.append(('NIC %d' % index, 'disabled'))
+                continue
+            network, attachment = NIC_NETWORKS.get(nic, (None, nic))
+            if network is not None:
+                attachment = "%s '%s'" % (attachment,
+                        settings.get('%s%d' % (network, index), ''))
+            lines.append(('NIC %d' % index, 'MAC: %s, Attachment: %s, Cable '
+                'connected: %s, Trace: off (file: none), Type: %s, Reported '
+                'speed: %d Mbps, Boot priority: %s, Promisc Policy: %s' % (
+                    settings['macaddress%d' % index], attachment,
+                    settings['cableconnected%d' % index],
+                    settings['nictype%d' % index],
+                    int(settings['nicspeed%d' % index]) // 1000,
+                    settings['nicbootprio%d' % index],
+                    settings['nicpromisc%d' % index])))
+        lines.extend([
+            ('Pointing Device', 'PS/2 Mouse'),
+            ('Keyboard Device', 'PS/2 Keyboard'),
+            ('UART 1', 'disabled'),
+            ('UART 2', 'disabled'),
+            ('Audio', 'disabled'),
+            ('Clipboard Mode', 'Bidirectional'),
+            ('VRDE', 'disabled'),
+            ('USB', 'disabled'),
+        ])
+        output = ''.join('%-16s %s\n' % (key + ':', value)
+                for key, value in lines)
+        return output + ('\nUSB Device Filters:\n\n<none>\n\n'
+                'Shared folders:  <none>\n\nGuest:\n\n'
+                'Configured memory balloon size:      %d MB\n\n' %
+                settings['GuestMemoryBalloon'])
+
+    def cmd_startvm(self, args):
+        """
+        """
+        positional, _ = parse_options(args)
+        if not positional:
+            raise syntax_error('Not enough parameters')
+        vm = self.find_vm(positional[0])
+        self.unlocked(vm)
+        self.set_state(vm, 'running')
+        return ('Waiting for VM "%s" to power on...\n'
+                'VM "%s" has been successfully started.\n' % (positional[0],
+                    positional[0])), ''
+
+    def cmd_controlvm(self, args):
+        """
+        """
+        positional, _ = parse_options(args)
+        if len(positional) < 2:
+            raise syntax_error('Not enough parameters')
+        vm = self.find_vm(positional[0])
+        action = positional[1]
+        if vm['state'] not in RUNNING_STATES:
+            raise error("Machine '%s' is not currently running" % vm['name'])
+        stderr = ''
+        if action == 'pause':
+            self.set_state(vm, 'paused')
+        elif action == 'resume':
+            self.set_state(vm, 'running')
+        elif action in ('poweroff', 'acpipowerbutton'):
+            self.set_state(vm, 'poweroff')
+            stderr = PROGRESS if action == 'poweroff' else ''
+        elif action == 'savestate':
+            self.set_state(vm, 'saved')
+            stderr = PROGRESS
+        elif action == 'reset':
+            self.set_state(vm, 'running')
+        return '', stderr
+
+    def cmd_unregistervm(self, args):
+        """
+        """
+        positional, options = parse_options(args)
+        if not positional:
+            raise syntax_error('VM name required')
+        vm = self.find_vm(positional[0])
+        self.unlocked(vm)
+        del self.state['vms'][vm['uuid']]
+        stderr = ''
+        if options.get('delete'):
+            for medium_uuid in set(vm['attachments'].values()):
+                if medium_uuid in self.state['media'] and \
+                        not self.medium_users(medium_uuid):
+                    del self.state['media'][medium_uuid]
+            stderr = PROGRESS
+        self.changed = True
+        return '', stderr
+
+    # storage
+
+    def cmd_storagectl(self, args):
+        """
+        """
+        positional, options = parse_options(args)
+        if not positional or not options.get('name'):
+            raise syntax_error('Storage controller name not specified')
+        vm = self.find_vm(positional[0])
+        self.unlocked(vm)
+        name = options['name']
+        existing = [controller for controller in vm['controllers']
+                if controller['name'] == name]
+
+        if options.get('remove'):
+            if not existing:
+                raise error("Could not find a storage controller named "
+                        "'%s'" % name, VBOX_E_OBJECT_NOT_FOUND, 'Machine',
+                        'IMachine')
+            vm['controllers'].remove(existing[0])
+            for slot in list(vm['attachments']):
+                if slot.startswith(name + '-'):
+                    del vm['attachments'][slot]
+            self.changed = True
+            return '', ''
+
+        bus = options.get('add')
+        if bus not in BUSES:
+            raise syntax_error("Invalid --add argument '%s'" % bus)
+        if existing:
+            raise error("Storage controller named '%s' already exists" %
+                    name, VBOX_E_OBJECT_IN_USE, 'Machine', 'IMachine')
+        controller_type, max_ports, _ = BUSES[bus]
+        vm['controllers'].append({
+            'name': name,
+            'bus': bus,
+            'type': options.get('controller', controller_type),
+            'instance': len([controller for controller in vm['controllers']
+                if controller['bus'] == bus]),
+            'portcount': min(int(options.get('sataportcount', max_ports)),
+                max_ports),
+            'bootable': options.get('bootable', 'on'),
+        })
+        self.changed = True
+        return '', ''
+
+    def cmd_storageattach(self, args):
+        """
+        """
+        positional, options = parse_options(args)
+        if not positional or not options.get('storagectl'):
+            raise syntax_error('Storage controller name not specified')
+        vm = self.find_vm(positional[0])
+        self.unlocked(vm)
+        name = options['storagectl']
+        controllers = [controller for controller in vm['controllers']
+                if controller['name'] == name]
+        if not controllers:
+            raise error("Could not find a controller named '%s'" % name,
+                    VBOX_E_OBJECT_NOT_FOUND, 'Machine', 'IMachine')
+        port = int(options.get('port', 0))
+        device = int(options.get('device', 0))
+        if (port, device) not in _slots(controllers[0]):
+            raise error('The port and/or device parameter are out of range',
+                    E_INVALIDARG, 'Machine', 'IMachine')
+        slot = '%s-%d-%d' % (name, port, device)
+
+        medium = options.get('medium')
+        if medium is None:
+            raise syntax_error('Missing --medium argument')
+        if medium == 'none':
+            vm['attachments'].pop(slot, None)
+        elif medium == 'emptydrive':
+            vm['attachments'][slot] = 'emptydrive'
+        else:
+            found = self.find_medium(medium)
+            if found is None:
+                if not os.path.exists(medium):
+                    raise error("Could not find file for the medium '%s' "
+                            "(VERR_FILE_NOT_FOUND)" % os.path.abspath(medium),
+                            VBOX_E_FILE_ERROR, 'Medium', 'IMedium')
+                found = self.register_medium(os.path.abspath(medium),
+                        os.path.getsize(medium) // (1024 * 1024))
+            vm['attachments'][slot] = found['uuid']
+        self.changed = True
+        return '', ''
+
+    # media
+
+    def register_medium(self, location, capacity, hd_format=None,
+            parent=None):
+        """
+        """
+        if hd_format is None:
+            extension = os.path.splitext(location)[1].lower()
+            hd_format = dict((value, key) for key, value in
+                    HD_EXTENSIONS.items()).get(extension, 'RAW')
+        medium = {'uuid': self.uuid(), 'location': location,
+                'format': hd_format, 'capacity': capacity, 'parent': parent}
+        self.state['media'][medium['uuid']] = medium
+        self.changed = True
+        return medium
+
+    def cmd_createhd(self, args):
+        """
+        """
+        _, options = parse_options(args)
+        filename = options.get('filename')
+        if not filename:
+            raise syntax_error('Parameters --filename is required')
+        if options.get('sizebytes'):
+            capacity = int(options['sizebytes']) // (1024 * 1024)
+        elif options.get('size'):
+            capacity = int(options['size'])
+        else:
+            raise syntax_error('Parameters --size is required')
+        hd_format = options.get('format', 'VDI').upper()
+        if not os.path.splitext(filename)[1]:
+            filename += HD_EXTENSIONS.get(hd_format, '')
+        location = os.path.abspath(filename)
+        if self.find_medium(location) is not None:
+            raise error("Failed to create hard disk\nVBoxManage: error: "
+                    "Cannot register the hard disk '%s' because a hard disk "
+                    "with this location already exists" % location,
+                    E_INVALIDARG)
+        medium = self.register_medium(location, capacity, hd_format)
+        return 'Disk image created. UUID: %s\n' % medium['uuid'], PROGRESS
+
+    def cmd_showhdinfo(self, args):
+        """
+        """
+        positional, _ = parse_options(args)
+        if not positional:
+            raise syntax_error('Not enough parameters')
+        medium = self.find_medium(positional[0])
+        if medium is None:
+            raise error("Could not find file for the medium '%s' "
+                    "(VERR_FILE_NOT_FOUND)" % os.path.abspath(positional[0]),
+                    VBOX_E_FILE_ERROR, 'Medium', 'IMedium')
+        lines = [
+            ('UUID', medium['uuid']),
+            ('Accessible', 'yes'),
+            ('Logical size', '%d MBytes' % medium['capacity']),
+            ('Current size on disk', '0 MBytes'),
+            ('Type', 'normal (%s)' % ('differencing' if medium['parent']
+                else 'base')),
+            ('Storage format', medium['format']),
+            ('Format variant', 'dynamic default'),
+            ('Location', medium['location']),
+        ]
+        return ''.join('%-21s %s\n' % (key + ':', value)
+                for key, value in lines), ''
+
+    def cmd_closemedium(self, args):
+        """
+        """
+        positional, options = parse_options(args)
+        if positional and positional[0] in ('disk', 'dvd', 'floppy'):
+            positional = positional[1:]
+        if not positional:
+            raise syntax_error('Not enough parameters')
+        medium = self.find_medium(positional[0])
+        if medium is None:
+            raise error("Could not find file for the medium '%s' "
+                    "(VERR_FILE_NOT_FOUND)" % os.path.abspath(positional[0]),
+                    VBOX_E_FILE_ERROR, 'Medium', 'IMedium')
+        users = self.medium_users(medium['uuid'])
+        if users:
+            raise error("Cannot close medium '%s' because it is still "
+                    "attached to %d virtual machines" % (medium['location'],
+                        len(users)), VBOX_E_OBJECT_IN_USE, 'Medium',
+                    'IMedium')
+        children = [child for child in self.state['media'].values()
+                if child['parent'] == medium['uuid']]
+        if children:
+            raise error("Cannot close medium '%s' because it has %d child "
+                    "media" % (medium['location'], len(children)),
+                    VBOX_E_OBJECT_IN_USE, 'Medium', 'IMedium')
+        del self.state['media'][medium['uuid']]
+        self.changed = True
+        return '', PROGRESS if options.get('delete') else ''
+
+
+def _slots(controller):
+    """
+    Return the (port, device) pairs of controller.
+    """
+    devices = BUSES[controller['bus']][2]
+    return [(port, device) for port in range(controller['portcount'])
+            for device in range(devices)]
+
+
+_static_cache = {}
+
+
+def _static(name):
+    """
+    """
+    if name not in _static_cache:
+        with open(os.path.join(DATA_DIR, STATIC_OUTPUT[name])) as fn:
+            _static_cache[name] = fn.read()
+    return _static_cache[name]
+
+
+def _latency(value):
+    """
+    Parse VBOXSIM_LATENCY.
+    """
+    if not value:
+        return 0
+    if ':' in value:
+        low, high = value.split(':', 1)
+        return (float(low), float(high))
+    return float(value)
+
+
+def main(argv):
+    import fcntl
+
+    path = os.environ.get('VBOXSIM_STATE') or os.path.join(
+        tempfile.gettempdir(), 'vboxmanage-sim-%d.json' % os.getuid())
+    fail_commands = os.environ.get('VBOXSIM_FAIL_COMMANDS')
+    simulator = Simulator(
+        latency=_latency(os.environ.get('VBOXSIM_LATENCY')),
+        fail_rate=float(os.environ.get('VBOXSIM_FAIL_RATE') or 0),
+        fail_commands=fail_commands.split(',') if fail_commands else None)
+    # sleep before taking the lock, concurrent commands overlap like the
+    # real ones do
+    simulator.delay()
+    simulator.latency = 0
+
+    with open(path + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(path) as fn:
+                simulator.state = json.load(fn)
+        except (IOError, OSError, ValueError):
+            pass
+        seed = os.environ.get('VBOXSIM_SEED')
+        if seed:
+            # every process draws on from where the previous one stopped
+            serial = simulator.state.get('serial', 0)
+            simulator.state['serial'] = serial + 1
+            simulator.random.seed('%s:%d' % (seed, serial))
+            simulator.changed = True
+        status, stdout, stderr = simulator.run(argv)
+        if simulator.changed:
+            tmp_path = '%s.%d.tmp' % (path, os.getpid())
+            with open(tmp_path, 'w') as fn:
+                json.dump(simulator.state, fn)
+            os.replace(tmp_path, path)
+
+    sys.stdout.write(stdout)
+    sys.stderr.write(stderr)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+
+"""
+virtbox.aio
+~~~~~~~~
+
+This module mirrors virtbox.manage for asyncio. Every implemented command
+is available as a coroutine taking the same arguments and returning the
+same parsed result; VBoxManage is run as an asyncio subprocess so callers
+never block the event loop or hold a thread while waiting on it.
+
+    >>> vm = await virtbox.aio.createvm(name='jangofett')
+    >>> await virtbox.aio.modifyvm(vm_uuid=vm['uuid'], memory='256')
+
+The number of VBoxManage processes in flight at once is bounded per event
+loop by set_concurrency(); callers beyond the limit wait on a semaphore.
+
+createvm, modifyvm, startvm, controlvm and unregistervm emit the same
+virtbox.events as their virtbox.manage counterparts, and list_ostypes,
+list_hddbackends and list_systemproperties share the virtbox.cache memo
+of virtbox.manage; a miss runs VBoxManage in the loop's default thread
+pool.
+
+:copyright: (c) 2012 by Sean Plaice.
+:license: ISC, see LICENSE for more details.
+
+"""
+
+import time
+import asyncio
+import functools
+import logging
+import weakref
+import subprocess
+import contextvars
+
+from . import commands
+from . import events
+from . import manage
+from .errors import CommandError, CommandTimeout, CommandCancelled
+from . import executor
+from .executor import kill, Cancelled, CANCEL_POLL_INTERVAL
+from .retry import get_retry_policy, count_recovered
+from .utils import (to_argv, check_result, command_timeout, format_cmd,
+        get_executor)
+from .parsers import (
+        parse_list_vms,
+        parse_list_vms_long,
+        parse_list_runningvms,
+        parse_list_hdds,
+        parse_list_dvds,
+        parse_createvm,
+        parse_showvminfo,
+        parse_createhd,
+        parse_unregistervm,
+        parse_showhdinfo,
+        parse_closemedium,
+        parse_modifyvm,
+        parse_storagectl_add,
+        parse_storagectl_remove,
+        parse_storageattach,
+        parse_version,
+        parse_startvm,
+        parse_controlvm
+        )
+
+
+# setup module level logger
+LOGGER = logging.getLogger(__name__)
+
+# default number of concurrent VBoxManage processes per event loop
+DEFAULT_CONCURRENCY = 16
+
+_concurrency = DEFAULT_CONCURRENCY
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def set_concurrency(limit):
+    """
+    Set the number of VBoxManage processes allowed to run at once. Applies
+    to event loops that have not run a command yet.
+    """
+    global _concurrency
+    if limit < 1:
+        raise ValueError('concurrency limit must be at least 1')
+    _concurrency = limit
+    _semaphores.clear()
+
+
+def _semaphore():
+    """
+    Return the semaphore bounding subprocesses on the running loop.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(_concurrency)
+    return semaphore
+
+
+async def run_cmd(cmd, retry=None, timeout=None):
+    """
+    Coroutine version of virtbox.utils.run_cmd. Cancelling the awaiting
+    task, or setting the cancel event of the enclosing
+    virtbox.utils.deadline(), kills the VBoxManage process group.
+    """
+    argv = to_argv(cmd)
+
+    policy = retry if retry is not None else get_retry_policy()
+    if policy is None:
+        return await _run_argv(argv, timeout)
+
+    started = time.monotonic()
+    attempt = 1
+    while True:
+        try:
+            result = await _run_argv(argv, timeout)
+        except CommandError as exc:
+            delay = policy.next_delay(exc, attempt, started)
+            if delay is None:
+                raise
+            await _sleep(delay, exc)
+            attempt += 1
+        else:
+            if attempt > 1:
+                count_recovered()
+            return result
+
+
+async def _run_argv(argv, timeout=None):
+    """
+    """
+    async with _semaphore():
+        # the deadline keeps running while waiting on the semaphore
+        timeout, cancel = command_timeout(timeout)
+        if timeout == 0:
+            raise CommandTimeout(timeout=0, cmd=format_cmd(argv))
+
+        if get_executor() is not executor:
+            return await _run_executor(argv, timeout, cancel)
+
+        try:
+            proc = await asyncio.create_subprocess_exec(*argv,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    start_new_session=True)
+        except OSError as exc:
+            return check_result(argv, 127, '', exc.strerror or str(exc))
+
+        try:
+            stdout, stderr = await asyncio.wait_for(
+                    _communicate(proc, argv, cancel), timeout)
+        except asyncio.TimeoutError:
+            kill(proc)
+            await proc.wait()
+            LOGGER.error('cmd: %s killed after %.1fs' % (format_cmd(argv),
+                timeout))
+            raise CommandTimeout(timeout=timeout, cmd=format_cmd(argv))
+        except Cancelled:
+            kill(proc)
+            await proc.wait()
+            LOGGER.error('cmd: %s cancelled' % format_cmd(argv))
+            raise CommandCancelled(cmd=format_cmd(argv))
+        except BaseException:
+            kill(proc)
+            raise
+
+    return check_result(argv, proc.returncode,
+            stdout.decode('utf-8', 'replace'),
+            stderr.decode('utf-8', 'replace'))
+
+
+async def _communicate(proc, argv, cancel):
+    """
+    Return the (stdout, stderr) of proc once it exits, raising
+    virtbox.executor.Cancelled as soon as the threading.Event cancel is set.
+    """
+    communicate = asyncio.ensure_future(proc.communicate())
+    try:
+        if cancel is not None:
+            while not communicate.done():
+                if cancel.is_set():
+                    raise Cancelled(argv)
+                await asyncio.wait([communicate],
+                        timeout=CANCEL_POLL_INTERVAL)
+        return await communicate
+    finally:
+        communicate.cancel()
+
+
+async def _sleep(delay, exc):
+    """
+    Coroutine version of virtbox.retry._sleep, raising CommandCancelled
+    once the enclosing deadline's cancel event is set.
+    """
+    _, cancel = command_timeout()
+    if cancel is None:
+        await asyncio.sleep(delay)
+        return
+
+    expires = time.monotonic() + delay
+    while not cancel.is_set():
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            return
+        await asyncio.sleep(min(remaining, CANCEL_POLL_INTERVAL))
+    LOGGER.error('cmd: %s cancelled' % exc.cmd)
+    raise CommandCancelled(cmd=exc.cmd)
+
+
+async def _run_executor(argv, timeout, cancel):
+    """
+    Run argv with the executor set with virtbox.utils.set_executor, e.g. a
+    cassette Replayer, in the loop's default thread pool.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        status_code, stdout, stderr = await loop.run_in_executor(None,
+                functools.partial(get_executor().execute, argv,
+                    timeout=timeout, cancel=cancel))
+    except OSError as exc:
+        status_code, stdout, stderr = 127, '', exc.strerror or str(exc)
+    except subprocess.TimeoutExpired:
+        LOGGER.error('cmd: %s killed after %.1fs' % (format_cmd(argv),
+            timeout))
+        raise CommandTimeout(timeout=timeout, cmd=format_cmd(argv))
+    except Cancelled:
+        LOGGER.error('cmd: %s cancelled' % format_cmd(argv))
+        raise CommandCancelled(cmd=format_cmd(argv))
+    return check_result(argv, status_code, stdout, stderr)
+
+
+def _command(build, parse):
+    """
+    Return a coroutine running the argv from build and parsing its output
+    with parse.
+    """
+    @functools.wraps(build)
+    async def command(*args, **kwargs):
+        stdout, stderr = await run_cmd(build(*args, **kwargs))
+        return parse(stdout, stderr)
+
+    return command
+
+
+def _cached(func):
+    """
+    Return a coroutine calling func, a virtbox.cache.cached function of
+    virtbox.manage, in the loop's default thread pool so a miss does not
+    block the loop.
+    """
+    @functools.wraps(func)
+    async def command():
+        loop = asyncio.get_running_loop()
+        # run_in_executor does not carry the caller's deadline() over
+        return await loop.run_in_executor(None,
+                contextvars.copy_context().run, func)
+
+    return command
+
+
+async def list_vms(long=False):
+    """
+    """
+    stdout, stderr = await run_cmd(commands.list_vms(long=long))
+    if long:
+        return parse_list_vms_long(stdout, stderr)
+    return parse_list_vms(stdout, stderr)
+
+
+async def unregistervm(name=None, uuid=None, delete=True):
+    """
+    """
+    cmd = commands.unregistervm(name=name, uuid=uuid, delete=delete)
+
+    stdout, stderr = await run_cmd(cmd)
+    result = parse_unregistervm(stdout, stderr)
+    events.emit('unregistervm', result, name=name, uuid=uuid, delete=delete)
+    return result
+
+
+async def createvm(name=None, ostype=None, register=True, basefolder=None,
+        uuid=None):
+    """
+    """
+    cmd = commands.createvm(name=name, ostype=ostype, register=register,
+        basefolder=basefolder, uuid=uuid)
+
+    stdout, stderr = await run_cmd(cmd)
+    result = parse_createvm(stdout, stderr)
+    events.emit('createvm', result, name=name, ostype=ostype,
+        register=register, basefolder=basefolder, uuid=uuid)
+    return result
+
+
+async def modifyvm(vm_name=None, vm_uuid=None, **options):
+    """
+    """
+    cmd = commands.modifyvm(vm_name=vm_name, vm_uuid=vm_uuid, **options)
+
+    stdout, stderr = await run_cmd(cmd)
+    result = parse_modifyvm(stdout, stderr)
+    events.emit('modifyvm', result, vm_name=vm_name, vm_uuid=vm_uuid,
+        **options)
+    return result
+
+
+async def startvm(vm_uuid=None, vm_name=None, start_type=None):
+    """
+    """
+    cmd = commands.startvm(vm_uuid=vm_uuid, vm_name=vm_name,
+        start_type=start_type)
+
+    stdout, stderr = await run_cmd(cmd)
+    result = parse_startvm(stdout, stderr)
+    events.emit('startvm', result, vm_uuid=vm_uuid, vm_name=vm_name,
+        start_type=start_type)
+    return result
+
+
+async def controlvm(vm_uuid=None, vm_name=None, action=None):
+    """
+    """
+    cmd = commands.controlvm(vm_uuid=vm_uuid, vm_name=vm_name, action=action)
+
+    stdout, stderr = await run_cmd(cmd)
+    result = parse_controlvm(stdout, stderr)
+    events.emit('controlvm', result, vm_uuid=vm_uuid, vm_name=vm_name,
+        action=action)
+    return result
+
+
+version = _command(commands.version, parse_version)
+list_runningvms = _command(commands.list_runningvms, parse_list_runningvms)
+list_ostypes = _cached(manage.list_ostypes)
+list_hdds = _command(commands.list_hdds, parse_list_hdds)
+list_dvds = _command(commands.list_dvds, parse_list_dvds)
+list_systemproperties = _cached(manage.list_systemproperties)
+list_hddbackends = _cached(manage.list_hddbackends)
+showvminfo = _command(commands.showvminfo, parse_showvminfo)
+closemedium = _command(commands.closemedium, parse_closemedium)
+storageattach = _command(commands.storageattach, parse_storageattach)
+storagectl_add = _command(commands.storagectl_add, parse_storagectl_add)
+storagectl_remove = _command(commands.storagectl_remove,
+        parse_storagectl_remove)
+showhdinfo = _command(commands.showhdinfo, parse_showhdinfo)
+createhd = _command(commands.createhd, parse_createhd)
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+"""
+virtbox.cache
+~~~~~~~~
+
+This module provides a persistent cache for VBoxManage output that only
+changes when VirtualBox is upgraded, such as list ostypes. Entries are
+stored as JSON in CACHE_DIR keyed by the version string of the VBoxManage
+binary, and are only trusted while that binary's path, mtime and size are
+unchanged. An in-process memo sits on top, so a warm call costs one stat
+of the binary and no subprocess:
+
+    >>> @cached('list_ostypes')
+    ... def list_ostypes():
+    ...     ...
+
+Cached results are shared between callers and must not be modified.
+
+:copyright: (c) 2012 by Sean Plaice.
+:license: ISC, see LICENSE for more details.
+
+"""
+
+import os
+import logging
+import functools
+import threading
+
+from .constants import CACHE_DIR
+
+
+# setup module level logger
+LOGGER = logging.getLogger(__name__)
+
+_cache_dir = CACHE_DIR
+# resolved path of the VBoxManage binary, looked up once per process
+_binary = None
+# name -> (binary stamp, version, data)
+_memo = {}
+_lock = threading.Lock()
+
+
+def set_cache_dir(path):
+    """
+    Set the directory entries are stored in, None keeps them in-process
+    only.
+    """
+    global _cache_dir
+    _cache_dir = path
+
+
+def binary_stamp():
+    """
+    Return the (path, mtime, size) of the VBoxManage binary, or None if it
+    can not be found.
+    """
+    global _binary
+    if _binary is None:
+        import shutil
+        from .commands import vboxmanage_path
+        _binary = shutil.which(vboxmanage_path())
+        if _binary is None:
+            return None
+        # a relative path would key the cache on the working directory
+        _binary = os.path.abspath(_binary)
+    try:
+        stat = os.stat(_binary)
+    except OSError:
+        _binary = None
+        return None
+    return (_binary, stat.st_mtime_ns, stat.st_size)
+
+
+def cached(name):
+    """
+    Decorate a function taking no arguments whose result only changes
+    with the VirtualBox version so it is computed once per VBoxManage
+    binary. The uncached function remains available as .uncached.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper():
+            stamp = binary_stamp()
+            if stamp is None:
+                return func()
+
+            memo = _memo.get(name)
+            if memo is not None and memo[0] == stamp:
+                return memo[2]
+
+            with _lock:
+                version = _version(stamp)
+                entry = _load(name)
+                if _valid(entry, stamp) and entry['version'] == version:
+                    data = entry['data']
+                else:
+                    data = func()
+                    _store(name, stamp, version, data)
+                _memo[name] = (stamp, version, data)
+                return data
+
+        wrapper.uncached = func
+        return wrapper
+
+    return decorate
+
+
+def clear_memo():
+    """
+    Forget the in-process memo, the next calls read the on-disk cache.
+    """
+    global _binary
+    with _lock:
+        _memo.clear()
+        _binary = None
+
+
+def clear():
+    """
+    Forget the in-process memo and remove every on-disk entry.
+    """
+    clear_memo()
+    if _cache_dir is None or not os.path.isdir(_cache_dir):
+        return
+    for filename in os.listdir(_cache_dir):
+        if filename.endswith('.json'):
+            try:
+                os.remove(os.path.join(_cache_dir, filename))
+            except OSError as exc:
+                LOGGER.warning('could not remove cache entry %s: %s' %
+                        (filename, exc))
+
+
+def _version(stamp):
+    """
+    Return the version string of the binary stamp describes, from the
+    cache if possible. Must be called holding _lock.
+    """
+    from .utils import run_cmd
+    from .parsers import parse_version
+
+    memo = _memo.get('version')
+    if memo is not None and memo[0] == stamp:
+        return memo[2]
+
+    entry = _load('version')
+    if _valid(entry, stamp):
+        version = entry['data']
+    else:
+        # run the binary that was stat'ed, not whatever is first on PATH now
+        version = parse_version(*run_cmd([stamp[0], '--version']))['version']
+        _store('version', stamp, version, version)
+    _memo['version'] = (stamp, version, version)
+    return version
+
+
+def _valid(entry, stamp):
+    """
+    """
+    return (entry is not None and entry.get('vboxmanage') == stamp[0] and
+            entry.get('mtime') == stamp[1] and entry.get('size') == stamp[2])
+
+
+def _path(name):
+    """
+    """
+    return os.path.join(_cache_dir, '%s.json' % name)
+
+
+def _load(name):
+    """
+    Return the on-disk entry name, or None.
+    """
+    if _cache_dir is None:
+        return None
+    import json
+    try:
+        with open(_path(name)) as fn:
+            return json.load(fn)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _store(name, stamp, version, data):
+    """
+    Atomically replace the on-disk entry name. Failing to write only costs
+    a recomputation later.
+    """
+    if _cache_dir is None:
+        return
+    # json and tempfile are only paid for on a miss or a cold process
+    import json
+    import tempfile
+    entry = {'vboxmanage': stamp[0], 'mtime': stamp[1], 'size': stamp[2],
+            'version': version, 'data': data}
+    try:
+        if not os.path.isdir(_cache_dir):
+            os.makedirs(_cache_dir)
+        fd, tmp_path = tempfile.mkstemp(dir=_cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as fn:
+            json.dump(entry, fn)
+        os.replace(tmp_path, _path(name))
+    except (IOError, OSError) as exc:
+        LOGGER.warning('could not write cache entry %s: %s' % (name, exc))
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+
+"""
+virtbox.cassette
+~~~~~~~~
+
+This module records the VBoxManage commands virtbox runs to a cassette
+file and replays them later without VirtualBox, so tests run in
+milliseconds and benchmarks can replay the traffic of a real host offline:
+
+    >>> with recording('provision.jsonl.gz'):
+    ...     vm = generate_vm()
+    >>> with replaying('provision.jsonl.gz'):
+    ...     vm = generate_vm()
+
+A cassette is a JSON lines file, gzip compressed when its name ends in
+.gz: a header line, then one line per command with its argv, exit status,
+stdout, stderr and duration in seconds. The executable is left out of the
+argv, so a cassette replays whatever VBoxManage path is set.
+
+Recorder and Replayer are executors for virtbox.utils.set_executor, which
+recording() and replaying() install for the duration of a block. The
+Replayer answers each argv with the responses recorded for it in the order
+they were recorded, starting over once they run out, and raises
+CassetteError for an argv that was never recorded. With realtime it also
+takes as long as the recorded command did.
+
+Output memoized by virtbox.cache is only recorded when it is computed;
+both context managers clear the in-process memo, and an on-disk cache dir
+should be disabled with virtbox.cache.set_cache_dir(None) to record and
+replay every command.
+
+:copyright: (c) 2012 by Sean Plaice.
+:license: ISC, see LICENSE for more details.
+
+"""
+
+import gzip
+import json
+import time
+import logging
+import threading
+import contextlib
+import subprocess
+
+from . import executor as _executor
+from .cache import clear_memo
+from .errors import CassetteError
+from .utils import format_cmd, get_executor, set_executor
+
+
+# setup module level logger
+LOGGER = logging.getLogger(__name__)
+
+# bump when the cassette lines change shape
+CASSETTE_VERSION = 1
+
+
+def _open(path, mode):
+    """
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def _key(args):
+    """
+    """
+    return tuple(str(arg) for arg in args)
+
+
+def load(path):
+    """
+    Return the entries recorded in the cassette at path, each a dict with
+    argv, status, stdout, stderr and duration.
+    """
+    try:
+        with _open(path, 'r') as fn:
+            lines = fn.read().splitlines()
+    except (IOError, OSError, EOFError) as exc:
+        raise CassetteError(reason=str(exc), path=path)
+
+    try:
+        header = json.loads(lines[0]) if lines else None
+        entries = [json.loads(line) for line in lines[1:] if line]
+    except ValueError as exc:
+        raise CassetteError(reason='invalid cassette line: %s' % exc,
+                path=path)
+    if not isinstance(header, dict) or \
+            header.get('cassette') != CASSETTE_VERSION:
+        raise CassetteError(reason='not a version %d cassette' %
+                CASSETTE_VERSION, path=path)
+    return entries
+
+
+class Recorder(object):
+    """ An executor running commands with executor, virtbox.executor by
+        default, and appending every one to the cassette at path as soon
+        as it exits. Commands killed on a timeout or cancelled are not
+        recorded.
+    """
+
+    def __init__(self, path, executor=None):
+        self.path = path
+        self.executor = executor or _executor
+        self.count = 0
+        self._lock = threading.Lock()
+        self._fn = _open(path, 'w')
+        self._write({'cassette': CASSETTE_VERSION})
+
+    def execute(self, argv, env=None, cwd=None, timeout=None, cancel=None):
+        """
+        """
+        started = time.monotonic()
+        try:
+            result = self.executor.execute(argv, env=env, cwd=cwd,
+                    timeout=timeout, cancel=cancel)
+        except OSError as exc:
+            # replayed as the exit status run_cmd reports for it
+            self._record(argv, 127, '', exc.strerror or str(exc), started)
+            raise
+        self._record(argv, result[0], result[1], result[2], started)
+        return result
+
+    def stream(self, argv, env=None, cwd=None, timeout=None, cancel=None):
+        """
+        """
+        started = time.monotonic()
+        lines = []
+        try:
+            status_code, stderr = yield from _tee(self.executor.stream(argv,
+                env=env, cwd=cwd, timeout=timeout, cancel=cancel), lines)
+        except OSError as exc:
+            self._record(argv, 127, '', exc.strerror or str(exc), started)
+            raise
+        self._record(argv, status_code, ''.join(line + '\n'
+            for line in lines), stderr, started)
+        return (status_code, stderr)
+
+    def close(self):
+        """
+        """
+        with self._lock:
+            self._fn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _record(self, argv, status_code, stdout, stderr, started):
+        """
+        """
+        entry = {'argv': list(_key(argv[1:])), 'status': status_code,
+                'stdout': stdout, 'stderr': stderr,
+                'duration': round(time.monotonic() - started, 6)}
+        with self._lock:
+            self._write(entry)
+            self.count += 1
+
+    def _write(self, data):
+        """
+        """
+        self._fn.write(json.dumps(data, separators=(',', ':')) + '\n')
+        self._fn.flush()
+
+
+class Replayer(object):
+    """ An executor answering commands from cassette, a path or a list of
+        entries, in place of running them.
+    """
+
+    def __init__(self, cassette, realtime=False):
+        self.path = cassette if isinstance(cassette, str) else None
+        entries = load(cassette) if self.path is not None else cassette
+        self.realtime = realtime
+        self.count = 0
+        self._responses = {}
+        for entry in entries:
+            self._responses.setdefault(_key(entry['argv']), []).append(entry)
+        self._served = dict.fromkeys(self._responses, 0)
+        self._lock = threading.Lock()
+
+    def execute(self, argv, env=None, cwd=None, timeout=None, cancel=None):
+        """
+        """
+        key = _key(argv[1:])
+        with self._lock:
+            responses = self._responses.get(key)
+            if not responses:
+                raise CassetteError(reason='not recorded: %s' %
+                        format_cmd(argv), path=self.path)
+            entry = responses[self._served[key] % len(responses)]
+            self._served[key] += 1
+            self.count += 1
+
+        if self.realtime:
+            duration = entry.get('duration', 0)
+            if timeout is not None and duration > timeout:
+                time.sleep(timeout)
+                raise subprocess.TimeoutExpired(argv, timeout)
+            time.sleep(duration)
+        return (entry['status'], entry['stdout'], entry['stderr'])
+
+    def stream(self, argv, env=None, cwd=None, timeout=None, cancel=None):
+        """
+        """
+        status_code, stdout, stderr = self.execute(argv, timeout=timeout)
+        lines = stdout.split('\n')
+        if lines[-1] == '':
+            lines.pop()
+        for line in lines:
+            yield line
+        return (status_code, stderr)
+
+
+def _tee(generator, lines):
+    """
+    Yield from generator, appending what it yields to lines, and return
+    what it returns.
+    """
+    try:
+        line = next(generator)
+        while True:
+            lines.append(line)
+            yield line
+            line = next(generator)
+    except StopIteration as stop:
+        return stop.value
+    finally:
+        generator.close()
+
+
+@contextlib.contextmanager
+def recording(path):
+    """
+    Record every command run inside the block, through the executor set
+    when it is entered, to the cassette at path.
+    """
+    previous = get_executor()
+    recorder = Recorder(path, previous)
+    clear_memo()
+    set_executor(recorder)
+    try:
+        yield recorder
+    finally:
+        set_executor(previous)
+        recorder.close()
+        LOGGER.info('recorded %d commands to %s' % (recorder.count, path))
+
+
+@contextlib.contextmanager
+def replaying(cassette, realtime=False):
+    """
+    Answer every command run inside the block from cassette, a path or a
+    list of entries.
+    """
+    previous = get_executor()
+    replayer = Replayer(cassette, realtime=realtime)
+    clear_memo()
+    set_executor(replayer)
+    try:
+        yield replayer
+    finally:
+        set_executor(previous)
+        # memoized output must not outlive the replay
+        clear_memo()
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+
+"""
+virtbox.commands
+~~~~~~~~
+
+This module provides the argv builders for the VBoxManage commands that
+virtbox implements. Each function takes the same arguments as its
+counterpart in virtbox.manage and returns the argv list to run, so the
+blocking and the asyncio APIs share one definition of every command line.
+
+:copyright: (c) 2012 by Sean Plaice.
+:license: ISC, see LICENSE for more details.
+
+"""
+
+import logging
+
+from .errors import (
+        VirtboxManageError,
+        VirtboxMissingArgument
+        )
+from .options import (
+        MODIFYVM_OPTIONS,
+        STORAGEATTACH_OPTIONS,
+        STORAGECTL_ADD_OPTIONS,
+        CREATEHD_OPTIONS,
+        )
+from .constants import (
+        VBOXMANAGE_CMD,
+        MEDIUM_TYPES,
+        )
+
+
+# setup module level logger
+LOGGER = logging.getLogger(__name__)
+
+# the VBoxManage executable every argv starts with
+_vboxmanage = VBOXMANAGE_CMD
+
+
+def set_vboxmanage_path(path):
+    """
+    Run path, e.g. tools/vboxmanage_sim.py, in place of VBoxManage. None
+    restores VBOXMANAGE_CMD.
+    """
+    global _vboxmanage
+    _vboxmanage = path or VBOXMANAGE_CMD
+    # cached output belongs to the binary it came from
+    from .cache import clear_memo
+    clear_memo()
+
+
+def vboxmanage_path():
+    """
+    """
+    return _vboxmanage
+
+
+def version():
+    """
+    """
+    return [_vboxmanage, '--version']
+
+
+def list_vms(long=False):
+    """
+    """
+    if long:
+        return [_vboxmanage, 'list', '--long', 'vms']
+    return [_vboxmanage, 'list', 'vms']
+
+
+def list_runningvms():
+    """
+    """
+    return [_vboxmanage, 'list', 'runningvms']
+
+
+def list_ostypes():
+    """
+    """
+    return [_vboxmanage, 'list', 'ostypes']
+
+
+def list_systemproperties():
+    """
+    """
+    return [_vboxmanage, 'list', 'systemproperties']
+
+
+def list_hddbackends():
+    """
+    """
+    return [_vboxmanage, 'list', 'hddbackends']
+
+
+def list_hdds():
+    """
+    """
+    return [_vboxmanage, 'list', 'hdds']
+
+
+def list_dvds():
+    """
+    """
+    return [_vboxmanage, 'list', 'dvds']
+
+
+def showvminfo(name=None, uuid=None):
+    """
+    """
+    cmd = [_vboxmanage, 'showvminfo', '--machinereadable', '--details']
+
+    if uuid:
+        cmd.append(uuid)
+    elif name:
+        cmd.append(name)
+    else:
+        raise VirtboxManageError(reason="name or uuid argument required")
+
+    return cmd
+
+
+def unregistervm(name=None, uuid=None, delete=True):
+    """
+    """
+    cmd = [_vboxmanage, 'unregistervm']
+
+    if uuid:
+        cmd.append(uuid)
+    elif name:
+        cmd.append(name)
+
+    if delete:
+        cmd.append('--delete')
+
+    return cmd
+
+
+def createvm(name=None, ostype=None, register=True, basefolder=None,
+        uuid=None):
+    """
+    """
+    cmd = [_vboxmanage, 'createvm']
+    if name:
+        cmd.extend(['--name', name])
+
+    if ostype:
+        cmd.extend(['--ostype', ostype])
+
+    if basefolder:
+        cmd.extend(['--basefolder', basefolder])
+
+    if uuid:
+        cmd.extend(['--uuid', uuid])
+
+    if register:
+        cmd.append('--register')
+    else:
+        raise VirtboxManageError(
+                reason='register as False is currently unsupported.')
+
+    return cmd
+
+
+def modifyvm(vm_name=None, vm_uuid=None, **options):
+    """
+    options are the modifyvm settings listed in
+    virtbox.options.MODIFYVM_OPTIONS.
+    """
+    cmd = [_vboxmanage, 'modifyvm']
+
+    if vm_uuid:
+        cmd.append(vm_uuid)
+    elif vm_name:
+        cmd.append(vm_name)
+
+    MODIFYVM_OPTIONS.build(cmd, options)
+
+    return cmd
+
+
+def startvm(vm_uuid=None, vm_name=None, start_type=None):
+    """
+    """
+    cmd = [_vboxmanage, 'startvm']
+
+    if vm_uuid:
+        cmd.append(vm_uuid)
+    elif vm_name:
+        cmd.append(vm_name)
+
+    if start_type:
+        cmd.extend(['--type', start_type])
+
+    return cmd
+
+
+def controlvm(vm_uuid=None, vm_name=None, action=None):
+    """
+    """
+    cmd = [_vboxmanage, 'controlvm']
+
+    if vm_uuid:
+        cmd.append(vm_uuid)
+    elif vm_name:
+        cmd.append(vm_name)
+
+    if action:
+        cmd.append(action)
+
+    return cmd
+
+
+def closemedium(medium_type=None, uuid=None, filename=None,
+        delete=False):
+    """
+    """
+    cmd = [_vboxmanage, 'closemedium']
+
+    if medium_type:
+        if medium_type not in MEDIUM_TYPES:
+            raise VirtboxManageError(reason='unsupported medium provided')
+        cmd.append(medium_type)
+
+    if uuid:
+        cmd.append(uuid)
+    elif filename:
+        cmd.append(filename)
+
+    if delete:
+        cmd.append('--delete')
+
+    return cmd
+
+
+def storageattach(uuid=None, vmname=None, name=None, port=None,
+        device=None, storage_type=None, medium=None, mtype=None,
+        comment=None, setuuid=None, setparentuuid=None, passthrough=None,
+        tempeject=None, nonrotational=None, bandwidthgroup=None,
+        forceunmount=False, server=None, target=None, tport=None, lun=None,
+        encodedlun=None, username=None, password=None, intnet=None):
+    """
+    """
+    cmd = [_vboxmanage, 'storageattach']
+
+    if uuid:
+        cmd.append(uuid)
+    elif vmname:
+        cmd.append(vmname)
+
+    if not name:
+        raise VirtboxMissingArgument("kwarg name is required.")
+
+    STORAGEATTACH_OPTIONS.build(cmd, {'name': name, 'port': port,
+        'device': device, 'storage_type': storage_type, 'medium': medium,
+        'mtype': mtype, 'comment': comment, 'setuuid': setuuid,
+        'setparentuuid': setparentuuid, 'passthrough': passthrough,
+        'tempeject': tempeject, 'nonrotational': nonrotational,
+        'bandwidthgroup': bandwidthgroup, 'forceunmount': forceunmount,
+        'server': server, 'target': target, 'tport': tport, 'lun': lun,
+        'encodedlun': encodedlun, 'username': username,
+        'password': password, 'intnet': intnet})
+
+    return cmd
+
+
+def storagectl_add(uuid=None, vmname=None, name=None, ctl_type=None,
+        controller=None, sataideemulation1=None, sataideemulation2=None,
+        sataideemulation3=None, sataideemulation4=None, sataportcount=None,
+        hostiocache=None, bootable=False):
+    """
+    """
+    cmd = [_vboxmanage, 'storagectl']
+
+    if uuid:
+        cmd.append(uuid)
+    elif vmname:
+        cmd.append(vmname)
+
+    if not name:
+        raise VirtboxMissingArgument("kwarg name is required.")
+
+    STORAGECTL_ADD_OPTIONS.build(cmd, {'name': name, 'ctl_type': ctl_type,
+        'controller': controller, 'sataideemulation1': sataideemulation1,
+        'sataideemulation2': sataideemulation2,
+        'sataideemulation3': sataideemulation3,
+        'sataideemulation4': sataideemulation4,
+        'sataportcount': sataportcount, 'hostiocache': hostiocache,
+        'bootable': bootable})
+
+    return cmd
+
+
+def storagectl_remove(uuid=None, vmname=None, name=None):
+    """
+    """
+    cmd = [_vboxmanage, 'storagectl']
+
+    if uuid:
+        cmd.append(uuid)
+    elif vmname:
+        cmd.append(vmname)
+
+    if name:
+        cmd.extend(['--name', name, '--remove'])
+    else:
+        raise VirtboxMissingArgument("kwarg name is required.")
+
+    return cmd
+
+
+def showhdinfo(uuid=None, filename=None):
+    """
+    """
+    cmd = [_vboxmanage, 'showhdinfo']
+
+    if uuid:
+        cmd.append(uuid)
+    elif filename:
+        cmd.append(filename)
+
+    return cmd
+
+
+def createhd(filename=None, size=None, sizebytes=None, hd_format=None,
+        variant=None):
+    """
+    """
+    cmd = [_vboxmanage, 'createhd']
+
+    # --sizebytes takes precedence over --size
+    if sizebytes:
+        size = None
+
+    CREATEHD_OPTIONS.build(cmd, {'filename': filename, 'size': size,
+        'sizebytes': sizebytes, 'hd_format': hd_format, 'variant': variant})
+
+    return cmd
@@ -6,7 +6,39 @@ This module contains constants used.
 :license: ISC, see LICENSE for more details.
 """
 
-VBOXMANAGE_CMD = 'VBoxManage'
+import os
+
+# the VBoxManage executable, see virtbox.commands.set_vboxmanage_path
+VBOXMANAGE_CMD = os.environ.get('VIRTBOX_VBOXMANAGE') or 'VBoxManage'
+# directory of the on-disk cache for output that only changes when
+# VirtualBox is upgraded, see virtbox.cache
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or
+    os.path.join(os.path.expanduser('~'), '.cache'), 'virtbox')
+# file virtbox.diskusage keeps the per-image sizes it measured in
+DISKUSAGE_CACHE = os.path.join(CACHE_DIR, 'diskusage.json')
+# default timeout in seconds for a single VBoxManage command, None waits
+# forever
+COMMAND_TIMEOUT = None
+# seconds a virtbox.inventory.Inventory trusts its last bulk listing before
+# listing again to catch changes made outside virtbox
+INVENTORY_TTL = 30
+# seconds between checks of the settings files by virtbox.watch.Watcher
+WATCH_INTERVAL = 2
+# default worker count for bulk commands such as showvminfo_many
+FANOUT_WORKERS = 8
+# output parser engines: fast regex parsers falling back to the pyparsing
+# grammars, or the pyparsing grammars only
+PARSER_ENGINE_FAST = 'fast'
+PARSER_ENGINE_PYPARSING = 'pyparsing'
+PARSER_ENGINES = (PARSER_ENGINE_FAST, PARSER_ENGINE_PYPARSING)
+PARSER_ENGINE = PARSER_ENGINE_FAST
+# where list_vms, showvminfo, list_hdds and showhdinfo read from:
+# VBoxManage, or the VirtualBox.xml and .vbox settings files and image
+# headers with VBoxManage as the fallback
+READ_BACKEND_VBOXMANAGE = 'vboxmanage'
+READ_BACKEND_SETTINGS = 'settings'
+READ_BACKENDS = (READ_BACKEND_VBOXMANAGE, READ_BACKEND_SETTINGS)
+READ_BACKEND = READ_BACKEND_VBOXMANAGE
 BOOLEAN_OPTIONS = ('on', 'off')
 HD_FORMATS = ('VDI', 'VMDK', 'VHD', 'RAW')
 HD_VARIANTS = ('Standard', 'Fixed', 'Split2G', 'Stream', 'ESX')
@@ -26,3 +58,38 @@ VM_NIC_OPTIONS = ('none', 'null', 'nat', 'bridged', 'intnet', 'hostonly',
 VM_NICTYPE_OPTIONS = ('Am79C970A', 'Am79C973', '82540EM', '82543GC', '82545EM',
     'virtio')
 VM_NICPROMISC_OPTIONS = ('deny', 'allow-vms', 'allow-all')
+
+# stderr classification for failed VBoxManage commands: (error code,
+# category, pattern) tried in order against stderr. transient errors clear
+# up on their own and are safe to retry, permanent ones are not.
+ERROR_TRANSIENT = 'transient'
+ERROR_PERMANENT = 'permanent'
+ERROR_UNKNOWN = 'unknown'
+ERROR_CLASSES = (
+    ('object_locked', ERROR_TRANSIENT,
+        r'is already locked|locked for a session|being locked or unlocked|'
+        r'while it is locked'),
+    ('session_busy', ERROR_TRANSIENT,
+        r'[Ss]ession is busy|session is (already|still) open'),
+    ('medium_locked', ERROR_TRANSIENT,
+        r'is locked for (reading|writing)'),
+    ('vboxsvc_unavailable', ERROR_TRANSIENT,
+        r'Failed to create the VirtualBox object|Failed to create a session|'
+        r'NS_ERROR_CALL_FAILED|NS_ERROR_ABORT|RPC_E_|remote procedure call'),
+    ('object_not_ready', ERROR_TRANSIENT,
+        r'object is not ready'),
+    ('not_found', ERROR_PERMANENT,
+        r'Could not find a registered machine|VBOX_E_OBJECT_NOT_FOUND'),
+    ('medium_not_found', ERROR_PERMANENT,
+        r'Could not find file for the medium|Could not open the medium|'
+        r'VERR_FILE_NOT_FOUND|VBOX_E_FILE_ERROR'),
+    ('access_denied', ERROR_PERMANENT,
+        r'E_ACCESSDENIED|VERR_ACCESS_DENIED'),
+    ('already_exists', ERROR_PERMANENT,
+        r'already exists'),
+    ('object_in_use', ERROR_PERMANENT,
+        r'VBOX_E_OBJECT_IN_USE'),
+    ('invalid_argument', ERROR_PERMANENT,
+        r'Syntax error|Invalid parameter|Unknown option|E_INVALIDARG|'
+        r'[Ii]nvalid argument'),
+)
@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+
+"""
+virtbox.dag
+~~~~~~~~
+
+This module runs provisioning steps as a dependency graph rather than one
+after another. Every step names the steps it needs, and steps whose
+dependencies are done run concurrently, so the slow createhd of a Fixed
+image overlaps createvm and the disks of a vm are created in parallel:
+
+    >>> graph = Graph()
+    >>> graph.add('createvm', manage.createvm, {'name': 'jangofett'})
+    >>> graph.add('createhd', manage.createhd, {'filename': '/srv/a.vdi',
+    ...         'size': '8192', 'variant': 'Fixed'})
+    >>> graph.add('storagectl', manage.storagectl_add,
+    ...         {'uuid': ref('createvm', 'uuid'), 'name': 'primary',
+    ...          'ctl_type': 'sata'})
+    >>> graph.add('attach', manage.storageattach,
+    ...         {'uuid': ref('createvm', 'uuid'), 'name': 'primary',
+    ...          'port': '0', 'device': '0', 'storage_type': 'hdd',
+    ...          'medium': ref('createhd', 'uuid')}, after=['storagectl'])
+    >>> report = graph.run()
+    >>> print(timeline(report))
+
+A ref to the result of another step is resolved when the step starts and
+makes it a dependency. Steps run through a virtbox.scheduler.Scheduler, so
+calls against the same vm never overlap even when the graph allows it.
+When a step fails every step depending on it, directly or not, is
+cancelled while the other branches run to completion. The report lists
+when each step ran and the critical path, the chain of steps that
+determined how long the whole graph took.
+
+provision() builds the graph of a vm with its disks.
+
+:copyright: (c) 2012 by Sean Plaice.
+:license: ISC, see LICENSE for more details.
+
+"""
+
+import time
+import logging
+import threading
+import functools
+import contextvars
+
+from . import manage
+from .errors import VirtboxManageError
+from .scheduler import Scheduler, vm_key
+from .constants import FANOUT_WORKERS
+
+
+# setup module level logger
+LOGGER = logging.getLogger(__name__)
+
+STEP_PENDING = 'pending'
+STEP_RUNNING = 'running'
+STEP_OK = 'ok'
+STEP_FAILED = 'failed'
+STEP_CANCELLED = 'cancelled'
+
+
+class Ref(object):
+    """ The result of step, or its item key, passed to a later step.
+    """
+    __slots__ = ('step', 'key')
+
+    def __init__(self, step, key=None):
+        self.step = step
+        self.key = key
+
+    def resolve(self, results):
+        """
+        """
+        value = results[self.step]
+        return value if self.key is None else value[self.key]
+
+    def __repr__(self):
+        return '<Ref %s %s>' % (self.step, self.key)
+
+
+def ref(step, key=None):
+    """
+    Return a placeholder for the result of step, or its item key, to use
+    as a keyword argument value of a later step.
+    """
+    return Ref(step, key)
+
+
+class _Step(object):
+    """ A step of a Graph and how its run went.
+    """
+    __slots__ = ('name', 'func', 'kwargs', 'after', 'key', 'status',
+            'started', 'finished', 'error')
+
+    def __init__(self, name, func, kwargs, after, key):
+        self.name = name
+        self.func = func
+        self.kwargs = kwargs
+        self.after = after
+        self.key = key
+        self.status = STEP_PENDING
+        self.started = None
+        self.finished = None
+        self.error = None
+
+
+class Graph(object):
+    """ Steps and the steps each of them waits for.
+
+        Steps run on scheduler, shared with other callers, or a private
+        Scheduler of workers threads.
+    """
+
+    def __init__(self, workers=FANOUT_WORKERS, scheduler=None):
+        self.workers = workers
+        self._scheduler = scheduler
+        self._steps = {}
+        self._lock = threading.Condition()
+
+    def add(self, name, func, kwargs=None, after=(), key=None):
+        """
+        Add the step name calling func(**kwargs) once the steps in after
+        and those kwargs refer to are done. key overrides the vm the step
+        is serialized on, derived from kwargs as by the scheduler.
+        Returns name.
+        """
+        if name in self._steps:
+            raise VirtboxManageError(reason='duplicate step %s' % name)
+        kwargs = dict(kwargs or {})
+        after = list(after)
+        for value in kwargs.values():
+            if isinstance(value, Ref) and value.step not in after:
+                after.append(value.step)
+        self._steps[name] = _Step(name, func, kwargs, after, key)
+        return name
+
+    def run(self):
+        """
+        Run every step and return the report: the elapsed seconds, a dict
+        per step in the order added with its status, start and end
+        offsets in seconds and error, the results of the steps that
+        succeeded by name, the failed and cancelled steps and the
+        critical path.
+        """
+        self._check()
+        steps = self._steps
+        for step in steps.values():
+            step.status = STEP_PENDING
+            step.started = step.finished = step.error = None
+        self._results = {}
+        self._waiting = dict((name, set(step.after))
+                for name, step in steps.items())
+        self._dependents = dict((name, []) for name in steps)
+        for name, step in steps.items():
+            for dependency in step.after:
+                self._dependents[dependency].append(name)
+        self._remaining = len(steps)
+        # run the steps in the caller's context so its deadline() applies
+        self._context = contextvars.copy_context()
+        self._started = time.monotonic()
+
+        scheduler = self._scheduler or Scheduler(limit=self.workers)
+        self._active = scheduler
+        try:
+            with self._lock:
+                for name in steps:
+                    if not self._waiting[name]:
+                        self._submit(steps[name])
+                while self._remaining:
+                    self._lock.wait()
+        finally:
+            if self._scheduler is None:
+                scheduler.shutdown()
+            self._active = None
+
+        return self._report(time.monotonic() - self._started)
+
+    def _check(self):
+        """
+        Raise VirtboxManageError for unknown dependencies and cycles.
+        """
+        for step in self._steps.values():
+            for dependency in step.after:
+                if dependency not in self._steps:
+                    raise VirtboxManageError(reason='step %s depends on '
+                            'unknown step %s' % (step.name, dependency))
+
+        done = set()
+        waiting = dict((name, set(step.after))
+                for name, step in self._steps.items())
+        while waiting:
+            ready = [name for name, after in waiting.items()
+                    if after <= done]
+            if not ready:
+                raise VirtboxManageError(reason='dependency cycle among %s'
+                        % ', '.join(sorted(waiting)))
+            for name in ready:
+                done.add(name)
+                del waiting[name]
+
+    def _submit(self, step):
+        """
+        Start step. Must be called holding self._lock.
+        """
+        try:
+            kwargs = dict((name, value.resolve(self._results)
+                if isinstance(value, Ref) else value)
+                for name, value in step.kwargs.items())
+        except (KeyError, IndexError, TypeError) as exc:
+            self._finish(step, error=VirtboxManageError(
+                reason='could not resolve the arguments of step %s: %r'
+                % (step.name, exc)))
+            return
+
+        step.status = STEP_RUNNING
+        key = step.key if step.key is not None else \
+                vm_key(step.func, kwargs)
+        try:
+            future = self._active.submit(functools.partial(self._call, step,
+                kwargs), key=key)
+        except RuntimeError as exc:
+            # the shared scheduler was shut down under the graph
+            self._finish(step, error=exc)
+            return
+        future.add_done_callback(functools.partial(self._done, step))
+
+    def _call(self, step, kwargs):
+        """
+        """
+        step.started = time.monotonic()
+        try:
+            return self._context.copy().run(step.func, **kwargs)
+        finally:
+            step.finished = time.monotonic()
+
+    def _done(self, step, future):
+        """
+        """
+        with self._lock:
+            if future.cancelled():
+                error = VirtboxManageError(reason='step %s was cancelled'
+                        % step.name)
+            else:
+                error = future.exception()
+            if error is None:
+                self._results[step.name] = future.result()
+            self._finish(step, error=error)
+
+    def _finish(self, step, error=None):
+        """
+        Record the outcome of step and start or cancel the steps waiting
+        for it. Must be called holding self._lock.
+        """
+        self._remaining -= 1
+        if error is not None:
+            LOGGER.warning('step %s failed: %s' % (step.name, error))
+            step.status = STEP_FAILED
+            step.error = error
+            self._cancel(step)
+        else:
+            step.status = STEP_OK
+            for name in self._dependents[step.name]:
+                waiting = self._waiting[name]
+                waiting.discard(step.name)
+                if not waiting and self._steps[name].status == STEP_PENDING:
+                    self._submit(self._steps[name])
+        self._lock.notify_all()
+
+    def _cancel(self, step):
+        """
+        Cancel every pending step depending on step.
+        """
+        for name in self._dependents[step.name]:
+            dependent = self._steps[name]
+            if dependent.status == STEP_PENDING:
+                LOGGER.debug('step %s cancelled, %s failed' % (name,
+                    step.name))
+                dependent.status = STEP_CANCELLED
+                self._remaining -= 1
+                self._cancel(dependent)
+
+    def _report(self, elapsed):
+        """
+        """
+        entries = []
+        for step in self._steps.values():
+            entry = {'name': step.name, 'status': step.status,
+                    'after': list(step.after), 'start': None, 'end': None,
+                    'duration': None, 'error': None}
+            if step.started is not None:
+                entry['start'] = step.started - self._started
+                entry['end'] = step.finished - self._started
+                entry['duration'] = step.finished - step.started
+            if step.error is not None:
+                entry['error'] = str(step.error)
+            entries.append(entry)
+
+        return {
+            'elapsed': elapsed,
+            'steps': entries,
+            'results': dict(self._results),
+            'failed': [entry['name'] for entry in entries
+                if entry['status'] == STEP_FAILED],
+            'cancelled': [entry['name'] for entry in entries
+                if entry['status'] == STEP_CANCELLED],
+            'critical_path': critical_path(entries),
+        }
+
+
+def critical_path(entries):
+    """
+    Return the names of the steps on the critical path of the report
+    steps entries: from the step that ended last back through the
+    dependency each step waited for longest, i.e. that ended last.
+    """
+    by_name = dict((entry['name'], entry) for entry in entries
+            if entry['end'] is not None)
+    if not by_name:
+        return []
+
+    path = []
+    entry = max(by_name.values(), key=lambda entry: entry['end'])
+    while entry is not None:
+        path.append(entry['name'])
+        ran = [by_name[name] for name in entry['after'] if name in by_name]
+        entry = max(ran, key=lambda entry: entry['end']) if ran else None
+    path.reverse()
+    return path
+
+
+def timeline(report, width=50):
+    """
+    Render report as text, a bar per step over the elapsed time with the
+    steps on the critical path marked with a *.
+    """
+    elapsed = report['elapsed'] or 1e-9
+    critical = set(report['critical_path'])
+    label = max([len(entry['name']) for entry in report['steps']] + [4])
+    lines = []
+    for entry in report['steps']:
+        if entry['start'] is None:
+            bar = ''
+            timing = entry['status']
+        else:
+            first = int(entry['start'] / elapsed * width)
+            last = max(int(entry['end'] / elapsed * width), first + 1)
+            bar = ' ' * first + '#' * (last - first)
+            timing = '%.3fs' % entry['duration']
+            if entry['status'] != STEP_OK:
+                timing += ' ' + entry['status']
+        lines.append('%s %-*s |%-*s| %s' % ('*' if entry['name'] in critical
+            else ' ', label, entry['name'], width, bar, timing))
+    lines.append('  %-*s  %*s  %.3fs' % (label, 'total', width, '',
+        report['elapsed']))
+    return '\n'.join(lines)
+
+
+def provision(name, disks=(), ostype=None, basefolder=None,
+        controller=None, options=None, start_type=None,
+        workers=FANOUT_WORKERS):
+    """
+    Return a Graph creating the vm name with createvm while its disks,
+    createhd keyword dicts, are created in parallel. The disks are
+    attached in order to a controller, storagectl_add keywords defaulting
+    to a sata controller named primary, once it and the disk exist.
+    options are applied with one modifyvm, and with start_type the vm is
+    started once everything else is done.
+    """
+    graph = Graph(workers=workers)
+    createvm = {'name': name}
+    if ostype:
+        createvm['ostype'] = ostype
+    if basefolder:
+        createvm['basefolder'] = basefolder
+    graph.add('createvm', manage.createvm, createvm)
+    uuid = ref('createvm', 'uuid')
+
+    last = []
+    if options:
+        modifyvm = {'vm_uuid': uuid}
+        modifyvm.update(options)
+        last.append(graph.add('modifyvm', manage.modifyvm, modifyvm))
+
+    if disks:
+        storagectl = {'name': 'primary', 'ctl_type': 'sata',
+                'sataportcount': len(disks)}
+        storagectl.update(controller or {})
+        storagectl['uuid'] = uuid
+        graph.add('storagectl_add', manage.storagectl_add, storagectl)
+
+    for port, disk in enumerate(disks):
+        createhd = graph.add('createhd%d' % port, manage.createhd, disk)
+        last.append(graph.add('storageattach%d' % port,
+            manage.storageattach, {'uuid': uuid,
+                'name': storagectl['name'], 'port': str(port),
+                'device': '0', 'storage_type': 'hdd',
+                'medium': ref(createhd, 'uuid')},
+            after=['storagectl_add']))
+
+    if start_type:
+        graph.add('startvm', manage.startvm, {'vm_uuid': uuid,
+            'start_type': start_type}, after=last)
+    return graph
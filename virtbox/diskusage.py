@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+
+"""
+virtbox.diskusage
+~~~~~~~~
+
+This module accounts for the disk space taken by the registered hard
+disks, per medium, per differencing chain, per vm and per directory,
+without a showhdinfo process per medium:
+
+    >>> usage = DiskUsage()
+    >>> report = usage.report()
+    >>> report['vms']['f4b0a749-820b-43c2-967e-a7a5f539cfd7']['allocated']
+    1481637888
+    >>> print(usage.report_json())
+
+python -m virtbox.diskusage prints the JSON report.
+
+The media are enumerated with a single streamed list hdds, then every
+image is stat'ed and its header read on a pool of threads. The results
+are kept keyed by device and inode and only trusted while the mtime and
+size are unchanged, on disk in cache_path between processes, so a repeat
+report re-reads only the images that changed.
+
+Sizes are in bytes: logical_size is the capacity the guest sees, size the
+length of the image (with the extents of a VMDK descriptor) and allocated
+the blocks it takes on the host filesystem. A medium's chain_* totals
+cover it and its ancestors, the images needed to read it, its tree_*
+totals it and its descendants, the images freed by deleting it. A vm
+counts every image in the chains of the media it uses, each once.
+
+:copyright: (c) 2012 by Sean Plaice.
+:license: ISC, see LICENSE for more details.
+
+"""
+
+import os
+import re
+import json
+import logging
+import tempfile
+import threading
+
+from .hdimage import read_image, MBYTE
+from .errors import ImageFormatError
+from .utils import fan_out
+from .constants import FANOUT_WORKERS, DISKUSAGE_CACHE
+
+
+# setup module level logger
+LOGGER = logging.getLogger(__name__)
+
+# "In use by VMs: name (UUID: ...) [snapshot (UUID: ...)], ..." entries,
+# the snapshots in brackets are skipped
+IN_USE_BY = re.compile(r'\s*([^,\[\]]+?) \(UUID: ([0-9a-fA-F-]+)\)'
+        r'(?: \[[^\]]*\])?')
+CAPACITY = re.compile(r'(\d+) MBytes')
+
+# bump when the cached entries change shape
+CACHE_VERSION = 2
+
+
+def _list_hdds():
+    """
+    """
+    from .manage import iter_hdds
+    return iter_hdds()
+
+
+def parse_in_use_by(value):
+    """
+    Return the (name, uuid) of every vm in an "In use by VMs" value.
+    """
+    return [(name, uuid) for name, uuid in IN_USE_BY.findall(value or '')]
+
+
+class DiskUsage(object):
+    """ Disk usage accounting over the registered hard disks.
+
+        listing is the function returning the list hdds records, by
+        default a streamed list hdds. workers is the number of threads
+        measuring images, cache_path the JSON file measurements are kept
+        in between processes, None keeps them in-process only.
+    """
+
+    def __init__(self, workers=FANOUT_WORKERS, cache_path=DISKUSAGE_CACHE,
+            listing=None):
+        self.workers = workers
+        self.cache_path = cache_path
+        self._listing = listing or _list_hdds
+        self._lock = threading.Lock()
+        # "dev:ino" -> {'location', 'mtime', 'size', 'image'} of the images
+        # of the last report
+        self._entries = self._load()
+        # measurements made and reused by the last report
+        self.stats = {'measured': 0, 'cached': 0}
+
+    def report(self):
+        """
+        Return a dict with the media, vms and directories usage and the
+        total, plus the errors met, keyed by image location.
+        """
+        records = list(self._listing())
+        self.stats = {'measured': 0, 'cached': 0}
+        measured = dict(fan_out(self._measure,
+                set(record['location'] for record in records), 'location',
+                workers=self.workers))
+        # forget deleted and unregistered images, and inodes reused since
+        seen = set(_key(result[0]) for result in measured.values()
+                if not isinstance(result, Exception))
+        with self._lock:
+            self._entries = dict((key, entry) for key, entry in
+                    self._entries.items() if key in seen)
+        self._store()
+
+        media = {}
+        errors = {}
+        vms = {}
+        for record in records:
+            medium = self._medium(record, measured[record['location']])
+            if 'error' in medium:
+                errors[medium['location']] = medium.pop('error')
+            media[medium['uuid']] = medium
+            for name, uuid in parse_in_use_by(record.get('in_use_by_vms')):
+                vm = vms.setdefault(uuid, {'name': name, 'media': set()})
+                vm['media'].add(medium['uuid'])
+
+        self._chains(media)
+        for vm in vms.values():
+            chains = set()
+            for uuid in vm['media']:
+                chains.update(self._ancestors(media, uuid))
+            totals = _totals(media[uuid] for uuid in chains)
+            vm.update(media=sorted(chains), size=totals['size'],
+                    allocated=totals['allocated'])
+
+        directories = {}
+        for medium in media.values():
+            directory = os.path.dirname(medium['location'])
+            directories.setdefault(directory, []).append(medium)
+        directories = dict((directory, _totals(members))
+                for directory, members in directories.items())
+
+        return {
+            'media': media,
+            'vms': vms,
+            'directories': directories,
+            'total': _totals(media.values()),
+            'errors': errors,
+        }
+
+    def report_json(self, indent=2):
+        """
+        Return report() as JSON.
+        """
+        return json.dumps(self.report(), indent=indent, sort_keys=True)
+
+    def clear(self):
+        """
+        Forget every measurement, in memory and in cache_path.
+        """
+        with self._lock:
+            self._entries = {}
+        if self.cache_path is not None:
+            try:
+                os.remove(self.cache_path)
+            except OSError:
+                pass
+
+    def _measure(self, location):
+        """
+        Return the stat of the image at location and its read_image
+        details, None if it is not an image hdimage understands. Raises
+        OSError if it can not be stat'ed.
+        """
+        stat = os.stat(location)
+        key = _key(stat)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry['location'] == location and \
+                entry['mtime'] == stat.st_mtime_ns and \
+                entry['size'] == stat.st_size:
+            with self._lock:
+                self.stats['cached'] += 1
+            return stat, entry['image']
+
+        try:
+            image = read_image(location)
+        except ImageFormatError as exc:
+            LOGGER.debug('sizing %s from its stat: %s' % (location, exc))
+            image = None
+        with self._lock:
+            self._entries[key] = {'location': location,
+                    'mtime': stat.st_mtime_ns, 'size': stat.st_size,
+                    'image': image}
+            self.stats['measured'] += 1
+        return stat, image
+
+    def _medium(self, record, measured):
+        """
+        Return the usage of the medium of a list hdds record.
+        """
+        parent_uuid = record.get('parent_uuid')
+        if parent_uuid == 'base':
+            parent_uuid = None
+        medium = {
+            'uuid': record['uuid'],
+            'parent_uuid': parent_uuid,
+            'location': record['location'],
+            'storage_format': record.get('storage_format'),
+            'logical_size': _capacity(record.get('capacity')),
+            'size': 0,
+            'allocated': 0,
+            'vms': sorted(uuid for _, uuid in
+                parse_in_use_by(record.get('in_use_by_vms'))),
+        }
+        if isinstance(measured, Exception):
+            medium['error'] = str(measured)
+            return medium
+
+        stat, image = measured
+        medium['size'] = stat.st_size
+        # st_blocks is in 512 byte units whatever the filesystem block size
+        medium['allocated'] = stat.st_blocks * 512
+        if image is not None:
+            medium['logical_size'] = image['logical_size']
+            # with the extents of a VMDK descriptor
+            medium['allocated'] += image['current_size'] - stat.st_size
+            medium['size'] = image['current_size']
+        return medium
+
+    def _ancestors(self, media, uuid):
+        """
+        Return uuid and the uuids of its registered ancestors.
+        """
+        chain = []
+        while uuid in media and uuid not in chain:
+            chain.append(uuid)
+            uuid = media[uuid]['parent_uuid']
+        return chain
+
+    def _chains(self, media):
+        """
+        Add the chain and tree totals to every medium.
+        """
+        children = {}
+        for medium in media.values():
+            children.setdefault(medium['parent_uuid'], []).append(
+                    medium['uuid'])
+
+        for uuid, medium in media.items():
+            chain = _totals(media[ancestor]
+                    for ancestor in self._ancestors(media, uuid))
+            medium['chain_size'] = chain['size']
+            medium['chain_allocated'] = chain['allocated']
+
+            tree = []
+            pending = [uuid]
+            while pending:
+                current = pending.pop()
+                if current in tree:
+                    continue
+                tree.append(current)
+                pending.extend(children.get(current, ()))
+            tree = _totals(media[descendant] for descendant in tree)
+            medium['tree_size'] = tree['size']
+            medium['tree_allocated'] = tree['allocated']
+
+    def _load(self):
+        """
+        """
+        if self.cache_path is None:
+            return {}
+        try:
+            with open(self.cache_path) as fn:
+                data = json.load(fn)
+        except (IOError, OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or \
+                data.get('version') != CACHE_VERSION:
+            return {}
+        return data.get('entries', {})
+
+    def _store(self):
+        """
+        Atomically replace cache_path. Failing to write only costs reading
+        the headers again.
+        """
+        if self.cache_path is None:
+            return
+        directory = os.path.dirname(self.cache_path) or '.'
+        with self._lock:
+            data = {'version': CACHE_VERSION, 'entries': self._entries}
+            try:
+                if not os.path.isdir(directory):
+                    os.makedirs(directory)
+                fd, tmp_path = tempfile.mkstemp(dir=directory,
+                        suffix='.tmp')
+                with os.fdopen(fd, 'w') as fn:
+                    json.dump(data, fn)
+                os.replace(tmp_path, self.cache_path)
+            except (IOError, OSError) as exc:
+                LOGGER.warning('could not write %s: %s' %
+                        (self.cache_path, exc))
+
+
+def _key(stat):
+    """
+    Return the cache key of the file stat describes.
+    """
+    return '%d:%d' % (stat.st_dev, stat.st_ino)
+
+
+def _capacity(value):
+    """
+    Return a "8192 MBytes" capacity in bytes, or None.
+    """
+    match = CAPACITY.match(value or '')
+    return int(match.group(1)) * MBYTE if match else None
+
+
+def _totals(media):
+    """
+    """
+    totals = {'media': 0, 'size': 0, 'allocated': 0}
+    for medium in media:
+        totals['media'] += 1
+        totals['size'] += medium['size']
+        totals['allocated'] += medium['allocated']
+    return totals
+
+
+def main():
+    """
+    Print the disk usage report of the registered hard disks as JSON.
+    """
+    print(DiskUsage().report_json())
+
+
+if __name__ == '__main__':
+    main()
@@ -8,33 +8,113 @@ This module contains the set of bootstrap's exceptions
 
 """
 
+import re
 import logging
 
+from .constants import (
+        ERROR_CLASSES,
+        ERROR_PERMANENT,
+        ERROR_TRANSIENT,
+        ERROR_UNKNOWN,
+        )
+
 
 # setup module level logger
 LOGGER = logging.getLogger(__name__)
 
+# status code run_cmd reports when VBoxManage could not be spawned
+STATUS_NOT_FOUND = 127
+
+_ERROR_CLASSES = [(code, category, re.compile(pattern))
+        for code, category, pattern in ERROR_CLASSES]
+_RESULT_CODE = re.compile(r'[Cc]ode (\w+) \((0x[0-9a-fA-F]+)\)')
+
+
+def classify_error(status_code, stderr):
+    """
+    Return (error_code, category, result_code) for a failed command.
+
+    error_code and category come from the first of
+    virtbox.constants.ERROR_CLASSES matching stderr; result_code is the
+    COM/XPCOM status name VBoxManage reports in its "Details: code ..."
+    line, if any.
+    """
+    stderr = stderr or ''
+    match = _RESULT_CODE.search(stderr)
+    result_code = match.group(1) if match else None
+
+    if status_code == STATUS_NOT_FOUND and not stderr.startswith('VBox'):
+        return ('command_not_found', ERROR_PERMANENT, result_code)
+
+    for code, category, pattern in _ERROR_CLASSES:
+        if pattern.search(stderr):
+            return (code, category, result_code)
+
+    return (ERROR_UNKNOWN, ERROR_UNKNOWN, result_code)
+
 
 class CommandError(Exception):
     """ This is an error specific to running a VBoxManage command.
+
+        error_code and category classify stderr, see classify_error.
     """
     def __init__(self, status_code=None, cmd=None, stdout=None, stderr=None):
         self.status_code = status_code
         self.cmd = cmd
         self.stdout = stdout
         self.stderr = stderr
+        (self.error_code, self.category,
+                self.result_code) = classify_error(status_code, stderr)
+
+    @property
+    def transient(self):
+        """
+        True if the error is expected to clear up when retried.
+        """
+        return self.category == ERROR_TRANSIENT
 
     def as_dict(self):
         """
         returns error information as a dict
         """
         return {'status_code': self.status_code, 'cmd': self.cmd, 'stdout':
-                self.stdout, 'stderr': self.stderr}
+                self.stdout, 'stderr': self.stderr,
+                'error_code': self.error_code, 'category': self.category,
+                'result_code': self.result_code}
 
     def __str__(self):
         return '%s' % str(self.as_dict())
 
 
+class CommandTimeout(CommandError):
+    """ This is an error raised when a VBoxManage command did not finish
+        within its timeout or deadline and its process group was killed.
+    """
+    def __init__(self, timeout=None, cmd=None, stdout=None, stderr=None):
+        CommandError.__init__(self, cmd=cmd, stdout=stdout, stderr=stderr)
+        self.timeout = timeout
+        self.error_code = 'timeout'
+        self.category = ERROR_UNKNOWN
+
+    def as_dict(self):
+        """
+        returns error information as a dict
+        """
+        data = CommandError.as_dict(self)
+        data['timeout'] = self.timeout
+        return data
+
+
+class CommandCancelled(CommandError):
+    """ This is an error raised when a running VBoxManage command was
+        cancelled and its process group was killed.
+    """
+    def __init__(self, cmd=None, stdout=None, stderr=None):
+        CommandError.__init__(self, cmd=cmd, stdout=stdout, stderr=stderr)
+        self.error_code = 'cancelled'
+        self.category = ERROR_UNKNOWN
+
+
 class VirtboxError(Exception):
     """ This is an ambiguous error that occured.
     """
@@ -50,7 +130,7 @@ class VirtboxManageError(VirtboxError):
     """ This is an error specific to the use of the Manage class.
     """
     def __init__(self, reason=None):
-        VirtboxError.__init__()
+        VirtboxError.__init__(self, reason)
         self.reason = reason
 
     def as_dict(self):
@@ -69,7 +149,7 @@ class VirtboxCommandNotImplemented(VirtboxError):
     """
 
     def __init__(self, reason=None):
-        VirtboxError.__init__()
+        VirtboxError.__init__(self, reason)
         self.reason = reason
 
     def as_dict(self):
@@ -80,3 +160,61 @@ class VirtboxCommandNotImplemented(VirtboxError):
 
     def __str__(self):
         return '%s' % str(self.as_dict())
+
+
+class SettingsUnavailable(VirtboxError):
+    """ This is an error raised when a query can not be answered from the
+        VirtualBox settings files, e.g. because one is missing or being
+        written, and VBoxManage has to be asked instead.
+    """
+    def __init__(self, reason=None, path=None):
+        VirtboxError.__init__(self, reason)
+        self.reason = reason
+        self.path = path
+
+    def as_dict(self):
+        """
+        returns error information as a dict
+        """
+        return {'reason': self.reason, 'path': self.path}
+
+    def __str__(self):
+        return '%s' % str(self.as_dict())
+
+
+class ImageFormatError(VirtboxError):
+    """ This is an error raised when a disk image header can not be read
+        because the file is not an image of a known format.
+    """
+    def __init__(self, reason=None, path=None):
+        VirtboxError.__init__(self, reason)
+        self.reason = reason
+        self.path = path
+
+    def as_dict(self):
+        """
+        returns error information as a dict
+        """
+        return {'reason': self.reason, 'path': self.path}
+
+    def __str__(self):
+        return '%s' % str(self.as_dict())
+
+
+class CassetteError(VirtboxError):
+    """ This is an error raised when a cassette file can not be read, or a
+        command being replayed was never recorded.
+    """
+    def __init__(self, reason=None, path=None):
+        VirtboxError.__init__(self, reason)
+        self.reason = reason
+        self.path = path
+
+    def as_dict(self):
+        """
+        returns error information as a dict
+        """
+        return {'reason': self.reason, 'path': self.path}
+
+    def __str__(self):
+        return '%s' % str(self.as_dict())
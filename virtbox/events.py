@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+"""
+virtbox.events
+~~~~~~~~
+
+This module lets callers observe the changes virtbox.manage makes. Commands
+that create, rename, remove or change the state of a vm call emit() once
+VBoxManage succeeded, and every subscribed handler is called with the
+command name, its parsed result and the keyword arguments it was called
+with:
+
+    >>> def handler(command, result, kwargs):
+    ...     print(command, kwargs)
+    >>> subscribe(handler)
+    >>> virtbox.manage.startvm(vm_name='jangofett')
+    startvm {'vm_uuid': None, 'vm_name': 'jangofett', 'start_type': None}
+
+virtbox.watch emits settings_changed when a settings file changes on disk,
+with the vm's uuid and the file's path.
+
+:copyright: (c) 2012 by Sean Plaice.
+:license: ISC, see LICENSE for more details.
+
+"""
+
+import logging
+import threading
+
+
+# setup module level logger
+LOGGER = logging.getLogger(__name__)
+
+# replaced rather than mutated so emit can iterate it without the lock
+_handlers = ()
+_lock = threading.Lock()
+
+
+def subscribe(handler):
+    """
+    Call handler(command, result, kwargs) after every emitted command.
+    """
+    global _handlers
+    with _lock:
+        _handlers = _handlers + (handler,)
+
+
+def unsubscribe(handler):
+    """
+    Stop calling handler, a handler that is not subscribed is ignored.
+    """
+    global _handlers
+    with _lock:
+        # bound methods are recreated on every access, compare by equality
+        _handlers = tuple(h for h in _handlers if h != handler)
+
+
+def emit(command, result, **kwargs):
+    """
+    Tell subscribers command succeeded. A failing handler is logged and
+    does not fail the command, which already took effect.
+    """
+    for handler in _handlers:
+        try:
+            handler(command, result, kwargs)
+        except Exception:
+            LOGGER.exception('event handler %r failed on %s' % (handler,
+                command))
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+"""
+virtbox.executor
+~~~~~~~~
+
+This module provides the process executor used to run VBoxManage. Commands
+are handed over as a prebuilt argv list and spawned directly, without a
+shell or any re-tokenization, and their output is collected with a single
+select loop.
+
+:copyright: (c) 2012 by Sean Plaice.
+:license: ISC, see LICENSE for more details.
+
+"""
+
+import os
+import time
+import signal
+import logging
+import selectors
+import subprocess
+
+
+# setup module level logger
+LOGGER = logging.getLogger(__name__)
+
+# bytes requested per read(2) on the child's pipes
+CHUNK_SIZE = 65536
+
+# seconds between checks of a cancel event while waiting on the child
+CANCEL_POLL_INTERVAL = 0.1
+
+
+class Cancelled(Exception):
+    """ Raised by execute when its cancel event was set.
+    """
+    def __init__(self, argv, output=b'', stderr=b''):
+        Exception.__init__(self, argv)
+        self.argv = argv
+        self.output = output
+        self.stderr = stderr
+
+
+def execute(argv, env=None, cwd=None, timeout=None, cancel=None):
+    """
+    Spawn argv without a shell and wait for it to exit.
+
+    Returns a (status_code, stdout, stderr) tuple with both streams decoded
+    as utf-8. Raises OSError if the executable can not be spawned.
+
+    The child runs in its own process group. If it is still running after
+    timeout seconds, or once the threading.Event cancel is set, the whole
+    group is killed and subprocess.TimeoutExpired or Cancelled is raised
+    with the output collected so far.
+    """
+    expires = time.monotonic() + timeout if timeout is not None else None
+    proc = _spawn(argv, env, cwd)
+    out_fd = proc.stdout.fileno()
+    stdout, stderr = [], []
+    try:
+        for fd, data in _read(proc, argv, timeout, expires, cancel):
+            (stdout if fd == out_fd else stderr).append(data)
+        proc.wait(timeout=_remaining(expires))
+    except (subprocess.TimeoutExpired, Cancelled) as exc:
+        kill(proc)
+        exc.output, exc.stderr = b''.join(stdout), b''.join(stderr)
+        raise
+    except BaseException:
+        kill(proc)
+        raise
+    finally:
+        _reap(proc)
+
+    return (proc.returncode, _decode(b''.join(stdout)),
+            _decode(b''.join(stderr)))
+
+
+def stream(argv, env=None, cwd=None, timeout=None, cancel=None):
+    """
+    Spawn argv like execute but yield its stdout line by line, without line
+    endings, as soon as each line is complete. stderr is collected on the
+    side so the child never blocks on it.
+
+    The generator returns (status_code, stderr) once stdout is exhausted;
+    closing it early kills the child's process group.
+    """
+    expires = time.monotonic() + timeout if timeout is not None else None
+    proc = _spawn(argv, env, cwd)
+    out_fd = proc.stdout.fileno()
+    pending = b''
+    stderr = []
+    try:
+        for fd, data in _read(proc, argv, timeout, expires, cancel):
+            if fd != out_fd:
+                stderr.append(data)
+                continue
+            lines = (pending + data).split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                yield _decode(line)
+        if pending:
+            yield _decode(pending)
+        proc.wait(timeout=_remaining(expires))
+    except BaseException:
+        kill(proc)
+        raise
+    finally:
+        _reap(proc)
+
+    return (proc.returncode, _decode(b''.join(stderr)))
+
+
+def kill(proc):
+    """
+    SIGKILL the process group proc leads.
+    """
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _spawn(argv, env, cwd):
+    """
+    """
+    return subprocess.Popen(argv, stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=True,
+            env=env, cwd=cwd, start_new_session=True)
+
+
+def _reap(proc):
+    """
+    """
+    proc.stdout.close()
+    proc.stderr.close()
+    proc.wait()
+
+
+def _remaining(expires):
+    """
+    """
+    if expires is None:
+        return None
+    return max(expires - time.monotonic(), 0)
+
+
+def _read(proc, argv, timeout, expires, cancel):
+    """
+    Yield (fd, data) chunks from stdout and stderr of proc until both reach
+    EOF.
+    """
+    with selectors.DefaultSelector() as selector:
+        selector.register(proc.stdout.fileno(), selectors.EVENT_READ)
+        selector.register(proc.stderr.fileno(), selectors.EVENT_READ)
+
+        while selector.get_map():
+            wait = _remaining(expires)
+            if wait == 0:
+                raise subprocess.TimeoutExpired(argv, timeout)
+            if cancel is not None:
+                if cancel.is_set():
+                    raise Cancelled(argv)
+                wait = min(wait, CANCEL_POLL_INTERVAL) if wait is not None \
+                        else CANCEL_POLL_INTERVAL
+
+            for key, _ in selector.select(wait):
+                data = os.read(key.fd, CHUNK_SIZE)
+                if data:
+                    yield (key.fd, data)
+                else:
+                    selector.unregister(key.fd)
+
+
+def _decode(data):
+    """
+    """
+    return data.decode('utf-8', 'replace')
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+
+"""
+virtbox.hdimage
+~~~~~~~~
+
+This module reads disk image headers directly, as a showhdinfo that does
+not spawn VBoxManage. VDI, VMDK (descriptor files and sparse extents with
+an embedded descriptor), VHD and RAW images are understood:
+
+    >>> read_header('/tmp/jangofett.vdi')['logical_size']
+    '128 MBytes'
+
+Only the header bytes are read, with a single pread, plus an fstat for the
+size on disk, so scanning many thousands of images takes a fraction of a
+second. Results have the keys of parse_showhdinfo plus parent_uuid. Image
+files do not record the medium type VirtualBox keeps in its registry, so
+type is always normal, see virtbox.settings.showhdinfo for the
+registry-aware version.
+
+:copyright: (c) 2012 by Sean Plaice.
+:license: ISC, see LICENSE for more details.
+
+"""
+
+import os
+import re
+import struct
+import logging
+
+from .errors import ImageFormatError
+
+
+# setup module level logger
+LOGGER = logging.getLogger(__name__)
+
+# bytes read from the start of every image, enough for the VDI, VMDK and
+# VHD headers
+HEADER_SIZE = 512
+
+MBYTE = 1024 * 1024
+SECTOR_SIZE = 512
+NULL_UUID = '00000000-0000-0000-0000-000000000000'
+
+# VDI: signature and the header fields used, at their absolute offsets
+VDI_SIGNATURE = struct.pack('<I', 0xbeda107f)
+VDI_SIGNATURE_OFFSET = 0x40
+VDI_TYPE_OFFSET = 0x4c
+VDI_DISK_SIZE_OFFSET = 0x170
+VDI_UUID_OFFSET = 0x188
+VDI_PARENT_UUID_OFFSET = 0x1a8
+VDI_TYPE_FIXED = 2
+
+# VMDK: sparse extent header magic, "KDMV", and its capacity and embedded
+# descriptor fields, all in sectors
+VMDK_MAGIC = b'KDMV'
+VMDK_SPARSE_HEADER = struct.Struct('<4sIIQQQQ')
+VMDK_DESCRIPTOR_MAGIC = b'# Disk DescriptorFile'
+VMDK_DESCRIPTOR_FIELD = re.compile(r'^\s*([\w.]+)\s*=\s*"?([^"\r\n]*)"?',
+        re.M)
+VMDK_EXTENT = re.compile(r'^\s*(?:RW|RDONLY|NOACCESS)\s+(\d+)\s+(\w+)'
+        r'(?:\s+"([^"]*)")?', re.M)
+# createType -> format variant as showhdinfo prints it
+VMDK_VARIANTS = {
+    'monolithicSparse': 'dynamic default',
+    'monolithicFlat': 'fixed default',
+    'twoGbMaxExtentSparse': 'dynamic split2G',
+    'twoGbMaxExtentFlat': 'fixed split2G',
+    'streamOptimized': 'dynamic streamOptimized',
+    'vmfs': 'fixed esx',
+}
+
+# VHD: footer, a copy of which dynamic disks also keep at offset 0, and
+# the dynamic disk header holding the parent uuid
+VHD_COOKIE = b'conectix'
+VHD_FOOTER = struct.Struct('>8sIIQI4sI4sQQIII16s')
+VHD_DYNAMIC_COOKIE = b'cxsparse'
+VHD_PARENT_UUID_OFFSET = 40
+VHD_TYPE_FIXED = 2
+VHD_TYPE_DIFF = 4
+
+# extensions of images without a header, as the RAW backend accepts them
+RAW_EXTENSIONS = ('.img', '.raw', '.bin', '.iso')
+
+
+def read_header(path):
+    """
+    Return the showhdinfo details of the image at path from its header.
+    Raises ImageFormatError if path is not an image of a known format and
+    OSError if it can not be read.
+    """
+    info = read_image(path)
+    parent_uuid = info['parent_uuid']
+    info.update({
+        'accessible': 'yes',
+        'parent_uuid': parent_uuid or 'base',
+        'logical_size': '%d MBytes' % (info['logical_size'] // MBYTE),
+        'current_size': '%d MBytes' % (info['current_size'] // MBYTE),
+        'type': 'normal (%s)' % ('differencing' if parent_uuid else 'base'),
+        'location': os.path.abspath(path),
+    })
+    return info
+
+
+def read_image(path):
+    """
+    Return the uuid, parent_uuid (None for a base image), storage_format,
+    format_variant and the logical_size and current_size in bytes of the
+    image at path, the latter including the extents of a VMDK descriptor.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        header = os.pread(fd, HEADER_SIZE, 0)
+
+        if header[VDI_SIGNATURE_OFFSET:VDI_SIGNATURE_OFFSET + 4] == \
+                VDI_SIGNATURE:
+            info = _read_vdi(header)
+        elif header[:4] == VMDK_MAGIC:
+            info = _read_vmdk_sparse(fd, header, path)
+        elif header.startswith(VMDK_DESCRIPTOR_MAGIC):
+            info = _read_vmdk_descriptor(fd, path, size)
+        elif header[:8] == VHD_COOKIE:
+            info = _read_vhd(fd, header)
+        elif size >= HEADER_SIZE and os.pread(fd, 8,
+                size - HEADER_SIZE) == VHD_COOKIE:
+            # fixed disks only have the footer
+            info = _read_vhd(fd, os.pread(fd, HEADER_SIZE,
+                size - HEADER_SIZE))
+        elif path.lower().endswith(RAW_EXTENSIONS):
+            info = {'uuid': None, 'parent_uuid': None, 'logical_size': size,
+                    'storage_format': 'RAW', 'format_variant': 'fixed default'}
+        else:
+            raise ImageFormatError(reason='unknown image format', path=path)
+    finally:
+        os.close(fd)
+
+    info.setdefault('current_size', size)
+    if info['parent_uuid'] == NULL_UUID:
+        info['parent_uuid'] = None
+    return info
+
+
+def iter_headers(paths):
+    """
+    Yield (path, details) for every image in paths, in order. An image
+    that can not be read yields its ImageFormatError or OSError in place
+    of details.
+    """
+    for path in paths:
+        try:
+            yield path, read_header(path)
+        except (ImageFormatError, OSError) as exc:
+            yield path, exc
+
+
+def _uuid(data):
+    """
+    Format 16 bytes of a uuid stored the way VirtualBox stores them,
+    the first three fields little endian.
+    """
+    first, second, third = struct.unpack_from('<IHH', data)
+    rest = data[8:16].hex()
+    return '%08x-%04x-%04x-%s-%s' % (first, second, third, rest[:4],
+            rest[4:])
+
+
+def _read_vdi(header):
+    """
+    """
+    image_type, = struct.unpack_from('<I', header, VDI_TYPE_OFFSET)
+    disk_size, = struct.unpack_from('<Q', header, VDI_DISK_SIZE_OFFSET)
+    return {
+        'uuid': _uuid(header[VDI_UUID_OFFSET:VDI_UUID_OFFSET + 16]),
+        'parent_uuid': _uuid(header[VDI_PARENT_UUID_OFFSET:
+            VDI_PARENT_UUID_OFFSET + 16]),
+        'logical_size': disk_size,
+        'storage_format': 'VDI',
+        'format_variant': ('fixed default' if image_type == VDI_TYPE_FIXED
+                           else 'dynamic default'),
+    }
+
+
+def _read_vmdk_sparse(fd, header, path):
+    """
+    """
+    (_, _, _, capacity, _, descriptor_offset,
+            descriptor_size) = VMDK_SPARSE_HEADER.unpack_from(header)
+    if not descriptor_offset:
+        # an extent of a split image, its descriptor file is the medium
+        raise ImageFormatError(reason='vmdk extent without descriptor',
+                path=path)
+    descriptor = os.pread(fd, descriptor_size * SECTOR_SIZE,
+            descriptor_offset * SECTOR_SIZE)
+    info = _parse_vmdk_descriptor(descriptor, path)
+    del info['extents']
+    info['logical_size'] = capacity * SECTOR_SIZE
+    return info
+
+
+def _read_vmdk_descriptor(fd, path, size):
+    """
+    """
+    info = _parse_vmdk_descriptor(os.pread(fd, size, 0), path)
+    # the medium's data lives in the extent files next to the descriptor
+    current_size = size
+    directory = os.path.dirname(path)
+    for extent in info.pop('extents'):
+        try:
+            current_size += os.stat(os.path.join(directory,
+                extent)).st_size
+        except OSError:
+            LOGGER.debug('missing extent %s of %s' % (extent, path))
+    info['current_size'] = current_size
+    return info
+
+
+def _parse_vmdk_descriptor(data, path):
+    """
+    """
+    text = data.split(b'\0', 1)[0].decode('utf-8', 'replace')
+    fields = dict(VMDK_DESCRIPTOR_FIELD.findall(text))
+    extents = VMDK_EXTENT.findall(text)
+    create_type = fields.get('createType')
+    if create_type is None:
+        raise ImageFormatError(reason='vmdk descriptor without createType',
+                path=path)
+    return {
+        'uuid': fields.get('ddb.uuid.image'),
+        'parent_uuid': fields.get('ddb.uuid.parent'),
+        'logical_size': (sum(int(sectors) for sectors, _, _ in extents) *
+                         SECTOR_SIZE),
+        'storage_format': 'VMDK',
+        'format_variant': VMDK_VARIANTS.get(create_type, create_type),
+        'extents': [name for _, kind, name in extents
+            if name and kind != 'ZERO'],
+    }
+
+
+def _read_vhd(fd, footer):
+    """
+    """
+    fields = VHD_FOOTER.unpack_from(footer)
+    data_offset, current_size, disk_type, unique_id = (fields[3], fields[9],
+            fields[11], fields[13])
+    parent_uuid = None
+    if disk_type == VHD_TYPE_DIFF:
+        dynamic = os.pread(fd, 64, data_offset)
+        if dynamic[:8] == VHD_DYNAMIC_COOKIE:
+            parent_uuid = _uuid(dynamic[VHD_PARENT_UUID_OFFSET:
+                VHD_PARENT_UUID_OFFSET + 16])
+    return {
+        'uuid': _uuid(unique_id),
+        'parent_uuid': parent_uuid,
+        'logical_size': current_size,
+        'storage_format': 'VHD',
+        'format_variant': ('fixed default' if disk_type == VHD_TYPE_FIXED
+                           else 'dynamic default'),
+    }
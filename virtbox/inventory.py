@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+
+"""
+virtbox.inventory
+~~~~~~~~
+
+This module provides an in-memory index of the registered vms, so
+questions like "does this vm exist, what is its uuid, is it running" do
+not each cost a VBoxManage process:
+
+    >>> inventory = Inventory()
+    >>> inventory.uuid('jangofett')
+    'f4b0a749-820b-43c2-967e-a7a5f539cfd7'
+    >>> inventory.is_running(name='jangofett')
+    False
+
+The index is filled by a single list -l vms call and kept current by the
+changes virtbox.manage reports through virtbox.events: createvm, modifyvm
+renames, unregistervm, startvm and controlvm update it as they succeed.
+Changes made outside virtbox are picked up by listing again once ttl
+seconds have passed, lookups in between never spawn a process. With a
+virtbox.watch.Watcher running, a changed .vbox file makes the next lookup
+re-read that vm alone, and a changed VirtualBox.xml lists all vms again.
+
+Records are virtbox.models.VMInfo objects as of the last listing, with the
+name and vmstate written through. Other settings changed through modifyvm
+show up after the next listing.
+
+:copyright: (c) 2012 by Sean Plaice.
+:license: ISC, see LICENSE for more details.
+
+"""
+
+import time
+import logging
+import threading
+
+from . import events
+from .models import VMInfo
+from .errors import CommandError
+from .constants import INVENTORY_TTL
+
+
+# setup module level logger
+LOGGER = logging.getLogger(__name__)
+
+# controlvm actions whose resulting vm state is known once VBoxManage
+# returns; other actions, e.g. acpipowerbutton, take effect later
+CONTROLVM_STATES = {
+    'pause': 'paused',
+    'resume': 'running',
+    'reset': 'running',
+    'poweroff': 'poweroff',
+    'savestate': 'saved',
+}
+
+
+def _list_vms():
+    """
+    """
+    from .manage import list_vms
+    return list_vms(long=True)
+
+
+def _showvminfo(uuid):
+    """
+    Read the vm through VBoxManage even with the settings read backend,
+    the settings files do not record whether a vm is running.
+    """
+    from .commands import showvminfo
+    from .parsers import parse_showvminfo
+    from .utils import run_cmd
+    return parse_showvminfo(*run_cmd(showvminfo(uuid=uuid)))
+
+
+class Inventory(object):
+    """ Name and uuid index of the registered vms.
+
+        listing is the function returning the VMInfo records of all vms,
+        list_vms(long=True) by default, and reader the one returning the
+        record of a single vm by uuid, showvminfo run through VBoxManage
+        by default. Call close() to stop following virtbox.manage.
+    """
+
+    def __init__(self, ttl=INVENTORY_TTL, listing=None, reader=None):
+        self.ttl = ttl
+        self._listing = listing or _list_vms
+        self._reader = reader or _showvminfo
+        self._lock = threading.RLock()
+        self._by_uuid = {}
+        self._by_name = {}
+        # uuids whose settings changed since they were read
+        self._stale = set()
+        # time.monotonic() of the last listing, None before the first
+        self._listed = None
+        events.subscribe(self._on_event)
+
+    def close(self):
+        """
+        Stop following changes made through virtbox.manage.
+        """
+        events.unsubscribe(self._on_event)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def refresh(self):
+        """
+        Rebuild the index from a fresh listing.
+        """
+        with self._lock:
+            records = self._listing()
+            self._by_uuid = {}
+            self._by_name = {}
+            self._stale = set()
+            for record in records:
+                self._add(record)
+            self._listed = time.monotonic()
+
+    def invalidate(self):
+        """
+        Make the next lookup list the vms again.
+        """
+        with self._lock:
+            self._listed = None
+
+    def get(self, name=None, uuid=None):
+        """
+        Return the record of the vm with uuid, or else name, or None if no
+        such vm is registered.
+        """
+        with self._lock:
+            self._ensure_fresh()
+            if uuid is None:
+                uuid = self._by_name.get(name)
+            return self._by_uuid.get(uuid)
+
+    def uuid(self, name):
+        """
+        Return the uuid of the vm called name, or None. With several vms
+        of that name, the last one listed or created wins.
+        """
+        with self._lock:
+            self._ensure_fresh()
+            return self._by_name.get(name)
+
+    def exists(self, name=None, uuid=None):
+        """
+        """
+        return self.get(name=name, uuid=uuid) is not None
+
+    def is_running(self, name=None, uuid=None):
+        """
+        """
+        record = self.get(name=name, uuid=uuid)
+        return record is not None and record.get('vmstate') == 'running'
+
+    def records(self):
+        """
+        Return a list of the records of all registered vms.
+        """
+        with self._lock:
+            self._ensure_fresh()
+            return list(self._by_uuid.values())
+
+    def __len__(self):
+        return len(self.records())
+
+    def _ensure_fresh(self):
+        """
+        Must be called holding self._lock.
+        """
+        if self._listed is None or \
+                time.monotonic() - self._listed >= self.ttl:
+            self.refresh()
+        while self._stale:
+            uuid = self._stale.pop()
+            self._remove(uuid)
+            try:
+                self._add(self._reader(uuid))
+            except CommandError as exc:
+                LOGGER.debug('dropping %s: %s' % (uuid, exc))
+
+    def _add(self, record):
+        """
+        """
+        self._by_uuid[record['uuid']] = record
+        self._by_name[record['name']] = record['uuid']
+
+    def _remove(self, uuid):
+        """
+        """
+        record = self._by_uuid.pop(uuid, None)
+        if record is not None and self._by_name.get(record['name']) == uuid:
+            del self._by_name[record['name']]
+
+    def _update(self, uuid, **values):
+        """
+        Replace the record of uuid with one holding values, given as raw
+        showvminfo keys.
+        """
+        record = self._by_uuid.get(uuid)
+        if record is None:
+            return
+        raw = dict(record.items())
+        raw.update((key.lower(), value) for key, value in values.items())
+        self._remove(uuid)
+        self._add(VMInfo(raw))
+
+    def _target(self, kwargs, uuid_arg, name_arg):
+        """
+        Return the uuid of the vm a manage call targets, or None.
+        """
+        uuid = kwargs.get(uuid_arg)
+        if uuid:
+            return uuid if uuid in self._by_uuid else \
+                    self._by_name.get(uuid)
+        return self._by_name.get(kwargs.get(name_arg))
+
+    def _on_event(self, command, result, kwargs):
+        """
+        Write a change made through virtbox.manage through to the index.
+        """
+        with self._lock:
+            if self._listed is None:
+                # nothing to update, the first lookup lists everything
+                return
+
+            if command == 'settings_changed':
+                if kwargs['uuid'] is None:
+                    self._listed = None
+                elif kwargs['uuid'] in self._by_uuid:
+                    self._stale.add(kwargs['uuid'])
+            elif command == 'createvm':
+                self._add(VMInfo({'name': result['name'],
+                    'uuid': result['uuid'], 'cfgfile': result['file_path'],
+                    'vmstate': 'poweroff'}))
+            elif command == 'unregistervm':
+                uuid = self._target(kwargs, 'uuid', 'name')
+                if uuid is not None:
+                    self._remove(uuid)
+            elif command == 'modifyvm':
+                if kwargs.get('name'):
+                    self._update(self._target(kwargs, 'vm_uuid', 'vm_name'),
+                            name=kwargs['name'])
+            elif command == 'startvm':
+                self._update(result['uuid'], vmstate='running')
+            elif command == 'controlvm':
+                uuid = self._target(kwargs, 'vm_uuid', 'vm_name')
+                state = CONTROLVM_STATES.get(kwargs.get('action'))
+                if state is not None:
+                    self._update(uuid, vmstate=state)
+                elif uuid is not None:
+                    LOGGER.debug('state of %s unknown after controlvm %s' %
+                            (uuid, kwargs.get('action')))
+                    self._listed = None
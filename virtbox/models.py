@@ -5,3 +5,166 @@ This module contains the primary objects that power virtbox.
 :copyright: (c) 2012 by Sean Plaice
 :license: ISC, see LICENSE for more details.
 """
+
+import re
+from collections.abc import Mapping
+
+
+# showvminfo --machinereadable fields decoded as integers, the last three
+# are per storage controller
+VMINFO_INT_FIELDS = frozenset(('memory', 'vram', 'cpus', 'cpuexecutioncap',
+    'monitorcount', 'pagefusion', 'vrdeport', 'guestmemoryballoon',
+    'biossystemtimeoffset', 'videocapfps', 'videocaprate', 'instance',
+    'maxportcount', 'portcount'))
+
+# per adapter showvminfo fields, suffixed with the adapter number
+VMINFO_NIC_FIELDS = ('nic', 'nictype', 'nicspeed', 'macaddress',
+    'cableconnected', 'hostonlyadapter', 'bridgeadapter', 'intnet',
+    'natnet', 'nicgenericdrv', 'nictrace', 'nictracefile', 'nicpromisc',
+    'nicbootprio')
+
+# per controller showvminfo fields, suffixed with the controller index
+VMINFO_STORAGECTL_FIELDS = ('name', 'type', 'instance', 'maxportcount',
+    'portcount', 'bootable')
+
+# "<controller>-<port>-<device>" and "<controller>-ImageUUID-<p>-<d>" keys
+STORAGE_ATTACHMENT = re.compile(r'^(.*?)-(ImageUUID-)?(\d+)-(\d+)$')
+
+
+def decode_value(key, value):
+    """
+    Return the raw showvminfo value of key as an int, a bool for on/off
+    switches or the string itself.
+    """
+    if key in VMINFO_INT_FIELDS:
+        try:
+            return int(value)
+        except ValueError:
+            return value
+    if value == 'on':
+        return True
+    if value == 'off':
+        return False
+    return value
+
+
+class VMInfo(Mapping):
+    """ The details of a vm as reported by showvminfo --machinereadable.
+
+        Indexing returns the raw string values under lowercased keys, as
+        the plain dicts showvminfo used to return did:
+
+            >>> info['memory']
+            '128'
+
+        Attributes decode values on first access and cache them: ints for
+        sizes and counts, bools for on/off switches, and the nics and
+        storage groupings:
+
+            >>> info.memory, info.hwvirtex
+            (128, True)
+            >>> info.nics[0]['nic']
+            'nat'
+    """
+    __slots__ = ('_raw', '_lower', '_cache')
+
+    def __init__(self, raw):
+        # raw maps the keys as VBoxManage prints them to unquoted values
+        self._raw = raw
+        self._lower = None
+        self._cache = {}
+
+    def _lowered(self):
+        """
+        Return the raw values keyed by lowercased key, built on first use.
+        """
+        if self._lower is None:
+            self._lower = dict((key.lower(), value) for key, value in
+                    self._raw.items())
+        return self._lower
+
+    def __getitem__(self, key):
+        try:
+            return self._raw[key]
+        except KeyError:
+            return self._lowered()[key]
+
+    def __iter__(self):
+        return iter(self._lowered())
+
+    def __len__(self):
+        return len(self._lowered())
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        cache = self._cache
+        try:
+            return cache[name]
+        except KeyError:
+            pass
+
+        decoder = getattr(type(self), '_decode_%s' % name, None)
+        if decoder is not None:
+            value = decoder(self)
+        else:
+            try:
+                value = decode_value(name, self[name])
+            except KeyError:
+                raise AttributeError(name)
+        cache[name] = value
+        return value
+
+    def __repr__(self):
+        return '<VMInfo %s %s>' % (self.get('name'), self.get('uuid'))
+
+    def _decode_nics(self):
+        """
+        One dict per enabled network adapter, keyed by the adapter fields
+        without their number plus index.
+        """
+        lowered = self._lowered()
+        nics = []
+        index = 1
+        while 'nic%d' % index in lowered:
+            if lowered['nic%d' % index] != 'none':
+                nic = {'index': index}
+                for field in VMINFO_NIC_FIELDS:
+                    value = lowered.get('%s%d' % (field, index))
+                    if value is not None:
+                        nic[field] = decode_value(field, value)
+                nics.append(nic)
+            index += 1
+        return nics
+
+    def _decode_storage(self):
+        """
+        One dict per storage controller, with its attachments keyed by
+        (port, device) holding the attached medium and its uuid.
+        """
+        lowered = self._lowered()
+        controllers = []
+        by_name = {}
+        index = 0
+        while 'storagecontrollername%d' % index in lowered:
+            controller = {'attachments': {}}
+            for field in VMINFO_STORAGECTL_FIELDS:
+                value = lowered.get('storagecontroller%s%d' % (field, index))
+                if value is not None:
+                    controller[field] = decode_value(field, value)
+            # names are names, even one that reads on or off
+            controller['name'] = lowered['storagecontrollername%d' % index]
+            controllers.append(controller)
+            by_name[controller['name']] = controller
+            index += 1
+
+        for key, value in self._raw.items():
+            match = STORAGE_ATTACHMENT.match(key)
+            if match is None or match.group(1) not in by_name:
+                continue
+            name, image_uuid, port, device = match.groups()
+            attachments = by_name[name]['attachments']
+            attachment = attachments.setdefault((int(port), int(device)),
+                    {'medium': None, 'uuid': None})
+            attachment['uuid' if image_uuid else 'medium'] = value
+        return controllers
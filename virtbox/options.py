@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+
+"""
+virtbox.options
+~~~~~~~~
+
+This module provides the option specs that VBoxManage command lines are
+built from. Each spec maps a keyword argument to its command line flag and,
+where VBoxManage only accepts a fixed set of values, to the allowed values
+in virtbox.constants.
+
+:copyright: (c) 2012 by Sean Plaice.
+:license: ISC, see LICENSE for more details.
+
+"""
+
+import logging
+
+from .errors import VirtboxManageError
+from .constants import (
+        HD_FORMATS,
+        HD_VARIANTS,
+        STORAGECTL_TYPES,
+        STORAGECTL_CONTROLLERS,
+        STORAGE_TYPES,
+        STORAGE_MTYPES,
+        VM_FIRMWARE_OPTIONS,
+        VM_CHIPSET_OPTIONS,
+        VM_BIOSBOOTMENU_OPTIONS,
+        VM_BOOT_OPTIONS,
+        VM_NIC_OPTIONS,
+        VM_NICTYPE_OPTIONS,
+        VM_NICPROMISC_OPTIONS,
+        )
+
+
+# setup module level logger
+LOGGER = logging.getLogger(__name__)
+
+
+class Option(object):
+    """ A single command line option.
+
+        name is the keyword argument the option is set with, flag the
+        command line flag it is emitted as (defaults to --name). choices
+        restricts the accepted values, switch marks flags that take no
+        value, multi marks options whose value spans several arguments and
+        fmt is the format applied to the value.
+    """
+    __slots__ = ('name', 'flag', 'choices', 'switch', 'multi', 'fmt',
+            'plain')
+
+    def __init__(self, name, flag=None, choices=None, switch=False,
+            multi=False, fmt='%s'):
+        self.name = name
+        self.flag = flag or '--%s' % name
+        self.choices = choices
+        self.switch = switch
+        self.multi = multi
+        self.fmt = fmt
+        # plain options are a flag followed by one unchecked value
+        self.plain = choices is None and not switch and not multi
+
+    def extend(self, argv, value):
+        """
+        Append the arguments for value to argv.
+        """
+        if self.choices is not None and value not in self.choices:
+            raise VirtboxManageError(
+                    reason='unsupported %s provided' % self.name)
+
+        if self.switch:
+            argv.append(self.flag)
+        elif self.multi:
+            if isinstance(value, str):
+                value = value.split()
+            argv.append(self.flag)
+            argv.extend([self.fmt % v for v in value])
+        else:
+            argv.append(self.flag)
+            argv.append(self.fmt % value)
+
+    def __repr__(self):
+        return '<Option %s %s>' % (self.name, self.flag)
+
+
+class OptionSpec(object):
+    """ The set of options accepted by a VBoxManage command.
+    """
+
+    def __init__(self, *options):
+        self.options = {}
+        for option in options:
+            if option.name in self.options:
+                raise ValueError('duplicate option %s' % option.name)
+            self.options[option.name] = option
+
+    def __contains__(self, name):
+        return name in self.options
+
+    def __iter__(self):
+        return iter(self.options.values())
+
+    def __len__(self):
+        return len(self.options)
+
+    def build(self, argv, values):
+        """
+        Extend argv with the flags for every set value in values, in a
+        single pass over values. Unset (falsy) values are skipped and
+        unknown names raise VirtboxManageError.
+        """
+        options = self.options
+        append = argv.append
+        for name, value in values.items():
+            if not value:
+                continue
+            option = options.get(name)
+            if option is None:
+                raise VirtboxManageError(
+                        reason='unsupported option %s provided' % name)
+            if option.plain:
+                append(option.flag)
+                append(option.fmt % value)
+            else:
+                option.extend(argv, value)
+
+        return argv
+
+
+def indexed(name, count, flag=None, **kwargs):
+    """
+    Return the options name1 .. name<count> for per slot settings such as
+    nic1 .. nic7.
+    """
+    flag = flag or '--%s' % name
+    return [Option('%s%d' % (name, i), flag='%s%d' % (flag, i), **kwargs)
+            for i in range(1, count + 1)]
+
+
+# number of network adapters supported by modifyvm
+NIC_COUNT = 7
+
+
+MODIFYVM_OPTIONS = OptionSpec(*([
+    Option('name'),
+    Option('ostype'),
+    Option('memory'),
+    Option('pagefusion'),
+    Option('vram'),
+    Option('acpi'),
+    Option('pciattach'),
+    Option('pcidetach'),
+    Option('ioapic'),
+    Option('pae'),
+    Option('hpet'),
+    Option('hwvirtex'),
+    Option('hwvirtexexcl'),
+    Option('nestedpaging'),
+    Option('largepages'),
+    Option('vtxvpid'),
+    Option('synthcpu'),
+    Option('cpuidset', multi=True),
+    Option('cpuidremove'),
+    Option('cpuidremoveall', switch=True),
+    Option('hardwareuuid'),
+    Option('cpus'),
+    Option('cpuhotplug'),
+    Option('plugcpu'),
+    Option('unplugcpu'),
+    Option('cpuexecutioncap'),
+    Option('rtcuseutc'),
+    Option('monitorcount'),
+    Option('accelerate3d'),
+    Option('accelerate2dvideo'),
+    Option('firmware', choices=VM_FIRMWARE_OPTIONS),
+    Option('chipset', choices=VM_CHIPSET_OPTIONS),
+    Option('bioslogofadein'),
+    Option('bioslogofadeout'),
+    Option('bioslogodisplaytime'),
+    Option('bioslogoimagepath'),
+    Option('biosbootmenu', choices=VM_BIOSBOOTMENU_OPTIONS),
+    Option('biossystemtimeoffset'),
+    Option('biospxedebug'),
+    ] +
+    indexed('boot', 4, choices=VM_BOOT_OPTIONS) +
+    indexed('nic', NIC_COUNT, choices=VM_NIC_OPTIONS) +
+    indexed('nictype', NIC_COUNT, choices=VM_NICTYPE_OPTIONS) +
+    indexed('cabelconnected', NIC_COUNT, flag='--cableconnected') +
+    indexed('nictrace', NIC_COUNT) +
+    indexed('nictracefile', NIC_COUNT) +
+    indexed('nicproperty', NIC_COUNT) +
+    indexed('nicspeed', NIC_COUNT, fmt='%d') +
+    indexed('nicbootprio', NIC_COUNT) +
+    indexed('nicpromisc', NIC_COUNT, choices=VM_NICPROMISC_OPTIONS) +
+    indexed('nicbandwidthgroup', NIC_COUNT) +
+    indexed('bridgeadapter', NIC_COUNT) +
+    indexed('hostonlyadapter', NIC_COUNT) +
+    indexed('intnet', NIC_COUNT) +
+    indexed('natnet', NIC_COUNT) +
+    indexed('nicgenericdrv', NIC_COUNT) +
+    indexed('natsettings', NIC_COUNT, multi=True) +
+    indexed('natpf', NIC_COUNT) +
+    indexed('nattftpprefix', NIC_COUNT) +
+    indexed('nattftpfile', NIC_COUNT) +
+    indexed('nattftpserver', NIC_COUNT) +
+    indexed('natbindip', NIC_COUNT) +
+    indexed('natdnspassdomain', NIC_COUNT) +
+    indexed('natdnsproxy', NIC_COUNT) +
+    indexed('natdnshostresolver', NIC_COUNT) +
+    indexed('nataliasmode', NIC_COUNT) +
+    indexed('macaddress', NIC_COUNT) + [
+    Option('mouse'),
+    Option('keyboard'),
+    ] +
+    indexed('uart', 2, multi=True) +
+    indexed('uartmode', 2, multi=True) + [
+    Option('guestmemoryballoon'),
+    Option('gueststatisticsinterval'),
+    Option('audio'),
+    Option('audiocontroller'),
+    Option('clipboard'),
+    Option('vrde'),
+    Option('vrdeextpack'),
+    Option('vrdeproperty'),
+    Option('vrdeport'),
+    Option('vrdeaddress'),
+    Option('vrdeauthtype'),
+    Option('vrdeauthlibrary'),
+    Option('vrdemulticon'),
+    Option('vrdereusecon'),
+    Option('vrdevideochannel'),
+    Option('vrdevideochannelquality'),
+    Option('usb'),
+    Option('usbehci'),
+    Option('snapshotfolder'),
+    Option('teleporter'),
+    Option('teleporterport'),
+    Option('teleporteraddress'),
+    Option('teleporterpassword'),
+    ]))
+
+
+STORAGEATTACH_OPTIONS = OptionSpec(
+    Option('name', flag='--storagectl'),
+    Option('port'),
+    Option('device'),
+    Option('storage_type', flag='--type', choices=STORAGE_TYPES),
+    Option('medium'),
+    Option('mtype', choices=STORAGE_MTYPES),
+    Option('comment'),
+    Option('setuuid'),
+    Option('setparentuuid'),
+    Option('passthrough'),
+    Option('tempeject'),
+    Option('nonrotational'),
+    Option('bandwidthgroup'),
+    Option('forceunmount', switch=True),
+    Option('server'),
+    Option('target'),
+    Option('tport'),
+    Option('lun'),
+    Option('encodedlun'),
+    Option('username'),
+    Option('password'),
+    Option('intnet', switch=True),
+    )
+
+
+STORAGECTL_ADD_OPTIONS = OptionSpec(*([
+    Option('name'),
+    Option('ctl_type', flag='--add', choices=STORAGECTL_TYPES),
+    Option('controller', choices=STORAGECTL_CONTROLLERS),
+    ] +
+    indexed('sataideemulation', 4, fmt='%d') + [
+    Option('sataportcount', fmt='%d'),
+    Option('hostiocache'),
+    Option('bootable'),
+    ]))
+
+
+CREATEHD_OPTIONS = OptionSpec(
+    Option('filename'),
+    Option('size'),
+    Option('sizebytes'),
+    Option('hd_format', flag='--format', choices=HD_FORMATS),
+    Option('variant', choices=HD_VARIANTS),
+    )
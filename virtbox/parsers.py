@@ -13,20 +13,386 @@ various commands.
 """
 
 import logging
+import re
+import functools
+import threading
 
-from pyparsing import (Word, alphas, dblQuotedString, alphanums, srange,
-                       OneOrMore, Group, Suppress, Literal,
-                       LineEnd, Combine, hexnums)
+from .models import VMInfo
+from .constants import PARSER_ENGINE, PARSER_ENGINES, PARSER_ENGINE_FAST
 
 # setup module level logger
 LOGGER = logging.getLogger(__name__)
 
-# pyparsing grammars
-HEX_STRING = lambda n: Word(hexnums, exact=n)
-UUID_STRING = Combine(HEX_STRING(8) + "-" + HEX_STRING(4) + "-" +
-    HEX_STRING(4) + "-" + HEX_STRING(4) + "-" + HEX_STRING(12))
-EOL = Suppress(LineEnd())
-DBLQUOTE = Suppress(Literal('"'))
+# pyparsing is only imported once a grammar is first built, most commands
+# are parsed by the fast path or need no grammar at all
+
+# "name" {uuid} lines of list vms / list runningvms
+VM_LINE = re.compile(r'^"(.*)" \{([0-9a-zA-Z_\-]+)\}$')
+# characters replaced by _ when turning "Parent UUID:" into parent_uuid
+KEY_SEPARATORS = re.compile(r'[^a-z0-9]+')
+
+# "Backend 0: id='VDI' name='Virtual Disk Image' ..." lines of list
+# hddbackends output and their key='value', key=(...) or key=value fields
+HDDBACKEND_LINE = re.compile(r'^Backend (\d+):\s*(.*)$')
+HDDBACKEND_FIELD = re.compile(r"(\w+)=(?:'([^']*)'|\(([^)]*)\)|(\S+))")
+
+# "Key:   value" line of list -l vms output
+LONG_LINE = re.compile(r'^([^:]+?):[ \t]*(.*?)[ \t\r]*$')
+# "Boot Device (1)" style keys
+LONG_INDEXED_KEY = re.compile(r'^(.*) \((\d+)\)$')
+# "<controller> (<port>, <device>)" storage attachment keys
+LONG_ATTACHMENT_KEY = re.compile(r'^(.*) \((\d+), (\d+)\)$')
+# "<medium> (UUID: <uuid>)" storage attachment values
+LONG_ATTACHMENT_VALUE = re.compile(r'^(.*) \(UUID: ([0-9a-fA-F\-]+)\)$')
+# "Host-only Interface 'vboxnet0'" nic attachments
+LONG_NIC_ATTACHMENT = re.compile(r"^(.*?)(?: '(.*)')?$")
+# "powered off (since 2012-06-23T21:40:04.000000000)" states
+LONG_STATE = re.compile(r'^(.*?)(?: \(since (.*)\))?$')
+
+
+def _number(value):
+    """
+    "256MB", "100%" or "0 ms" without its unit.
+    """
+    return value.split(' ')[0].rstrip('MBKGbs%')
+
+
+# list -l vms key -> (showvminfo --machinereadable key, value conversion)
+# conversions are functions or dicts mapping human readable values
+LONG_VMINFO_KEYS = {
+    'Name': ('name', None),
+    'Guest OS': ('ostype', None),
+    'UUID': ('UUID', None),
+    'Config file': ('CfgFile', None),
+    'Snapshot folder': ('SnapFldr', None),
+    'Log folder': ('LogFldr', None),
+    'Hardware UUID': ('hardwareuuid', None),
+    'Memory size': ('memory', _number),
+    'Page Fusion': ('pagefusion', None),
+    'VRAM size': ('vram', _number),
+    'CPU exec cap': ('cpuexecutioncap', _number),
+    'HPET': ('hpet', None),
+    'Chipset': ('chipset', None),
+    'Firmware': ('firmware', None),
+    'Number of CPUs': ('cpus', None),
+    'Synthetic Cpu': ('synthcpu', None),
+    'Boot menu mode': ('bootmenu', {'message and menu': 'messageandmenu',
+        'menu only': 'menuonly'}),
+    'ACPI': ('acpi', None),
+    'IOAPIC': ('ioapic', None),
+    'PAE': ('pae', None),
+    'Time offset': ('biossystemtimeoffset', _number),
+    'RTC': ('rtcuseutc', {'UTC': 'on', 'local time': 'off'}),
+    'Hardw. virt.ext': ('hwvirtex', None),
+    'Hardw. virt.ext exclusive': ('hwvirtexexcl', None),
+    'Nested Paging': ('nestedpaging', None),
+    'Large Pages': ('largepages', None),
+    'VT-x VPID': ('vtxvpid', None),
+    'Monitor count': ('monitorcount', None),
+    '3D Acceleration': ('accelerate3d', None),
+    '2D Video Acceleration': ('accelerate2dvideo', None),
+    'Teleporter Enabled': ('teleporterenabled', None),
+    'Teleporter Port': ('teleporterport', None),
+    'Teleporter Address': ('teleporteraddress', None),
+    'Teleporter Password': ('teleporterpassword', None),
+    }
+
+# list -l vms "<key> (<n>)" keys -> (machinereadable key prefix, conversion)
+LONG_VMINFO_INDEXED_KEYS = {
+    'Boot Device': ('boot', {'Floppy': 'floppy', 'DVD': 'dvd',
+        'HardDisk': 'disk', 'Network': 'net', 'Not Assigned': 'none'}),
+    'Storage Controller Name': ('storagecontrollername', None),
+    'Storage Controller Type': ('storagecontrollertype', None),
+    'Storage Controller Instance Number': ('storagecontrollerinstance',
+        None),
+    'Storage Controller Max Port Count': ('storagecontrollermaxportcount',
+        None),
+    'Storage Controller Port Count': ('storagecontrollerportcount', None),
+    'Storage Controller Bootable': ('storagecontrollerbootable', None),
+    }
+
+# list -l vms nic attachment -> (machinereadable nic type, key of the
+# quoted network name)
+LONG_NIC_ATTACHMENTS = {
+    'NAT': ('nat', None),
+    'Host-only Interface': ('hostonly', 'hostonlyadapter'),
+    'Bridged Interface': ('bridged', 'bridgeadapter'),
+    'Internal Network': ('intnet', 'intnet'),
+    'Generic': ('generic', 'nicgenericdrv'),
+    'none': ('null', None),
+    }
+
+# list -l vms nic fields -> machinereadable key prefix
+LONG_NIC_FIELDS = {
+    'MAC': 'macaddress',
+    'Cable connected': 'cableconnected',
+    'Type': 'nictype',
+    'Boot priority': 'nicbootprio',
+    'Promisc Policy': 'nicpromisc',
+    }
+
+LONG_VM_STATES = {'powered off': 'poweroff', 'guru meditation': 'stuck'}
+
+# key=value line of --machinereadable output, keys and values optionally
+# quoted with \" and \\ escapes inside quotes
+MACHINEREADABLE = re.compile(
+    r'^(?:"((?:[^"\\]|\\.)*)"|([^"=\r\n][^=\r\n]*))='
+    r'(?:"((?:[^"\\]|\\.)*)"|([^\r\n]*))\r?$', re.M)
+UNESCAPE = re.compile(r'\\(["\\])')
+
+# grammar name -> function building it, see grammar()
+_grammar_builders = {}
+# grammar name -> built grammar
+_grammars = {}
+_grammars_lock = threading.Lock()
+
+_engine = PARSER_ENGINE
+
+# fast path patterns, each accepting a subset of what the matching pyparsing
+# grammar accepts and capturing the same values
+WHITESPACE = ' \t\r\n'
+UUID_PATTERN = (r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-'
+    r'[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
+FAST_LIST_VMS = re.compile(
+    r'[ \t\r\n]*"([^"\n\r\\]*)"[ \t]*\{[ \t]*([a-zA-Z0-9_\-]+)[ \t]*\}')
+FAST_LIST_OSTYPES = re.compile(
+    r'[ \t\r\n]*ID:[ \t]+([A-Za-z0-9\-/\]_]+)[ \t\r]*\n'
+    r'[ \t\r\n]*Description:[ \t]+([A-Za-z0-9/().][A-Za-z0-9/ ().]*)'
+    r'(?=[ \t\r\n]|\Z)')
+FAST_CREATEVM = re.compile(
+    r"[ \t\r\n]*Virtual machine '([A-Za-z0-9]+)' is created and "
+    r"registered\.[ \t\r]*(?:\n|\Z)"
+    r"[ \t\r\n]*UUID:[ \t]+([a-zA-Z0-9_\-]+)[ \t\r]*(?:\n|\Z)"
+    r"[ \t\r\n]*Settings file:[ \t]*'([A-Za-z0-9/.][A-Za-z0-9 /.]*)'"
+    r"[ \t\r]*(?:\n|\Z)")
+FAST_STARTVM = re.compile(
+    r'[ \t\r\n]*Waiting for VM[ \t]*"%s"[ \t]*to power on\.\.\.'
+    r'[ \t\r]*(?:\n|\Z)'
+    r'[ \t\r\n]*VM[ \t]*"(%s)"[ \t]*has been successfully started\.' %
+    (UUID_PATTERN, UUID_PATTERN))
+FAST_CREATEHD = re.compile(
+    r'[ \t\r\n]*Disk[ \t\r\n]+image[ \t\r\n]+created\.[ \t\r\n]+'
+    r'UUID:[ \t\r\n]+(%s)' % UUID_PATTERN)
+# showhdinfo (label, key, value pattern) in output order; values start
+# with a non-space, pyparsing skips blanks up to the next line for them
+SHOWHDINFO_FIELDS = (
+    ('UUID:', 'uuid', r'[A-Za-z0-9\-]+'),
+    ('Accessible:', 'accessible', r'[A-Za-z]+'),
+    ('Logical size:', 'logical_size', r'[A-Za-z0-9][A-Za-z0-9 ]*'),
+    ('Current size on disk:', 'current_size', r'[A-Za-z0-9][A-Za-z0-9 ]*'),
+    ('Type:', 'type', r'[A-Za-z()][A-Za-z ()]*'),
+    ('Storage format:', 'storage_format', r'[A-Za-z]+'),
+    ('Format variant:', 'format_variant', r'[A-Za-z0-9][A-Za-z0-9 ]*'),
+    ('Location:', 'location', r'[A-Za-z0-9/.][A-Za-z0-9 /.]*'),
+    )
+FAST_SHOWHDINFO = re.compile(''.join(
+    r'[ \t\r\n]*%s[ \t]+(%s)[ \t\r]*(?:\n|\Z)' % (re.escape(label), value)
+    for label, _, value in SHOWHDINFO_FIELDS))
+
+
+def grammar(name):
+    """
+    Register the decorated function as the builder of the grammar name.
+    """
+    def register(builder):
+        _grammar_builders[name] = builder
+        return builder
+
+    return register
+
+
+def get_grammar(name):
+    """
+    Return the grammar name, building it on first use. Grammars are built
+    once per process; concurrent first calls build it only once.
+    """
+    element = _grammars.get(name)
+    if element is not None:
+        return element
+
+    with _grammars_lock:
+        element = _grammars.get(name)
+        if element is None:
+            element = _grammar_builders[name]()
+            element.streamline()
+            _grammars[name] = element
+        return element
+
+
+def clear_grammars():
+    """
+    Drop every built grammar so the next use rebuilds it.
+    """
+    with _grammars_lock:
+        _grammars.clear()
+
+
+def enable_packrat(cache_size_limit=128):
+    """
+    Turn on pyparsing's packrat memoization for every grammar in the
+    process. It pays off for grammars with a lot of backtracking and can
+    not be turned off again.
+    """
+    from pyparsing import ParserElement
+    ParserElement.enable_packrat(cache_size_limit)
+
+
+def set_parser_engine(engine):
+    """
+    Set the engine parsers use when called without one, see
+    virtbox.constants.PARSER_ENGINES.
+    """
+    global _engine
+    if engine not in PARSER_ENGINES:
+        raise ValueError('unknown parser engine %s' % engine)
+    _engine = engine
+
+
+def get_parser_engine():
+    """
+    """
+    return _engine
+
+
+def fast_path(fast):
+    """
+    Decorate a pyparsing based parser to try fast(stdout) first when the
+    fast engine is selected. fast returns None for output it does not
+    recognize, which is then parsed by the decorated parser. Callers pick
+    the engine per call with engine=.
+    """
+    def decorate(parse):
+        @functools.wraps(parse)
+        def dispatch(stdout, stderr, engine=None):
+            if engine is None:
+                engine = _engine
+            elif engine not in PARSER_ENGINES:
+                raise ValueError('unknown parser engine %s' % engine)
+
+            if engine == PARSER_ENGINE_FAST:
+                # pyparsing expands tabs before parsing, so values with
+                # tabs in them come out with spaces
+                result = fast(stdout.expandtabs() if '\t' in stdout
+                        else stdout)
+                if result is not None:
+                    return result
+                LOGGER.debug('%s: fast path did not match, falling back to '
+                        'pyparsing' % parse.__name__)
+            return parse(stdout, stderr)
+
+        dispatch.fast = fast
+        dispatch.pyparsing = parse
+        return dispatch
+
+    return decorate
+
+
+def _match_all(pattern, stdout):
+    """
+    Return the back to back matches of pattern covering all of stdout but
+    trailing whitespace, or None if there are none or something is left.
+    """
+    matches = []
+    end = len(stdout.rstrip(WHITESPACE))
+    pos = 0
+    while pos < end:
+        match = pattern.match(stdout, pos)
+        if match is None:
+            return None
+        matches.append(match)
+        pos = match.end()
+    return matches or None
+
+
+def _fast_list_vms(stdout):
+    """
+    """
+    matches = _match_all(FAST_LIST_VMS, stdout)
+    if matches is None:
+        return None
+    return [{'name': match.group(1), 'uuid': match.group(2)}
+            for match in matches]
+
+
+def _fast_list_ostypes(stdout):
+    """
+    """
+    matches = _match_all(FAST_LIST_OSTYPES, stdout)
+    if matches is None:
+        return None
+    return [{'os_type': match.group(1), 'os_desc': match.group(2)}
+            for match in matches]
+
+
+def _fast_createvm(stdout):
+    """
+    """
+    match = FAST_CREATEVM.match(stdout)
+    if match is None:
+        return None
+    return {'name': match.group(1), 'uuid': match.group(2),
+            'file_path': match.group(3)}
+
+
+def _fast_startvm(stdout):
+    """
+    """
+    match = FAST_STARTVM.match(stdout)
+    if match is None:
+        return None
+    return {'uuid': match.group(1)}
+
+
+def _fast_showhdinfo(stdout):
+    """
+    """
+    match = FAST_SHOWHDINFO.match(stdout)
+    if match is None:
+        return None
+    data = {}
+    for (label, key, _), value in zip(SHOWHDINFO_FIELDS, match.groups()):
+        # pyparsing reads labels as words of their characters, a label
+        # with a space swallows a value starting with one of them
+        if ' ' in label and value[0] in label:
+            return None
+        data[key] = value
+    return data
+
+
+def _fast_createhd(stdout):
+    """
+    """
+    match = FAST_CREATEHD.match(stdout)
+    if match is None:
+        return None
+    return {'uuid': match.group(1)}
+
+
+def _uuid_string():
+    """
+    Return a pyparsing element matching a uuid.
+    """
+    from pyparsing import Word, Combine, hexnums
+
+    def hex_string(n):
+        return Word(hexnums, exact=n)
+
+    return Combine(hex_string(8) + "-" + hex_string(4) + "-" +
+        hex_string(4) + "-" + hex_string(4) + "-" + hex_string(12))
+
+
+def _eol():
+    """
+    """
+    from pyparsing import Suppress, LineEnd
+    return Suppress(LineEnd())
+
+
+def _dblquote():
+    """
+    """
+    from pyparsing import Suppress, Literal
+    return Suppress(Literal('"'))
 
 
 def parse_version(stdout, stderr):
@@ -36,17 +402,25 @@ def parse_version(stdout, stderr):
     return {'version': version}
 
 
-def parse_list_vms(stdout, stderr):
+@grammar('list_vms')
+def _list_vms_grammar():
     """
     """
+    from pyparsing import (Word, alphas, dblQuotedString, srange,
+        OneOrMore, Group, Suppress)
     id_vm_name = dblQuotedString(alphas).setResultsName('name')
     id_vm_uuid = Word(srange("[a-zA-Z0-9_\-]")).setResultsName('uuid')
     left_brace = Suppress("{")
     right_brace = Suppress("}")
     vm_group = Group(id_vm_name + left_brace + id_vm_uuid + right_brace)
-    vm_list = OneOrMore(vm_group)
+    return OneOrMore(vm_group)
+
 
-    token_lists = vm_list.parseString(stdout, parseAll=True)
+@fast_path(_fast_list_vms)
+def parse_list_vms(stdout, stderr):
+    """
+    """
+    token_lists = get_grammar('list_vms').parseString(stdout, parseAll=True)
     return [{'name': token_list.name.replace('\"', ''),
              'uuid': token_list.uuid} for token_list in token_lists]
 
@@ -55,44 +429,288 @@ def parse_list_vms(stdout, stderr):
 parse_list_runningvms = parse_list_vms
 
 
-def parse_list_ostypes(stdout, stderr):
+@grammar('list_ostypes')
+def _list_ostypes_grammar():
     """
     """
+    from pyparsing import Word, alphanums, OneOrMore, Group, Suppress
+    eol = _eol()
     id_label = Suppress(Word("ID:"))
     id_os_type = Word(alphanums + "-" + "/" + "]" + "_").\
             setResultsName('os_type')
     desc_label = Suppress(Word("Description:"))
     id_os_desc = Word(alphanums + "/" + " " + "(" + ")" + ".").\
             setResultsName('os_desc')
-    os_type_group = Group(id_label + id_os_type + EOL + desc_label +
+    os_type_group = Group(id_label + id_os_type + eol + desc_label +
             id_os_desc)
-    os_type_list = OneOrMore(os_type_group)
-    token_lists = os_type_list.parseString(stdout, parseAll=True)
+    return OneOrMore(os_type_group)
+
+
+@fast_path(_fast_list_ostypes)
+def parse_list_ostypes(stdout, stderr):
+    """
+    """
+    token_lists = get_grammar('list_ostypes').parseString(stdout,
+            parseAll=True)
     return [{'os_type': token_list.os_type,
              'os_desc': token_list.os_desc} for token_list in token_lists]
 
 
-def parse_showvminfo(stdout, stderr):
+def iter_blocks(lines):
     """
+    Yield one dict per blank line separated block of "Key: value" lines,
+    as printed by list ostypes, list hdds and friends, holding no more than
+    the current block. Keys are lowercased with runs of other characters
+    replaced by _ ("Parent UUID" becomes parent_uuid), indented lines
+    continue the value of the previous key.
     """
-    data = {}
-    for line in stdout.split('\n'):
-        if len(line) > 0:
-            (key, value) = tuple(line.split('='))
-            data[key.lower()] = value.replace('\"', '')
+    block = {}
+    key = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line.strip():
+            if block:
+                yield block
+                block = {}
+            key = None
+        elif line[0].isspace() and key is not None:
+            block[key] = '%s\n%s' % (block[key], line.strip())
+        elif ':' in line:
+            key, value = line.split(':', 1)
+            key = KEY_SEPARATORS.sub('_', key.strip().lower()).strip('_')
+            block[key] = value.strip()
+    if block:
+        yield block
+
+
+def iter_parse_list_vms(lines):
+    """
+    Yield a {'name', 'uuid'} dict per line of list vms output.
+    """
+    for line in lines:
+        match = VM_LINE.match(line.strip())
+        if match is not None:
+            yield {'name': match.group(1), 'uuid': match.group(2)}
+
+
+# list vms and list runningvms share the same output format
+iter_parse_list_runningvms = iter_parse_list_vms
+
+
+def iter_parse_list_vms_long(lines):
+    """
+    Yield a virtbox.models.VMInfo per vm in list -l vms output, holding
+    only the vm being read. The human readable keys are mapped to their
+    showvminfo --machinereadable equivalents; details without one, such as
+    the description, are left out.
+    """
+    raw = {}
+    controllers = set()
+    for line in lines:
+        match = LONG_LINE.match(line)
+        if match is None:
+            continue
+        key, value = match.groups()
+
+        if key == 'Name':
+            # shared folders are listed as Name: 'x', Host path: ...
+            if "', Host path: " in value:
+                continue
+            if raw:
+                yield VMInfo(raw)
+            raw = {}
+            controllers = set()
+
+        if key in LONG_VMINFO_KEYS:
+            name, convert = LONG_VMINFO_KEYS[key]
+            raw[name] = _convert(value, convert)
+        elif key == 'State':
+            state, since = LONG_STATE.match(value).groups()
+            raw['VMState'] = LONG_VM_STATES.get(state, state.replace(' ', ''))
+            if since:
+                raw['VMStateChangeTime'] = since
+        elif key.startswith('NIC '):
+            _long_nic(raw, key[4:], value)
+        else:
+            _long_indexed(raw, controllers, key, value)
+
+    if raw:
+        yield VMInfo(raw)
+
+
+def _convert(value, convert):
+    """
+    """
+    if convert is None:
+        return value
+    if isinstance(convert, dict):
+        return convert.get(value, value)
+    return convert(value)
+
+
+def _long_nic(raw, index, value):
+    """
+    Add the machinereadable keys of a "NIC <index>:" line to raw.
+    """
+    if not index.isdigit():
+        # NIC 1 Settings:, NIC 1 Rule(0): and the like
+        return
+    if value == 'disabled':
+        raw['nic%s' % index] = 'none'
+        return
+
+    for part in value.split(', '):
+        field, _, field_value = part.partition(': ')
+        if field == 'Attachment':
+            attachment, network = LONG_NIC_ATTACHMENT.match(
+                    field_value).groups()
+            nic, network_key = LONG_NIC_ATTACHMENTS.get(attachment,
+                    (attachment.lower(), None))
+            raw['nic%s' % index] = nic
+            if network_key is not None and network is not None:
+                raw['%s%s' % (network_key, index)] = network
+        elif field == 'Reported speed':
+            # reported in Mbps, machinereadable output has kbps
+            raw['nicspeed%s' % index] = str(int(_number(field_value)) * 1000)
+        elif field in LONG_NIC_FIELDS:
+            raw['%s%s' % (LONG_NIC_FIELDS[field], index)] = field_value
+
+
+def _long_indexed(raw, controllers, key, value):
+    """
+    Add the machinereadable key of a "<key> (<n>):" or storage attachment
+    line to raw, remembering controller names in controllers.
+    """
+    match = LONG_INDEXED_KEY.match(key)
+    if match is not None and match.group(1) in LONG_VMINFO_INDEXED_KEYS:
+        name, convert = LONG_VMINFO_INDEXED_KEYS[match.group(1)]
+        raw['%s%s' % (name, match.group(2))] = _convert(value, convert)
+        if name == 'storagecontrollername':
+            controllers.add(value)
+        return
+
+    match = LONG_ATTACHMENT_KEY.match(key)
+    if match is not None and match.group(1) in controllers:
+        controller, port, device = match.groups()
+        attachment = LONG_ATTACHMENT_VALUE.match(value)
+        if attachment is not None:
+            medium, uuid = attachment.groups()
+            raw['%s-ImageUUID-%s-%s' % (controller, port, device)] = uuid
+        else:
+            medium = 'emptydrive' if value == 'Empty' else value
+        raw['%s-%s-%s' % (controller, port, device)] = medium
+
+
+def parse_list_vms_long(stdout, stderr):
+    """
+    """
+    return list(iter_parse_list_vms_long(stdout.splitlines()))
+
+
+def iter_parse_list_ostypes(lines):
+    """
+    Yield a {'os_type', 'os_desc'} dict per block of list ostypes output.
+    """
+    for block in iter_blocks(lines):
+        yield {'os_type': block.get('id'), 'os_desc': block.get('description')}
+
+
+def iter_parse_list_hdds(lines):
+    """
+    Yield a dict per medium of list hdds output, keyed uuid, parent_uuid,
+    state, type, location, storage_format, capacity and so on.
+    """
+    return iter_blocks(lines)
+
+
+# list dvds prints the same blocks as list hdds
+iter_parse_list_dvds = iter_parse_list_hdds
+
+
+def parse_list_hdds(stdout, stderr):
+    """
+    """
+    return list(iter_parse_list_hdds(stdout.splitlines()))
+
+
+parse_list_dvds = parse_list_hdds
 
+
+def parse_list_systemproperties(stdout, stderr):
+    """
+    Return the list systemproperties settings keyed like iter_blocks keys,
+    e.g. default_machine_folder or maximum_guest_ram_size.
+    """
+    properties = {}
+    for block in iter_blocks(stdout.splitlines()):
+        properties.update(block)
+    return properties
+
+
+def parse_list_hddbackends(stdout, stderr):
+    """
+    Return a dict per "Backend <n>: id='VDI' name='...' ..." line of list
+    hddbackends output with the key='value' pairs, capabilities and the
+    config description, plus index.
+    """
+    backends = []
+    for line in stdout.splitlines():
+        match = HDDBACKEND_LINE.match(line)
+        if match is None:
+            continue
+        backend = {'index': int(match.group(1))}
+        for key, quoted, group, plain in HDDBACKEND_FIELD.findall(
+                match.group(2)):
+            backend[key.lower()] = quoted or group or plain
+        backends.append(backend)
+    return backends
+
+
+def parse_machinereadable(stdout):
+    """
+    Return the key=value pairs of --machinereadable output as a dict, in a
+    single pass over stdout. Keys and values may be quoted, quoted values
+    may contain = and span several lines and \\" and \\\\ escapes are undone.
+    """
+    data = {}
+    for match in MACHINEREADABLE.finditer(stdout):
+        quoted_key, key, quoted_value, value = match.groups()
+        if key is None:
+            key = quoted_key
+            if '\\' in key:
+                key = UNESCAPE.sub(r'\1', key)
+        if value is None:
+            value = quoted_value
+            if '\\' in value:
+                value = UNESCAPE.sub(r'\1', value)
+        elif value[:1] == '"' and value[-1:] == '"' and len(value) > 1:
+            # older releases print quotes inside values unescaped
+            value = value[1:-1]
+        data[key] = value
     return data
 
 
+def parse_showvminfo(stdout, stderr):
+    """
+    Return a virtbox.models.VMInfo record of showvminfo --machinereadable
+    output.
+    """
+    return VMInfo(parse_machinereadable(stdout))
+
+
 def parse_unregistervm(stdout, stderr):
     """
     """
     return stdout
 
 
-def parse_createvm(stdout, stderr):
+@grammar('createvm')
+def _createvm_grammar():
     """
     """
+    from pyparsing import (Word, alphanums, srange, Group, Suppress,
+        Literal)
+    eol = _eol()
     single_quote = Suppress(Literal('\''))
     name_prefix = Suppress(Word('Virtual machine'))
     id_name = Word(alphanums).setResultsName('name')
@@ -101,10 +719,16 @@ def parse_createvm(stdout, stderr):
     id_vm_uuid = Word(srange("[a-zA-Z0-9_\-]")).setResultsName('uuid')
     file_prefix = Suppress(Word('Settings file:'))
     id_file_path = Word(alphanums + " /.").setResultsName('file_path')
-    vm_info = Group(name_prefix + single_quote + id_name +
-        single_quote + name_postfix + EOL + uuid_prefix + id_vm_uuid + EOL +
-        file_prefix + single_quote + id_file_path + single_quote + EOL)
-    out = vm_info.parseString(stdout)[0]
+    return Group(name_prefix + single_quote + id_name +
+        single_quote + name_postfix + eol + uuid_prefix + id_vm_uuid + eol +
+        file_prefix + single_quote + id_file_path + single_quote + eol)
+
+
+@fast_path(_fast_createvm)
+def parse_createvm(stdout, stderr):
+    """
+    """
+    out = get_grammar('createvm').parseString(stdout)[0]
     return {'name': out.name, 'uuid': out.uuid, 'file_path': out.file_path}
 
 
@@ -114,19 +738,30 @@ def parse_modifyvm(stdout, stderr):
     return stdout
 
 
-def parse_startvm(stdout, stderr):
+@grammar('startvm')
+def _startvm_grammar():
     """
     """
+    from pyparsing import Word, Group
+    uuid_string = _uuid_string()
+    dblquote = _dblquote()
+    eol = _eol()
     waiting_prefix = Word('Waiting for VM')
-    waiting_uuid = UUID_STRING.setResultsName('waiting_uuid')
+    waiting_uuid = uuid_string.setResultsName('waiting_uuid')
     waiting_postfix = Word('to power on...')
     success_prefix = Word('VM')
-    success_uuid = UUID_STRING.setResultsName('success_uuid')
+    success_uuid = uuid_string.setResultsName('success_uuid')
     success_postfix = Word("has been successfully started.")
-    total = Group(waiting_prefix + DBLQUOTE + waiting_uuid + DBLQUOTE +
-            waiting_postfix + EOL + success_prefix + DBLQUOTE + success_uuid +
-            DBLQUOTE + success_postfix)
-    out = total.parseString(stdout)[0]
+    return Group(waiting_prefix + dblquote + waiting_uuid + dblquote +
+            waiting_postfix + eol + success_prefix + dblquote + success_uuid +
+            dblquote + success_postfix)
+
+
+@fast_path(_fast_startvm)
+def parse_startvm(stdout, stderr):
+    """
+    """
+    out = get_grammar('startvm').parseString(stdout)[0]
 
     return {'uuid': out.success_uuid}
 
@@ -161,9 +796,12 @@ def parse_storagectl_remove(stdout, stderr):
     return stdout
 
 
-def parse_showhdinfo(stdout, stderr):
+@grammar('showhdinfo')
+def _showhdinfo_grammar():
     """
     """
+    from pyparsing import Word, alphas, alphanums, Group, Suppress
+    eol = _eol()
     uuid_prefix = Suppress(Word('UUID:'))
     id_uuid = Word(alphanums + '-').setResultsName('uuid')
     accessible_prefix = Suppress(Word('Accessible:'))
@@ -181,26 +819,41 @@ def parse_showhdinfo(stdout, stderr):
     prefix_location = Suppress(Word('Location:'))
     id_location = Word(alphanums + ' /.').setResultsName('location')
 
-    hd_info = Group(uuid_prefix + id_uuid + EOL + accessible_prefix +
-            id_accessible + EOL + logical_size_prefix + id_logical_size + EOL +
-            current_size_prefix + id_current_size + EOL + type_prefix +
-            id_type + EOL + prefix_storage_format + id_storage_format + EOL +
-            prefix_format_variant + id_format_variant + EOL + prefix_location +
-            id_location + EOL)
-    out = hd_info.parseString(stdout)[0]
+    return Group(uuid_prefix + id_uuid + eol + accessible_prefix +
+            id_accessible + eol + logical_size_prefix + id_logical_size + eol +
+            current_size_prefix + id_current_size + eol + type_prefix +
+            id_type + eol + prefix_storage_format + id_storage_format + eol +
+            prefix_format_variant + id_format_variant + eol + prefix_location +
+            id_location + eol)
+
+
+@fast_path(_fast_showhdinfo)
+def parse_showhdinfo(stdout, stderr):
+    """
+    """
+    out = get_grammar('showhdinfo').parseString(stdout)[0]
 
     return {'uuid': out.uuid, 'accessible': out.accessible,
             'logical_size': out.logical_size, 'current_size': out.current_size,
             'type': out.type, 'storage_format': out.storage_format,
-            'format_variant': out.storage_variant, 'location': out.location}
+            'format_variant': out.format_variant, 'location': out.location}
 
 
-def parse_createhd(stdout, stderr):
+@grammar('createhd')
+def _createhd_grammar():
     """
     """
+    from pyparsing import Word, Group
+    uuid_string = _uuid_string()
     uuid_prefix = Group(Word('Disk') + Word('image') + Word('created.') +
             Word('UUID:'))
-    userdata = uuid_prefix + UUID_STRING.setResultsName('uuid')
-    out = userdata.parseString(stdout)
+    return uuid_prefix + uuid_string.setResultsName('uuid')
+
+
+@fast_path(_fast_createhd)
+def parse_createhd(stdout, stderr):
+    """
+    """
+    out = get_grammar('createhd').parseString(stdout)
 
     return {'uuid': out.uuid}
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+
+"""
+virtbox.reconcile
+~~~~~~~~
+
+This module brings vms to a declared state with the fewest VBoxManage
+calls, in place of running createvm, modifyvm, storagectl_add, createhd
+and storageattach unconditionally:
+
+    >>> spec = VMSpec('jangofett', ostype='Ubuntu_64',
+    ...         hardware={'memory': 256, 'cpus': 2, 'ioapic': True},
+    ...         nics=[{'nic': 'nat'},
+    ...               {'nic': 'hostonly', 'hostonlyadapter': 'vboxnet0'}],
+    ...         controllers=[{'name': 'primary', 'ctl_type': 'sata',
+    ...                       'sataportcount': 2}],
+    ...         disks=[{'controller': 'primary', 'port': 0, 'device': 0,
+    ...                 'filename': '/srv/jangofett.vdi', 'size': '8192'}])
+    >>> reconcile(spec)
+    [('modifyvm', {'vm_uuid': '...', 'memory': '256'})]
+
+The current state is read with one showvminfo, or for reconcile_many with
+one list --long vms for all the vms, and diffed against the spec: options
+that already have the wanted value are dropped, the rest folded into a
+single modifyvm, and only missing controllers, disks and attachments are
+added. Re-applying an unchanged spec runs no command that changes
+anything.
+
+Options showvminfo does not report, such as natpf, can not be compared
+and are applied every time. Existing controllers are kept as they are;
+one on a different bus than the spec's is an error, changing it would
+detach its disks.
+
+:copyright: (c) 2012 by Sean Plaice.
+:license: ISC, see LICENSE for more details.
+
+"""
+
+import os
+import logging
+
+from . import manage
+from .utils import fan_out
+from .errors import CommandError, VirtboxManageError
+from .options import MODIFYVM_OPTIONS
+from .constants import FANOUT_WORKERS
+
+
+# setup module level logger
+LOGGER = logging.getLogger(__name__)
+
+# modifyvm options showvminfo --machinereadable reports under another key
+VMINFO_KEYS = {
+    'biosbootmenu': 'bootmenu',
+    'mouse': 'hidpointing',
+    'keyboard': 'hidkeyboard',
+}
+
+# nic settings whose modifyvm option is spelled differently
+NIC_OPTIONS = {'cableconnected': 'cabelconnected'}
+
+# modifyvm options showvminfo prints in another case, or for mac
+# addresses without colons
+CASE_INSENSITIVE = ('firmware', 'chipset', 'macaddress')
+
+# the storagectl --add bus of the showvminfo storagecontrollertype values
+CONTROLLER_BUSES = {
+    'intelahci': 'sata',
+    'piix3': 'ide',
+    'piix4': 'ide',
+    'ich6': 'ide',
+    'lsilogic': 'scsi',
+    'buslogic': 'scsi',
+    'lsilogicsas': 'sas',
+    'i82078': 'floppy',
+}
+
+
+def option_value(value):
+    """
+    Return value as modifyvm takes it and showvminfo reports it: bools as
+    on and off, numbers as strings.
+    """
+    if value is True:
+        return 'on'
+    if value is False:
+        return 'off'
+    return str(value)
+
+
+class VMSpec(object):
+    """ The desired state of a vm.
+
+        hardware maps modifyvm options, see
+        virtbox.options.MODIFYVM_OPTIONS, to their values. nics holds a
+        dict of adapter settings without the adapter number per network
+        adapter, e.g. {'nic': 'hostonly', 'hostonlyadapter': 'vboxnet0'},
+        numbered from 1 unless it has an index. controllers are
+        storagectl_add keyword dicts. disks are dicts with the controller,
+        port and device to attach at and either the medium to attach or
+        the filename of the image, created with size, hd_format and
+        variant when it does not exist; storage_type defaults to hdd.
+    """
+
+    def __init__(self, name, ostype=None, hardware=None, nics=(),
+            controllers=(), disks=(), basefolder=None):
+        self.name = name
+        self.ostype = ostype
+        self.basefolder = basefolder
+        self.controllers = [dict(controller) for controller in controllers]
+        self.disks = [dict(disk) for disk in disks]
+        self.options = self._options(hardware or {}, nics)
+
+        for disk in self.disks:
+            if not disk.get('medium') and not disk.get('filename'):
+                raise VirtboxManageError(
+                        reason='disk needs a medium or a filename')
+            disk.setdefault('storage_type', 'hdd')
+
+    def _options(self, hardware, nics):
+        """
+        Return the modifyvm options of hardware and nics as strings.
+        """
+        options = {}
+        for name, value in hardware.items():
+            options[name] = value
+        for number, nic in enumerate(nics, 1):
+            index = nic.get('index', number)
+            for field, value in nic.items():
+                if field != 'index':
+                    options['%s%d' % (NIC_OPTIONS.get(field, field),
+                        index)] = value
+
+        for name in options:
+            if name not in MODIFYVM_OPTIONS or name == 'name':
+                raise VirtboxManageError(
+                        reason='unsupported option %s provided' % name)
+        return dict((name, option_value(value))
+                for name, value in options.items())
+
+    def __repr__(self):
+        return '<VMSpec %s>' % self.name
+
+
+def _vminfo_key(option):
+    """
+    """
+    if option.startswith('cabelconnected'):
+        return 'cableconnected' + option[len('cabelconnected'):]
+    return VMINFO_KEYS.get(option, option)
+
+
+def _same(option, wanted, current):
+    """
+    """
+    if current is None:
+        return False
+    if option.rstrip('0123456789') in CASE_INSENSITIVE:
+        return wanted.replace(':', '').lower() == \
+                current.replace(':', '').lower()
+    return wanted == current
+
+
+def plan(spec, info, ostypes=None):
+    """
+    Return the ordered (manage function name, kwargs) steps that bring the
+    vm info describes, a VMInfo or None if it does not exist, to spec.
+    ostypes maps os type ids to the descriptions showvminfo reports,
+    without it an existing vm's ostype is only matched by id.
+    """
+    steps = []
+    if info is None:
+        createvm = {'name': spec.name}
+        if spec.ostype:
+            createvm['ostype'] = spec.ostype
+        if spec.basefolder:
+            createvm['basefolder'] = spec.basefolder
+        steps.append(('createvm', createvm))
+        # the uuid is only known once createvm ran
+        vm, ctl_vm = {'vm_name': spec.name}, {'vmname': spec.name}
+        changed = dict(spec.options)
+        storage = {}
+    else:
+        vm, ctl_vm = {'vm_uuid': info['uuid']}, {'uuid': info['uuid']}
+        changed = dict((option, value)
+                for option, value in spec.options.items()
+                if not _same(option, value, info.get(_vminfo_key(option))))
+        if spec.ostype and info.get('ostype') not in (spec.ostype,
+                (ostypes or {}).get(spec.ostype)):
+            changed['ostype'] = spec.ostype
+        storage = dict((controller['name'], controller)
+                for controller in info.storage)
+
+    if changed:
+        modifyvm = dict(vm)
+        modifyvm.update(sorted(changed.items()))
+        steps.append(('modifyvm', modifyvm))
+
+    declared = set()
+    for controller in spec.controllers:
+        declared.add(controller['name'])
+        current = storage.get(controller['name'])
+        if current is None:
+            storagectl_add = dict(ctl_vm)
+            storagectl_add.update(controller)
+            steps.append(('storagectl_add', storagectl_add))
+            continue
+        bus = CONTROLLER_BUSES.get(str(current.get('type')).lower())
+        if controller.get('ctl_type') and bus and \
+                bus != controller['ctl_type']:
+            raise VirtboxManageError(reason='controller %s of %s is %s, '
+                    'not %s' % (controller['name'], spec.name, bus,
+                        controller['ctl_type']))
+
+    for disk in spec.disks:
+        if disk['controller'] not in declared and \
+                disk['controller'] not in storage:
+            raise VirtboxManageError(reason='no controller %s for the disk'
+                    ' of %s' % (disk['controller'], spec.name))
+        steps.extend(_disk_steps(ctl_vm, disk, storage))
+
+    return steps
+
+
+def _disk_steps(ctl_vm, disk, storage):
+    """
+    """
+    slot = (int(disk['port']), int(disk['device']))
+    attached = storage.get(disk['controller'], {}).get('attachments',
+            {}).get(slot, {})
+    medium = disk.get('medium') or disk['filename']
+    if medium in (attached.get('medium'), attached.get('uuid')):
+        return []
+
+    steps = []
+    if not disk.get('medium') and disk.get('size') and \
+            not os.path.exists(disk['filename']):
+        createhd = {'filename': disk['filename'], 'size': disk['size']}
+        for name in ('hd_format', 'variant'):
+            if disk.get(name):
+                createhd[name] = disk[name]
+        steps.append(('createhd', createhd))
+
+    storageattach = dict(ctl_vm)
+    storageattach.update({'name': disk['controller'],
+        'port': str(slot[0]), 'device': str(slot[1]),
+        'storage_type': disk['storage_type'], 'medium': medium})
+    if disk.get('mtype'):
+        storageattach['mtype'] = disk['mtype']
+    steps.append(('storageattach', storageattach))
+    return steps
+
+
+def apply(steps):
+    """
+    Run steps as returned by plan.
+    """
+    for command, kwargs in steps:
+        LOGGER.info('%s %s' % (command, kwargs))
+        getattr(manage, command)(**kwargs)
+
+
+def read_state(name):
+    """
+    Return the VMInfo of the vm name, or None if there is none.
+    """
+    try:
+        return manage.showvminfo(name=name)
+    except CommandError as exc:
+        if exc.error_code == 'not_found':
+            return None
+        raise
+
+
+def _ostypes(spec, info):
+    """
+    Return the ostype descriptions if spec's ostype has to be compared,
+    list ostypes is cached per VBoxManage binary.
+    """
+    if info is None or not spec.ostype or info.get('ostype') == spec.ostype:
+        return None
+    return dict((ostype['os_type'], ostype['os_desc'])
+            for ostype in manage.list_ostypes())
+
+
+def reconcile(spec, dry_run=False):
+    """
+    Bring the vm spec names to spec and return the steps run, or with
+    dry_run the steps that would be.
+    """
+    info = read_state(spec.name)
+    steps = plan(spec, info, _ostypes(spec, info))
+    if not dry_run:
+        apply(steps)
+    return steps
+
+
+def reconcile_many(specs, workers=FANOUT_WORKERS, dry_run=False):
+    """
+    Reconcile specs reading the state of every vm with a single list
+    --long vms, and apply the plans up to workers vms at a time. Yields
+    (spec, steps) pairs as they complete, with the exception raised in
+    place of the steps for a spec that failed.
+    """
+    states = {}
+    for info in manage.list_vms(long=True):
+        states.setdefault(info['name'], info)
+
+    def run(spec):
+        info = states.get(spec.name)
+        steps = plan(spec, info, _ostypes(spec, info))
+        if not dry_run:
+            apply(steps)
+        return steps
+
+    return fan_out(run, specs, 'spec', workers=workers)
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+"""
+virtbox.retry
+~~~~~~~~
+
+This module provides the retry policy run_cmd applies to failed VBoxManage
+commands. Only errors classified as transient (see
+virtbox.errors.classify_error) are retried, with exponential backoff and
+full jitter, bounded by a maximum number of attempts and an overall
+deadline. Retrying is opt-in:
+
+    >>> set_retry_policy(RetryPolicy(max_attempts=5, deadline=60))
+
+:copyright: (c) 2012 by Sean Plaice.
+:license: ISC, see LICENSE for more details.
+
+"""
+
+import time
+import random
+import logging
+import threading
+
+from .errors import CommandError, CommandTimeout, CommandCancelled
+
+
+# setup module level logger
+LOGGER = logging.getLogger(__name__)
+
+_default_policy = None
+_metrics_lock = threading.Lock()
+_metrics = {}
+
+
+class RetryPolicy(object):
+    """ Exponential backoff with jitter for transient command errors.
+
+        The n-th retry sleeps up to base_delay * 2 ** (n - 1) seconds,
+        capped at max_delay; with jitter the sleep is drawn uniformly below
+        that bound. No retry is started that would end past deadline
+        seconds after the first attempt. Inside virtbox.utils.deadline()
+        a backoff that would outlast the enclosing deadline raises
+        CommandTimeout instead, and setting its cancel event interrupts
+        the sleep with CommandCancelled.
+    """
+
+    def __init__(self, max_attempts=5, base_delay=0.5, max_delay=10.0,
+            deadline=None, jitter=True):
+        if max_attempts < 1:
+            raise ValueError('max_attempts must be at least 1')
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.jitter = jitter
+
+    def backoff(self, attempt):
+        """
+        Return the sleep before retrying after failed attempt number
+        attempt, counting from 1.
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def next_delay(self, exc, attempt, started):
+        """
+        Return the seconds to sleep before retrying after attempt failed
+        with exc, or None if the command should not be retried. started is
+        the time.monotonic() of the first attempt.
+        """
+        from .utils import remaining_time
+
+        if not isinstance(exc, CommandError) or not exc.transient:
+            return None
+
+        if attempt >= self.max_attempts:
+            _count('exhausted')
+            return None
+
+        delay = self.backoff(attempt)
+        if (self.deadline is not None and
+                time.monotonic() - started + delay > self.deadline):
+            _count('exhausted')
+            return None
+
+        remaining = remaining_time()
+        if remaining is not None and delay >= remaining:
+            _count('exhausted')
+            LOGGER.error('cmd: %s not retried, %.2fs left of its deadline' %
+                    (exc.cmd, remaining))
+            raise CommandTimeout(timeout=remaining, cmd=exc.cmd,
+                    stdout=exc.stdout, stderr=exc.stderr) from exc
+
+        _count('retries', exc.error_code)
+        LOGGER.warning('retrying %s in %.2fs after %s (attempt %d/%d)' %
+                (exc.cmd, delay, exc.error_code, attempt, self.max_attempts))
+        return delay
+
+    def call(self, func, *args, **kwargs):
+        """
+        Call func, retrying it while it raises transient CommandErrors.
+        """
+        started = time.monotonic()
+        attempt = 1
+        while True:
+            try:
+                result = func(*args, **kwargs)
+            except CommandError as exc:
+                delay = self.next_delay(exc, attempt, started)
+                if delay is None:
+                    raise
+                _sleep(delay, exc)
+                attempt += 1
+            else:
+                if attempt > 1:
+                    count_recovered()
+                return result
+
+
+def _sleep(delay, exc):
+    """
+    Sleep delay seconds before retrying the command that failed with exc,
+    raising CommandCancelled once the enclosing deadline's cancel event is
+    set.
+    """
+    from .utils import command_timeout
+    _, cancel = command_timeout()
+    if cancel is None:
+        time.sleep(delay)
+    elif cancel.wait(delay):
+        LOGGER.error('cmd: %s cancelled' % exc.cmd)
+        raise CommandCancelled(cmd=exc.cmd)
+
+
+def set_retry_policy(policy):
+    """
+    Set the RetryPolicy run_cmd uses when none is passed, None disables
+    retrying.
+    """
+    global _default_policy
+    _default_policy = policy
+
+
+def get_retry_policy():
+    """
+    """
+    return _default_policy
+
+
+def retry_metrics():
+    """
+    Return a snapshot of the retry counters: retries performed (in total
+    and per error code), commands that recovered after retrying and
+    commands that gave up with retries exhausted.
+    """
+    with _metrics_lock:
+        return {
+            'retries': _metrics.get('retries', 0),
+            'recovered': _metrics.get('recovered', 0),
+            'exhausted': _metrics.get('exhausted', 0),
+            'retries_by_code': dict(_metrics.get('retries_by_code', {})),
+        }
+
+
+def reset_retry_metrics():
+    """
+    """
+    with _metrics_lock:
+        _metrics.clear()
+
+
+def count_recovered():
+    """
+    Record a command that succeeded after being retried.
+    """
+    _count('recovered')
+
+
+def _count(name, error_code=None):
+    """
+    """
+    with _metrics_lock:
+        _metrics[name] = _metrics.get(name, 0) + 1
+        if error_code is not None:
+            by_code = _metrics.setdefault('retries_by_code', {})
+            by_code[error_code] = by_code.get(error_code, 0) + 1
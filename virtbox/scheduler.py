@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+"""
+virtbox.scheduler
+~~~~~~~~
+
+This module provides a scheduler for virtbox.manage calls that is aware of
+VirtualBox session locks. VBoxManage takes a session lock on the vm a
+command modifies, so two commands against the same vm issued at once fail.
+The scheduler keys every call by its target vm, runs calls for the same vm
+one after another in submission order and runs calls for different vms
+concurrently up to a global limit.
+
+    >>> scheduler = Scheduler(limit=8)
+    >>> scheduler.submit(modifyvm, vm_uuid=uuid, memory='256')
+    >>> scheduler.submit(storageattach, uuid=uuid, name='primary', ...)
+
+:copyright: (c) 2012 by Sean Plaice.
+:license: ISC, see LICENSE for more details.
+
+"""
+
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .constants import FANOUT_WORKERS
+
+
+# setup module level logger
+LOGGER = logging.getLogger(__name__)
+
+# keyword arguments that name the vm a manage call acts on, by precedence
+VM_KEY_ARGS = ('vm_uuid', 'uuid', 'vm_name', 'vmname')
+
+# manage calls whose uuid argument is the vm rather than e.g. a medium
+VM_UUID_COMMANDS = ('createvm', 'showvminfo', 'unregistervm',
+    'storageattach', 'storagectl_add', 'storagectl_remove')
+
+# manage calls whose name argument is the vm rather than e.g. a controller
+VM_NAME_COMMANDS = ('createvm', 'showvminfo', 'unregistervm')
+
+
+def vm_key(func, kwargs):
+    """
+    Return the vm a manage call made with kwargs targets, or None.
+
+    A vm referred to by name in one call and by uuid in another is seen as
+    two different keys.
+    """
+    command = getattr(func, '__name__', None)
+    for arg in VM_KEY_ARGS:
+        if arg == 'uuid' and command not in VM_UUID_COMMANDS:
+            continue
+        if kwargs.get(arg):
+            return kwargs[arg]
+
+    if command in VM_NAME_COMMANDS:
+        return kwargs.get('name')
+
+    return None
+
+
+class _Call(object):
+    """ A submitted call waiting for its turn.
+    """
+    __slots__ = ('future', 'func', 'kwargs', 'key', 'submitted', 'context')
+
+    def __init__(self, func, kwargs, key):
+        self.future = Future()
+        self.func = func
+        self.kwargs = kwargs
+        self.key = key
+        self.submitted = time.monotonic()
+        # run in the submitter's context so its deadline() applies
+        self.context = contextvars.copy_context()
+
+
+class Scheduler(object):
+    """ Runs manage calls serialized per vm and concurrent across vms.
+    """
+
+    def __init__(self, limit=FANOUT_WORKERS):
+        self.limit = limit
+        self._pool = ThreadPoolExecutor(max_workers=limit)
+        self._lock = threading.Lock()
+        # notified whenever the last call for a key finished
+        self._drained = threading.Condition(self._lock)
+        # key -> calls waiting behind the one running for that key
+        self._queues = {}
+        self._shutdown = False
+        self._cancelling = False
+        self._running = 0
+        self._submitted = 0
+        self._completed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def submit(self, func, key=None, **kwargs):
+        """
+        Schedule func(**kwargs) and return a Future for its result. key
+        overrides the vm key derived from kwargs. Raises RuntimeError once
+        the scheduler is shut down.
+        """
+        if key is None:
+            key = vm_key(func, kwargs)
+        call = _Call(func, kwargs, key)
+
+        error = None
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('cannot schedule new calls after shutdown')
+            self._submitted += 1
+            if key is None:
+                error = self._dispatch(call)
+            elif key in self._queues:
+                self._queues[key].append(call)
+            else:
+                error = self._dispatch(call)
+                if error is None:
+                    self._queues[key] = deque()
+
+        if error is not None:
+            self._fail(call, error)
+        return call.future
+
+    def call(self, func, key=None, **kwargs):
+        """
+        Schedule func(**kwargs) and block until it returns.
+        """
+        return self.submit(func, key=key, **kwargs).result()
+
+    def wrap(self, func):
+        """
+        Return a blocking version of func that runs through the scheduler.
+        """
+        def scheduled(**kwargs):
+            return self.call(func, **kwargs)
+
+        scheduled.__name__ = getattr(func, '__name__', 'scheduled')
+        scheduled.__doc__ = func.__doc__
+        return scheduled
+
+    def stats(self):
+        """
+        Return queue depth and wait time statistics.
+
+        queued counts calls waiting behind another call for the same vm,
+        queue_depth breaks that down per vm and wait times measure how
+        long calls waited between submit and start.
+        """
+        with self._lock:
+            started = self._completed + self._running
+            return {
+                'submitted': self._submitted,
+                'running': self._running,
+                'completed': self._completed,
+                'queued': sum(len(q) for q in self._queues.values()),
+                'queue_depth': dict((key, len(q)) for key, q in
+                    self._queues.items() if q),
+                'wait_time_total': self._wait_total,
+                'wait_time_max': self._wait_max,
+                'wait_time_avg': (self._wait_total / started
+                    if started else 0.0),
+            }
+
+    def shutdown(self, wait=True):
+        """
+        Stop accepting work. With wait, block until every submitted call,
+        including those queued behind another call for the same vm, has
+        finished. Without it, calls that have not started are cancelled
+        and the running ones finish in the background.
+        """
+        cancelled = []
+        with self._lock:
+            self._shutdown = True
+            if wait:
+                while self._queues:
+                    self._drained.wait()
+            else:
+                self._cancelling = True
+                for queue in self._queues.values():
+                    cancelled.extend(queue)
+                    queue.clear()
+
+        # done callbacks may call back into the scheduler, run them unlocked
+        for call in cancelled:
+            call.future.cancel()
+        self._pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def _dispatch(self, call):
+        """
+        Hand call to the pool, return the RuntimeError of a pool that was
+        shut down. Must be called holding self._lock.
+        """
+        try:
+            self._pool.submit(self._run, call)
+        except RuntimeError as exc:
+            LOGGER.warning('could not dispatch %r: %s' % (call.func, exc))
+            return exc
+        return None
+
+    def _fail(self, call, exc):
+        """
+        Fail call with exc unless it was cancelled. Must be called without
+        self._lock, done callbacks may submit more calls.
+        """
+        if call.future.set_running_or_notify_cancel():
+            call.future.set_exception(exc)
+
+    def _run(self, call):
+        """
+        """
+        waited = time.monotonic() - call.submitted
+        with self._lock:
+            self._running += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        if self._cancelling:
+            call.future.cancel()
+
+        try:
+            if call.future.set_running_or_notify_cancel():
+                try:
+                    result = call.context.run(call.func, **call.kwargs)
+                except BaseException as exc:
+                    call.future.set_exception(exc)
+                else:
+                    call.future.set_result(result)
+        finally:
+            failed = []
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                if call.key is not None:
+                    self._next(call.key, failed)
+            for queued, exc in failed:
+                self._fail(queued, exc)
+
+    def _next(self, key, failed):
+        """
+        Dispatch the next call queued for key, appending the calls the
+        pool refused to failed, or forget key once its queue is empty.
+        Must be called holding self._lock.
+        """
+        queue = self._queues[key]
+        while queue:
+            queued = queue.popleft()
+            error = self._dispatch(queued)
+            if error is None:
+                return
+            failed.append((queued, error))
+        del self._queues[key]
+        self._drained.notify_all()
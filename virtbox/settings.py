@@ -0,0 +1,469 @@
+# -*- coding: utf-8 -*-
+
+"""
+virtbox.settings
+~~~~~~~~
+
+This module answers read queries straight from the VirtualBox settings
+files instead of running VBoxManage: the global VirtualBox.xml holding the
+machine and media registries, and the .vbox file of every machine.
+
+    >>> set_read_backend('settings')
+    >>> virtbox.manage.list_vms()
+    [{'name': 'jangofett', 'uuid': 'f4b0a749-820b-43c2-967e-a7a5f539cfd7'}]
+
+Files are read with an incremental iterparse and the result is kept until
+the file's mtime or size changes. Whenever a file is missing, being
+written or unreadable SettingsUnavailable is raised, and virtbox.manage
+asks VBoxManage instead.
+
+The settings files only record what is persisted: showvminfo records have
+no vmstate unless the vm is saved or aborted, and list_hdds records have
+no state or capacity. showhdinfo reads the image header, see
+virtbox.hdimage.
+
+:copyright: (c) 2012 by Sean Plaice.
+:license: ISC, see LICENSE for more details.
+
+"""
+
+import os
+import logging
+
+from .errors import (CommandError, SettingsUnavailable, ImageFormatError,
+        VirtboxMissingArgument)
+from .models import VMInfo
+from .constants import READ_BACKEND, READ_BACKENDS
+
+
+# setup module level logger
+LOGGER = logging.getLogger(__name__)
+
+# settings file suffix VirtualBox writes to before renaming it into place
+WRITE_SUFFIX = '-tmp'
+
+# .vbox storage controller types spelled differently by showvminfo
+STORAGECTL_TYPES = {'AHCI': 'IntelAhci'}
+
+# .vbox network attachment element -> (nic value, showvminfo key of the
+# attachment's name attribute)
+NIC_ATTACHMENTS = {
+    'NAT': ('nat', None),
+    'BridgedInterface': ('bridged', 'bridgeadapter'),
+    'InternalNetwork': ('intnet', 'intnet'),
+    'HostOnlyInterface': ('hostonly', 'hostonlyadapter'),
+    'GenericInterface': ('generic', 'nicgenericdrv'),
+}
+
+# .vbox promiscuousModePolicy -> showvminfo nicpromisc
+NIC_PROMISC_POLICIES = {'Deny': 'deny', 'AllowNetwork': 'allow-vms',
+    'AllowAll': 'allow-all'}
+
+_backend = READ_BACKEND
+# path of VirtualBox.xml, None looks it up in the VirtualBox home
+_registry_path = None
+# settings file path -> ((mtime, size), parse result)
+_parsed = {}
+# os type id -> description, filled from list ostypes on first use
+_ostypes = None
+
+
+def set_read_backend(backend):
+    """
+    Set where list_vms, showvminfo, list_hdds and showhdinfo read from, see
+    virtbox.constants.READ_BACKENDS.
+    """
+    global _backend
+    if backend not in READ_BACKENDS:
+        raise ValueError('unknown read backend %s' % backend)
+    _backend = backend
+
+
+def get_read_backend():
+    """
+    """
+    return _backend
+
+
+def set_registry_path(path):
+    """
+    Read the machine and media registries from path, None looks for
+    VirtualBox.xml where VirtualBox keeps it.
+    """
+    global _registry_path
+    _registry_path = path
+
+
+def registry_path():
+    """
+    Return the path of VirtualBox.xml: in $VBOX_USER_HOME if set, else in
+    ~/.config/VirtualBox when it exists or ~/.VirtualBox.
+    """
+    if _registry_path is not None:
+        return _registry_path
+    home = os.environ.get('VBOX_USER_HOME')
+    if not home:
+        home = os.path.expanduser(os.path.join('~', '.config', 'VirtualBox'))
+        if not os.path.isdir(home):
+            home = os.path.expanduser(os.path.join('~', '.VirtualBox'))
+    return os.path.join(home, 'VirtualBox.xml')
+
+
+def clear():
+    """
+    Forget every parsed settings file.
+    """
+    global _ostypes
+    _parsed.clear()
+    _ostypes = None
+
+
+def invalidate(path):
+    """
+    Forget the parse of the settings file path.
+    """
+    _parsed.pop(path, None)
+
+
+def machines(registry=None):
+    """
+    Return (uuid, .vbox path) pairs of the vms registered in registry,
+    by default registry_path().
+    """
+    return _load(registry or registry_path(), _parse_registry)['machines']
+
+
+def list_vms():
+    """
+    Return a {'name', 'uuid'} dict per registered vm, like list vms.
+    """
+    vms = []
+    for uuid, path in machines():
+        machine = _load(path, _parse_machine)
+        vms.append({'name': machine['raw']['name'], 'uuid': uuid})
+    return vms
+
+
+def showvminfo(name=None, uuid=None):
+    """
+    Return the virtbox.models.VMInfo of the vm with uuid or name.
+    """
+    registry = _load(registry_path(), _parse_registry)
+    for machine_uuid, path in registry['machines']:
+        if uuid is not None and machine_uuid != uuid:
+            continue
+        machine = _load(path, _parse_machine)
+        if uuid is None and machine['raw']['name'] != name:
+            continue
+        return _vminfo(machine, registry)
+    # let VBoxManage report the vm as not found
+    raise SettingsUnavailable(reason='vm %s not registered' % (uuid or name),
+            path=registry_path())
+
+
+def list_hdds():
+    """
+    Return a dict per registered hard disk, like list hdds, with uuid,
+    parent_uuid, type, location and storage_format.
+    """
+    registry = _load(registry_path(), _parse_registry)
+    hdds = list(registry['hdds'])
+    seen = set(hdd['uuid'] for hdd in hdds)
+    # media used by a single vm are registered in its .vbox file
+    for _, path in registry['machines']:
+        for hdd in _load(path, _parse_machine)['hdds']:
+            if hdd['uuid'] not in seen:
+                seen.add(hdd['uuid'])
+                hdds.append(hdd)
+    return hdds
+
+
+def showhdinfo(uuid=None, filename=None):
+    """
+    Return the showhdinfo details of the hard disk with uuid, or the image
+    at filename, from the image header and the medium registries.
+    """
+    if uuid is None and filename is None:
+        raise VirtboxMissingArgument('kwarg uuid or filename is required.')
+
+    hdds = list_hdds()
+    if uuid is not None:
+        for hdd in hdds:
+            if hdd['uuid'] == uuid:
+                filename = hdd['location']
+                break
+        else:
+            raise SettingsUnavailable(reason='hdd %s not registered' % uuid,
+                    path=registry_path())
+
+    from .hdimage import read_header
+    try:
+        hd_info = read_header(filename)
+    except (ImageFormatError, OSError) as exc:
+        raise SettingsUnavailable(reason=str(exc), path=filename)
+    # the medium type is only recorded in the registry
+    location = hd_info['location']
+    for hdd in hdds:
+        if hdd['location'] == location:
+            hd_info['type'] = hdd['type']
+            break
+    return hd_info
+
+
+def _load(path, parse):
+    """
+    Return parse(path), reparsing only when the file changed.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError as exc:
+        raise SettingsUnavailable(reason=exc.strerror, path=path)
+    if os.path.exists(path + WRITE_SUFFIX):
+        raise SettingsUnavailable(reason='being written', path=path)
+
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    entry = _parsed.get(path)
+    if entry is not None and entry[0] == stamp:
+        return entry[1]
+
+    try:
+        result = parse(path)
+    except (IOError, OSError) as exc:
+        raise SettingsUnavailable(reason=exc.strerror, path=path)
+    except SyntaxError as exc:
+        # xml.etree.ElementTree.ParseError, e.g. a file truncated mid-write
+        raise SettingsUnavailable(reason=str(exc), path=path)
+    _parsed[path] = (stamp, result)
+    return result
+
+
+def _iterparse(path):
+    """
+    Yield (event, tag, element, stack) for the start and end of every
+    element of path, tags without their namespace. stack holds the tags of
+    the open elements, the current one last. Elements are cleared once
+    ended so memory use does not grow with the file.
+    """
+    from xml.etree.ElementTree import iterparse
+
+    stack = []
+    for event, elem in iterparse(path, events=('start', 'end')):
+        tag = elem.tag.rpartition('}')[2]
+        if event == 'start':
+            stack.append(tag)
+            yield event, tag, elem, stack
+        else:
+            yield event, tag, elem, stack
+            stack.pop()
+            elem.clear()
+
+
+class _Media(object):
+    """ Collects the media of a MediaRegistry element.
+    """
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        # uuid -> location of every medium
+        self.locations = {}
+        self.hdds = []
+        self._parents = []
+
+    def start(self, tag, attrib):
+        """
+        """
+        if tag == 'HardDisk':
+            uuid = _uuid(attrib.get('uuid'))
+            location = _location(self.base_dir, attrib.get('location'))
+            parent = self._parents[-1] if self._parents else None
+            self.locations[uuid] = location
+            self.hdds.append({'uuid': uuid,
+                'parent_uuid': parent or 'base',
+                'type': '%s (%s)' % (attrib.get('type', 'Normal').lower(),
+                    'differencing' if parent else 'base'),
+                'location': location,
+                'storage_format': attrib.get('format')})
+            self._parents.append(uuid)
+        elif tag == 'Image':
+            self.locations[_uuid(attrib.get('uuid'))] = _location(
+                    self.base_dir, attrib.get('location'))
+
+    def end(self, tag):
+        """
+        """
+        if tag == 'HardDisk':
+            self._parents.pop()
+
+
+def _parse_registry(path):
+    """
+    Return the registered machines as (uuid, .vbox path) pairs and the
+    globally registered media of VirtualBox.xml.
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    media = _Media(base_dir)
+    machines = []
+    for event, tag, elem, stack in _iterparse(path):
+        if 'MediaRegistry' in stack:
+            if event == 'start':
+                media.start(tag, elem.attrib)
+            else:
+                media.end(tag)
+        elif event == 'start' and tag == 'MachineEntry':
+            machines.append((_uuid(elem.get('uuid')),
+                _location(base_dir, elem.get('src'))))
+    return {'machines': machines, 'media': media.locations,
+            'hdds': media.hdds}
+
+
+def _parse_machine(path):
+    """
+    Return the showvminfo --machinereadable keys a .vbox file records,
+    its storage attachments and the media registered in it.
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    media = _Media(base_dir)
+    raw = {'CfgFile': os.path.abspath(path)}
+    # [controller, port, device, medium uuid or None, device type]
+    attachments = []
+    controller = None
+    controller_index = -1
+    nic = None
+    attachment = None
+
+    for event, tag, elem, stack in _iterparse(path):
+        if 'MediaRegistry' in stack:
+            if event == 'start':
+                media.start(tag, elem.attrib)
+            else:
+                media.end(tag)
+            continue
+        if 'Snapshot' in stack:
+            # snapshots hold copies of the hardware as it was back then
+            continue
+
+        attrib = elem.attrib
+        parent = stack[-2] if len(stack) > 1 else None
+        if event == 'end':
+            if tag == 'Description' and parent == 'Machine':
+                raw['description'] = elem.text or ''
+            elif tag == 'AttachedDevice':
+                attachments.append(attachment)
+            continue
+
+        if tag == 'Machine':
+            raw['name'] = attrib.get('name')
+            raw['UUID'] = _uuid(attrib.get('uuid'))
+            raw['ostype'] = attrib.get('OSType')
+            raw['SnapFldr'] = _location(base_dir,
+                    attrib.get('snapshotFolder', 'Snapshots'))
+            if attrib.get('stateFile'):
+                raw['VMState'] = 'saved'
+            elif attrib.get('aborted') == 'true':
+                raw['VMState'] = 'aborted'
+            if attrib.get('lastStateChange'):
+                raw['VMStateChangeTime'] = attrib['lastStateChange']
+        elif tag == 'CPU' and parent == 'Hardware':
+            raw['cpus'] = attrib.get('count', '1')
+        elif tag == 'Memory' and parent == 'Hardware':
+            raw['memory'] = attrib.get('RAMSize')
+        elif tag == 'Display' and parent == 'Hardware':
+            raw['vram'] = attrib.get('VRAMSize', '8')
+        elif tag == 'Adapter' and parent == 'Network':
+            nic = int(attrib.get('slot', '0')) + 1
+            enabled = attrib.get('enabled') == 'true'
+            raw['nic%d' % nic] = 'null' if enabled else 'none'
+            if enabled:
+                raw['nictype%d' % nic] = attrib.get('type', 'Am79C973')
+                raw['macaddress%d' % nic] = attrib.get('MACAddress', '')
+                raw['cableconnected%d' % nic] = _switch(attrib.get('cable',
+                    'true'))
+                raw['nicspeed%d' % nic] = attrib.get('speed', '0')
+                raw['nicpromisc%d' % nic] = NIC_PROMISC_POLICIES.get(
+                        attrib.get('promiscuousModePolicy', 'Deny'), 'deny')
+                raw['nicbootprio%d' % nic] = attrib.get('bootPriority', '0')
+        elif tag in NIC_ATTACHMENTS and parent == 'Adapter':
+            if raw['nic%d' % nic] != 'none':
+                value, name_key = NIC_ATTACHMENTS[tag]
+                raw['nic%d' % nic] = value
+                if name_key is not None:
+                    name = attrib.get('name') or attrib.get('driver', '')
+                    raw['%s%d' % (name_key, nic)] = name
+        elif tag == 'StorageController':
+            controller = attrib.get('name')
+            controller_index += 1
+            index = controller_index
+            raw['storagecontrollername%d' % index] = controller
+            raw['storagecontrollertype%d' % index] = STORAGECTL_TYPES.get(
+                    attrib.get('type'), attrib.get('type'))
+            raw['storagecontrollerportcount%d' % index] = attrib.get(
+                    'PortCount', '0')
+            raw['storagecontrollerbootable%d' % index] = _switch(
+                    attrib.get('Bootable', 'true'))
+        elif tag == 'AttachedDevice':
+            attachment = [controller, attrib.get('port', '0'),
+                    attrib.get('device', '0'), None, attrib.get('type')]
+        elif tag == 'Image' and parent == 'AttachedDevice':
+            attachment[3] = _uuid(attrib.get('uuid'))
+
+    return {'raw': raw, 'attachments': attachments,
+            'media': media.locations, 'hdds': media.hdds}
+
+
+def _vminfo(machine, registry):
+    """
+    Return the VMInfo of a parsed machine, looking its media up in the
+    machine's own and the global media registry.
+    """
+    raw = dict(machine['raw'])
+    if raw.get('ostype'):
+        raw['ostype'] = _ostype_description(raw['ostype'])
+    for controller, port, device, uuid, device_type in \
+            machine['attachments']:
+        key = '%s-%s-%s' % (controller, port, device)
+        if uuid is None:
+            raw[key] = 'emptydrive' if device_type != 'HardDisk' else 'none'
+            continue
+        location = machine['media'].get(uuid) or \
+                registry['media'].get(uuid)
+        raw[key] = location or uuid
+        raw['%s-ImageUUID-%s-%s' % (controller, port, device)] = uuid
+    return VMInfo(raw)
+
+
+def _ostype_description(os_type):
+    """
+    Return the description showvminfo prints for the os type id the .vbox
+    file records, e.g. "Ubuntu (64 bit)" for Ubuntu_64.
+    """
+    global _ostypes
+    if _ostypes is None:
+        # cached on disk per VirtualBox version, see virtbox.cache
+        from .manage import list_ostypes
+        try:
+            _ostypes = dict((ostype['os_type'], ostype['os_desc'])
+                    for ostype in list_ostypes())
+        except CommandError as exc:
+            LOGGER.warning('os type descriptions unavailable: %s' % exc)
+            _ostypes = {}
+    return _ostypes.get(os_type, os_type)
+
+
+def _uuid(value):
+    """
+    """
+    return value.strip('{}') if value else value
+
+
+def _location(base_dir, location):
+    """
+    Resolve a location relative to the settings file it is recorded in.
+    """
+    if not location:
+        return location
+    return os.path.normpath(os.path.join(base_dir, location))
+
+
+def _switch(value):
+    """
+    """
+    return 'on' if value == 'true' else 'off'
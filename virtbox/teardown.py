@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+
+"""
+virtbox.teardown
+~~~~~~~~
+
+This module removes vms and disk images in bulk, e.g. what a CI job left
+behind, in place of looping over unregistervm one vm at a time:
+
+    >>> report = teardown(prefix='ci-', older_than=3600)
+    >>> [vm['name'] for vm in report['vms']]
+    ['ci-jangofett', 'ci-bobafett']
+
+Running vms are powered off, then unregistered with their disks deleted,
+up to workers vms at a time. The calls for one vm go through a
+virtbox.scheduler.Scheduler keyed by its uuid, so they never overlap each
+other or other calls made through a shared scheduler, and a session lock
+VirtualBox still holds after the poweroff is waited out with retry.
+Afterwards unregistered image files in stray_dirs are deleted and, with
+media, every hard disk on the host no vm uses is closed and deleted,
+children before their parents.
+
+With dry_run nothing is changed and the report lists what would have
+been removed. Selection is by name prefix (the file name for images) and
+by age, the time since the .vbox file or image was last modified.
+
+python -m virtbox.teardown does the same from the command line, see
+--help.
+
+:copyright: (c) 2012 by Sean Plaice.
+:license: ISC, see LICENSE for more details.
+
+"""
+
+import os
+import time
+import logging
+
+from . import manage as _manage
+from .utils import fan_out
+from .retry import RetryPolicy
+from .errors import CommandError
+from .scheduler import Scheduler
+from .constants import FANOUT_WORKERS
+
+
+# setup module level logger
+LOGGER = logging.getLogger(__name__)
+
+# vm states that need a poweroff before the vm can be unregistered
+POWEROFF_STATES = ('running', 'paused', 'stuck')
+
+# extensions of the image files looked for in stray_dirs
+IMAGE_EXTENSIONS = ('.vdi', '.vmdk', '.vhd')
+
+# waits out the session lock a vm keeps for a moment after poweroff
+DEFAULT_RETRY = RetryPolicy(max_attempts=6, base_delay=0.5, max_delay=4.0)
+
+
+class Teardown(object):
+    """ Selects and removes vms, orphaned media and stray image files.
+
+        prefix and older_than (seconds) restrict what is removed, None
+        selects everything. vms=False leaves the vms alone, media=True
+        also removes the registered hard disks no vm uses, wherever they
+        are. Only files ending in one of extensions are looked for in
+        stray_dirs. retry is the RetryPolicy for poweroff, unregistervm
+        and closemedium, scheduler a Scheduler to share with other callers
+        instead of a private one of workers threads, and manage the module
+        whose list_vms, iter_hdds, controlvm, unregistervm and closemedium
+        are used, virtbox.manage by default.
+        Media are always listed through VBoxManage, the settings files do
+        not say which vms use them.
+    """
+
+    def __init__(self, prefix=None, older_than=None, dry_run=False,
+            workers=FANOUT_WORKERS, vms=True, media=False, stray_dirs=(),
+            extensions=IMAGE_EXTENSIONS, retry=None, scheduler=None,
+            manage=None):
+        self.prefix = prefix
+        self.older_than = older_than
+        self.dry_run = dry_run
+        self.workers = workers
+        self.vms = vms
+        self.media = media
+        self.stray_dirs = stray_dirs
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.retry = retry or DEFAULT_RETRY
+        self._scheduler = scheduler
+        self._manage = manage or _manage
+
+    def select_vms(self):
+        """
+        Return the VMInfo records of the vms to remove.
+        """
+        if not self.vms:
+            return []
+        return [vm for vm in self._manage.list_vms(long=True)
+                if self._selected(vm['name'], vm.get('cfgfile'))]
+
+    def select_media(self, hdds):
+        """
+        Return the list hdds records among hdds of the hard disks no vm
+        uses that are to be removed. Media of the vms being removed are
+        deleted along with them by unregistervm.
+        """
+        return [hdd for hdd in hdds
+                if not hdd.get('in_use_by_vms') and
+                self._selected(os.path.basename(hdd['location']),
+                    hdd['location'])]
+
+    def select_files(self, registered=()):
+        """
+        Return the image files in stray_dirs that are not at one of the
+        registered locations.
+        """
+        registered = set(registered)
+        files = []
+        for directory in self.stray_dirs:
+            try:
+                names = sorted(os.listdir(directory))
+            except OSError as exc:
+                LOGGER.debug('skipping %s: %s' % (directory, exc))
+                continue
+            for name in names:
+                path = os.path.join(directory, name)
+                if name.lower().endswith(self.extensions) and \
+                        path not in registered and os.path.isfile(path) and \
+                        self._selected(name, path):
+                    files.append(path)
+        return files
+
+    def run(self):
+        """
+        Remove the selected vms, then media and stray files. Returns a
+        report dict with the removed vms, media and files and the errors
+        met, each a dict with the target and the error.
+        """
+        report = {'dry_run': self.dry_run, 'vms': [], 'media': [],
+                'files': [], 'errors': []}
+
+        vms = self.select_vms()
+        if self.dry_run:
+            report['vms'] = [self._vm_entry(vm,
+                vm.get('vmstate') in POWEROFF_STATES) for vm in vms]
+        else:
+            self._remove_vms(vms, report)
+
+        if self.media or self.stray_dirs:
+            hdds = list(self._manage.iter_hdds())
+            if self.media:
+                orphans = self.select_media(hdds)
+                if self.dry_run:
+                    report['media'] = [_medium_entry(hdd)
+                            for hdd in orphans]
+                else:
+                    self._remove_media(orphans, report)
+
+            registered = [hdd['location'] for hdd in hdds]
+            for path in self.select_files(registered):
+                if not self.dry_run:
+                    try:
+                        os.remove(path)
+                    except OSError as exc:
+                        report['errors'].append({'file': path,
+                            'error': str(exc)})
+                        continue
+                report['files'].append(path)
+
+        LOGGER.info('%s %d vms, %d media and %d files, %d errors' %
+                ('would remove' if self.dry_run else 'removed',
+                    len(report['vms']), len(report['media']),
+                    len(report['files']), len(report['errors'])))
+        return report
+
+    def _selected(self, name, path):
+        """
+        """
+        if self.prefix is not None and not (name or '').startswith(
+                self.prefix):
+            return False
+        if self.older_than is None:
+            return True
+        try:
+            modified = os.stat(path).st_mtime
+        except (OSError, TypeError):
+            # an inaccessible vm or image has no age, it is fair game
+            return True
+        return time.time() - modified >= self.older_than
+
+    def _remove_vms(self, vms, report):
+        """
+        """
+        scheduler = self._scheduler or Scheduler(limit=self.workers)
+        try:
+            futures = [(vm, scheduler.submit(self._remove_vm, key=vm['uuid'],
+                vm=vm)) for vm in vms]
+            for vm, future in futures:
+                try:
+                    report['vms'].append(self._vm_entry(vm,
+                        future.result()))
+                except CommandError as exc:
+                    LOGGER.warning('could not remove vm %s: %s' %
+                            (vm['name'], exc))
+                    report['errors'].append({'vm': vm['uuid'],
+                        'error': str(exc)})
+        finally:
+            if self._scheduler is None:
+                scheduler.shutdown()
+
+    def _remove_vm(self, vm):
+        """
+        Power off and delete vm. Returns whether it had to be powered off.
+        """
+        powered_off = vm.get('vmstate') in POWEROFF_STATES
+        if powered_off:
+            try:
+                self.retry.call(self._manage.controlvm, vm_uuid=vm['uuid'],
+                        action='poweroff')
+            except CommandError as exc:
+                # it may have stopped on its own in the meantime
+                LOGGER.debug('poweroff of %s failed: %s' % (vm['name'], exc))
+        self.retry.call(self._manage.unregistervm, uuid=vm['uuid'],
+                delete=True)
+        return powered_off
+
+    def _vm_entry(self, vm, powered_off):
+        """
+        """
+        return {'name': vm['name'], 'uuid': vm['uuid'],
+                'powered_off': powered_off}
+
+    def _remove_media(self, media, report):
+        """
+        Close and delete media, children before their parents.
+        """
+        for wave in _waves(media):
+            for uuid, result in fan_out(self._remove_medium, wave, 'uuid',
+                    workers=self.workers):
+                hdd = wave[uuid]
+                if isinstance(result, Exception):
+                    LOGGER.warning('could not remove medium %s: %s' %
+                            (hdd['location'], result))
+                    report['errors'].append({'medium': uuid,
+                        'error': str(result)})
+                else:
+                    report['media'].append(_medium_entry(hdd))
+
+    def _remove_medium(self, uuid):
+        """
+        """
+        return self.retry.call(self._manage.closemedium, medium_type='disk',
+                uuid=uuid, delete=True)
+
+
+def teardown(**kwargs):
+    """
+    Run a Teardown made with kwargs and return its report.
+    """
+    return Teardown(**kwargs).run()
+
+
+def _medium_entry(hdd):
+    """
+    """
+    return {'uuid': hdd['uuid'], 'location': hdd['location']}
+
+
+def _waves(media):
+    """
+    Split media into dicts keyed by uuid, deepest differencing images
+    first, so every medium is closed after the children among media.
+    """
+    by_uuid = dict((hdd['uuid'], hdd) for hdd in media)
+    depths = {}
+    for uuid in by_uuid:
+        depth = 0
+        parent = by_uuid[uuid].get('parent_uuid')
+        seen = set([uuid])
+        while parent in by_uuid and parent not in seen:
+            seen.add(parent)
+            depth += 1
+            parent = by_uuid[parent].get('parent_uuid')
+        depths[uuid] = depth
+    return [dict((uuid, by_uuid[uuid]) for uuid in by_uuid
+                if depths[uuid] == depth)
+            for depth in sorted(set(depths.values()), reverse=True)]
+
+
+def main(argv=None):
+    """
+    """
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python -m virtbox.teardown',
+            description='Remove vms, orphaned hard disks and stray images.')
+    parser.add_argument('--prefix', help='only names starting with PREFIX')
+    parser.add_argument('--older-than', type=float, metavar='SECONDS',
+            help='only vms and images unchanged for SECONDS')
+    parser.add_argument('--dry-run', action='store_true',
+            help='report what would be removed')
+    parser.add_argument('--workers', type=int, default=FANOUT_WORKERS)
+    parser.add_argument('--no-vms', dest='vms', action='store_false',
+            help='leave the vms alone')
+    parser.add_argument('--orphaned-media', dest='media',
+            action='store_true',
+            help='also delete every hard disk on the host no vm uses')
+    parser.add_argument('--stray-dir', dest='stray_dirs', action='append',
+            default=[], metavar='DIR',
+            help='also delete unregistered images in DIR')
+    parser.add_argument('--extension', dest='extensions', action='append',
+            metavar='EXT', help='only images in a stray dir ending in EXT, '
+            'default %s' % ' '.join(IMAGE_EXTENSIONS))
+    args = parser.parse_args(argv)
+
+    report = teardown(prefix=args.prefix, older_than=args.older_than,
+            dry_run=args.dry_run, workers=args.workers, vms=args.vms,
+            media=args.media, stray_dirs=args.stray_dirs,
+            extensions=args.extensions or IMAGE_EXTENSIONS)
+
+    action = 'Would nuke' if args.dry_run else 'Nuked'
+    for vm in report['vms']:
+        print('%s VM %s (%s)' % (action, vm['name'], vm['uuid']))
+    for hdd in report['media']:
+        print('%s hdd %s' % (action, hdd['location']))
+    for path in report['files']:
+        print('%s file %s' % (action, path))
+    if not any(report[kind] for kind in ('vms', 'media', 'files')):
+        print('Nothing to nuke.')
+    for error in report['errors']:
+        sys.stderr.write('failed: %s\n' % error)
+    return 1 if report['errors'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
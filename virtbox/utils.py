@@ -13,33 +13,262 @@ that are also useful for external consumption.
 """
 
 import os
+import time
+import shlex
 import logging
 import string
 import random
-import envoy
+import contextlib
+import contextvars
+import subprocess
 
-from .errors import CommandError
+from .errors import CommandError, CommandTimeout, CommandCancelled
+from . import executor as _default_executor
+from .executor import Cancelled
+from .retry import get_retry_policy
+from .constants import FANOUT_WORKERS, COMMAND_TIMEOUT
 
 
 # setup module level logger
 LOGGER = logging.getLogger(__name__)
 
+_default_timeout = COMMAND_TIMEOUT
+# what runs argv lists: anything with the execute and stream functions of
+# virtbox.executor, e.g. a virtbox.cassette.Recorder or Replayer
+_executor = _default_executor
+# (monotonic expiry or None, cancel event or None) of the innermost deadline
+_deadline = contextvars.ContextVar('virtbox_deadline', default=(None, None))
 
-def run_cmd(cmd):
+
+def run_cmd(cmd, retry=None, timeout=None):
+    """
+    Run a command and return its (stdout, stderr).
+
+    cmd is preferably a prebuilt argv list; a plain string is still accepted
+    and split once with shlex. Raises CommandError on a non-zero exit.
+    Transient failures are retried according to retry, a
+    virtbox.retry.RetryPolicy, or the policy set with set_retry_policy.
+
+    Each attempt is limited to timeout seconds (default: the one set with
+    set_default_timeout) and to what is left of any enclosing deadline();
+    on expiry the command is killed and CommandTimeout raised.
+    """
+    argv = to_argv(cmd)
+
+    policy = retry if retry is not None else get_retry_policy()
+    if policy is None:
+        return _run_argv(argv, timeout)
+    return policy.call(_run_argv, argv, timeout)
+
+
+def _run_argv(argv, timeout=None):
+    """
+    """
+    timeout, cancel = command_timeout(timeout)
+    if timeout == 0:
+        raise CommandTimeout(timeout=0, cmd=format_cmd(argv))
+
+    try:
+        status_code, stdout, stderr = _executor.execute(argv,
+                timeout=timeout, cancel=cancel)
+    except OSError as exc:
+        status_code, stdout, stderr = 127, '', exc.strerror or str(exc)
+    except subprocess.TimeoutExpired as exc:
+        LOGGER.error('cmd: %s killed after %.1fs' % (format_cmd(argv),
+            timeout))
+        raise CommandTimeout(timeout=timeout, cmd=format_cmd(argv),
+                stdout=_decode(exc.output), stderr=_decode(exc.stderr))
+    except Cancelled as exc:
+        LOGGER.error('cmd: %s cancelled' % format_cmd(argv))
+        raise CommandCancelled(cmd=format_cmd(argv),
+                stdout=_decode(exc.output), stderr=_decode(exc.stderr))
+
+    return check_result(argv, status_code, stdout, stderr)
+
+
+def iter_cmd(cmd, timeout=None):
+    """
+    Run a command and yield its stdout line by line as it is produced,
+    without holding the whole output in memory. Raises CommandError once
+    stdout is exhausted if the command failed.
+
+    timeout and deadline() apply as for run_cmd. Streamed commands are not
+    retried since lines may already have been consumed.
+    """
+    argv = to_argv(cmd)
+    timeout, cancel = command_timeout(timeout)
+    if timeout == 0:
+        raise CommandTimeout(timeout=0, cmd=format_cmd(argv))
+
+    try:
+        status_code, stderr = yield from _executor.stream(argv,
+                timeout=timeout, cancel=cancel)
+    except OSError as exc:
+        status_code, stderr = 127, exc.strerror or str(exc)
+    except subprocess.TimeoutExpired:
+        LOGGER.error('cmd: %s killed after %.1fs' % (format_cmd(argv),
+            timeout))
+        raise CommandTimeout(timeout=timeout, cmd=format_cmd(argv))
+    except Cancelled:
+        LOGGER.error('cmd: %s cancelled' % format_cmd(argv))
+        raise CommandCancelled(cmd=format_cmd(argv))
+
+    check_result(argv, status_code, '', stderr)
+
+
+def _decode(data):
+    """
+    """
+    return (data or b'').decode('utf-8', 'replace')
+
+
+def set_executor(executor):
+    """
+    Run commands with executor, an object with the execute and stream
+    functions of virtbox.executor, in place of spawning them directly.
+    None restores virtbox.executor.
+    """
+    global _executor
+    _executor = executor or _default_executor
+
+
+def get_executor():
+    """
+    Return the executor commands are run with.
+    """
+    return _executor
+
+
+def set_default_timeout(seconds):
     """
+    Set the timeout applied to commands run without an explicit one, None
+    disables it.
     """
-    res = envoy.run(cmd)
-    if res.status_code:
+    global _default_timeout
+    _default_timeout = seconds
+
+
+@contextlib.contextmanager
+def deadline(seconds=None, cancel=None):
+    """
+    Bound every command run inside the block, including those run by
+    higher level helpers, fan_out workers and scheduled calls, to finish
+    within seconds from now. Setting the threading.Event cancel kills the
+    running command and raises CommandCancelled. Nested deadlines can only
+    shorten the enclosing one.
+
+        >>> with deadline(120):
+        ...     vm = generate_vm()
+        ...     modifyvm(vm_uuid=vm['uuid'], memory='256')
+    """
+    outer_expires, outer_cancel = _deadline.get()
+    expires = time.monotonic() + seconds if seconds is not None else None
+    if outer_expires is not None and (expires is None or
+            outer_expires < expires):
+        expires = outer_expires
+
+    token = _deadline.set((expires, cancel or outer_cancel))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time():
+    """
+    Return the seconds left before the enclosing deadline, or None.
+    """
+    expires, _ = _deadline.get()
+    if expires is None:
+        return None
+    return max(expires - time.monotonic(), 0)
+
+
+def command_timeout(timeout=None):
+    """
+    Return the (timeout, cancel event) to run a command with, combining
+    timeout or the default timeout with the enclosing deadline.
+    """
+    if timeout is None:
+        timeout = _default_timeout
+    remaining = remaining_time()
+    if remaining is not None and (timeout is None or remaining < timeout):
+        timeout = remaining
+    return (timeout, _deadline.get()[1])
+
+
+def to_argv(cmd):
+    """
+    Return cmd as an argv list, splitting plain strings with shlex.
+    """
+    if isinstance(cmd, str):
+        return shlex.split(cmd)
+    return list(cmd)
+
+
+def check_result(argv, status_code, stdout, stderr):
+    """
+    Log the outcome of running argv and return its (stdout, stderr), raising
+    CommandError on a non-zero status_code.
+    """
+    cmd = format_cmd(argv)
+    if status_code:
         LOGGER.error('cmd: %s status_code: %d stdout: %s stderr: %s' %
-            (cmd, res.status_code, res.std_out.replace('\n', ' '),
-                res.std_err.replace('\n', ' ')))
-        raise CommandError(status_code=res.status_code, cmd=cmd,
-            stdout=res.std_out, stderr=res.std_err)
+            (cmd, status_code, stdout.replace('\n', ' '),
+                stderr.replace('\n', ' ')))
+        raise CommandError(status_code=status_code, cmd=cmd,
+            stdout=stdout, stderr=stderr)
 
     LOGGER.debug('cmd: %s status_code: %d stdout: %s stderr: %s' % (cmd,
-        res.status_code, res.std_out.replace('\n', ' '),
-        res.std_err.replace('\n', ' ')))
-    return (res.std_out, res.std_err)
+        status_code, stdout.replace('\n', ' '),
+        stderr.replace('\n', ' ')))
+    return (stdout, stderr)
+
+
+def format_cmd(argv):
+    """
+    Render an argv list as a shell-quoted string for logs and errors.
+    """
+    return ' '.join(shlex.quote(str(arg)) for arg in argv)
+
+
+def fan_out(func, keys, kwarg, workers=FANOUT_WORKERS):
+    """
+    Call func(**{kwarg: key}) for every key on a pool of at most workers
+    threads and yield (key, result) pairs in completion order. A failing
+    call yields the exception it raised as its result instead of aborting
+    the remaining keys.
+    """
+    from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+    keys = iter(keys)
+    pending = {}
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            # keep the pool fed without materializing every future up front
+            for key in keys:
+                # run in a copy of the caller's context to keep its deadline
+                context = contextvars.copy_context()
+                pending[pool.submit(context.run, func, **{kwarg: key})] = key
+                if len(pending) >= workers * 2:
+                    break
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as exc:
+                    LOGGER.debug('fan_out %s(%s=%s) failed: %s' %
+                            (func.__name__, kwarg, key, exc))
+                    result = exc
+                yield (key, result)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
 
 
 def id_generator(size=6, chars=string.ascii_lowercase + string.digits):
@@ -48,18 +277,21 @@ def id_generator(size=6, chars=string.ascii_lowercase + string.digits):
     return ''.join(random.choice(chars) for x in range(size))
 
 
-def generate_vm(**kwargs):
+def generate_vm(timeout=None, **kwargs):
     """
+    timeout bounds the whole call, see deadline().
     """
     from .manage import createvm
     data = {'name': id_generator(7),
             'ostype': 'Linux'}
     data.update(kwargs)
-    return createvm(**data)
+    with deadline(timeout):
+        return createvm(**data)
 
 
-def delete_vm(**kwargs):
+def delete_vm(timeout=None, **kwargs):
     """
+    timeout bounds the whole call, see deadline().
     """
     from .manage import unregistervm
     data = {'delete': True}
@@ -67,11 +299,13 @@ def delete_vm(**kwargs):
     # prune unneeded / unexpected kwargs
     if data.get('file_path'):
         del data['file_path']
-    return unregistervm(**data)
+    with deadline(timeout):
+        return unregistervm(**data)
 
 
-def generate_hd(**kwargs):
+def generate_hd(timeout=None, **kwargs):
     """
+    timeout bounds the whole call, see deadline().
     """
     from .manage import createhd
     filename = '%s.vdi' % id_generator()
@@ -80,7 +314,8 @@ def generate_hd(**kwargs):
             'variant': 'Standard',
             'filename': os.path.join('/tmp', filename)}
     data.update(kwargs)
-    createhd(**data)
+    with deadline(timeout):
+        createhd(**data)
     return data
 
 
@@ -92,8 +327,9 @@ def delete_hd(**kwargs):
     os.remove(data['filename'])
 
 
-def generate_ctl(**kwargs):
+def generate_ctl(timeout=None, **kwargs):
     """
+    timeout bounds the whole call, see deadline().
     """
     from .manage import storagectl_add
     data = {'name': 'primary',
@@ -101,12 +337,14 @@ def generate_ctl(**kwargs):
             'sataportcount': 2,
             'bootable': 'on'}
     data.update(kwargs)
-    storagectl_add(**data)
+    with deadline(timeout):
+        storagectl_add(**data)
     return data
 
 
-def delete_ctl(**kwargs):
+def delete_ctl(timeout=None, **kwargs):
     """
+    timeout bounds the whole call, see deadline().
     """
     from .manage import storagectl_remove
     data = {'name': 'primary'}
@@ -120,4 +358,5 @@ def delete_ctl(**kwargs):
         del data['sataportcount']
     if data.get('bootable'):
         del data['bootable']
-    return storagectl_remove(**data)
+    with deadline(timeout):
+        return storagectl_remove(**data)
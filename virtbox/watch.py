@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+
+"""
+virtbox.watch
+~~~~~~~~
+
+This module watches the VirtualBox settings files, VirtualBox.xml and the
+.vbox file of every registered vm, and reports changes to them through
+virtbox.events as they happen, so caches over vm state re-read exactly the
+vms that changed rather than going stale or polling VBoxManage:
+
+    >>> def handler(command, result, kwargs):
+    ...     if command == 'settings_changed':
+    ...         print(kwargs['uuid'], kwargs['path'])
+    >>> virtbox.events.subscribe(handler)
+    >>> watcher = Watcher()
+    >>> watcher.start()
+
+A settings_changed event carries the uuid of the vm whose .vbox file
+changed, or None when VirtualBox.xml did, i.e. vms were registered or
+unregistered. The watched .vbox files follow the machine registry.
+
+On Linux changes are picked up with inotify on the directories holding
+the files, as VirtualBox saves by renaming a new file into place.
+Elsewhere the files are stat'ed in one batch every interval seconds.
+
+:copyright: (c) 2012 by Sean Plaice.
+:license: ISC, see LICENSE for more details.
+
+"""
+
+import os
+import time
+import select
+import struct
+import logging
+import threading
+
+from . import events
+from . import settings
+from .errors import SettingsUnavailable
+from .constants import WATCH_INTERVAL
+
+
+# setup module level logger
+LOGGER = logging.getLogger(__name__)
+
+# inotify(7) event masks
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+
+# struct inotify_event without its trailing name
+INOTIFY_EVENT = struct.Struct('iIII')
+
+# seconds to keep collecting inotify events after the first one, so the
+# several renames of one save are reported once
+SETTLE_DELAY = 0.05
+
+
+def _libc_inotify():
+    """
+    Return libc if it provides inotify, else None.
+    """
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    except (ImportError, OSError):
+        return None
+    if not hasattr(libc, 'inotify_init1'):
+        return None
+    return libc
+
+
+class _Inotify(object):
+    """ Directory watches on an inotify instance.
+    """
+    def __init__(self, libc):
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(_errno(), 'inotify_init1 failed')
+        # directory -> watch descriptor and back
+        self._wds = {}
+        self._dirs = {}
+
+    def watch(self, directories):
+        """
+        Watch exactly directories, missing ones are skipped.
+        """
+        for directory in set(self._wds) - set(directories):
+            self._libc.inotify_rm_watch(self.fd, self._wds.pop(directory))
+        for directory in set(directories) - set(self._wds):
+            wd = self._libc.inotify_add_watch(self.fd,
+                    os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                LOGGER.debug('can not watch %s: %s' % (directory,
+                    os.strerror(_errno())))
+                continue
+            self._wds[directory] = wd
+            self._dirs[wd] = directory
+
+    def read(self, timeout):
+        """
+        Wait up to timeout seconds for events and return the paths they
+        name, or None if the kernel's event queue overflowed.
+        """
+        paths = set()
+        deadline = None
+        while True:
+            wait = timeout if deadline is None else \
+                    max(deadline - time.monotonic(), 0)
+            readable, _, _ = select.select([self.fd], [], [], wait)
+            if not readable:
+                return paths
+            if deadline is None:
+                deadline = time.monotonic() + SETTLE_DELAY
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                continue
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    return None
+                directory = self._dirs.get(wd)
+                if directory is not None and name:
+                    paths.add(os.path.join(directory, os.fsdecode(name)))
+
+    def close(self):
+        """
+        """
+        os.close(self.fd)
+
+
+def _errno():
+    """
+    """
+    import ctypes
+    return ctypes.get_errno()
+
+
+class Watcher(object):
+    """ Reports changes to the VirtualBox settings files.
+
+        registry is the path of VirtualBox.xml, see
+        virtbox.settings.registry_path. With use_inotify False, or where
+        inotify is unavailable, the files are polled every interval
+        seconds. check() runs a single polling pass and can be called
+        without starting the watcher thread.
+    """
+
+    def __init__(self, registry=None, interval=WATCH_INTERVAL,
+            use_inotify=True):
+        self.registry = registry or settings.registry_path()
+        self.interval = interval
+        self._use_inotify = use_inotify
+        self._inotify = None
+        self._thread = None
+        self._stop = threading.Event()
+        # watched path -> vm uuid, None for the registry
+        self._paths = {}
+        # watched path -> (mtime, size), None while missing
+        self._stamps = {}
+        self._track()
+
+    @property
+    def backend(self):
+        """
+        'inotify' or 'poll'.
+        """
+        return 'inotify' if self._inotify is not None else 'poll'
+
+    def paths(self):
+        """
+        Return the watched settings files.
+        """
+        return sorted(self._paths)
+
+    def start(self):
+        """
+        Start watching in a daemon thread.
+        """
+        if self._thread is not None:
+            return
+        libc = _libc_inotify() if self._use_inotify else None
+        if libc is not None:
+            try:
+                self._inotify = _Inotify(libc)
+                self._inotify.watch(self._directories())
+            except OSError as exc:
+                LOGGER.warning('inotify unavailable, polling: %s' % exc)
+                self._inotify = None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                name='virtbox-watch')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop watching and wait for the watcher thread to exit.
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def check(self, paths=None):
+        """
+        Stat paths, by default every watched file, and report those that
+        changed since the last check. Returns the changed paths.
+        """
+        if paths is None:
+            paths = list(self._paths)
+        changed = []
+        for path in paths:
+            if path not in self._paths:
+                continue
+            stamp = _stamp(path)
+            if stamp != self._stamps.get(path):
+                self._stamps[path] = stamp
+                changed.append(path)
+
+        # report the vms first so their files are re-read before a
+        # registry change adds or drops vms
+        for path in sorted(changed, key=lambda p: p == self.registry):
+            uuid = self._paths[path]
+            settings.invalidate(path)
+            if path == self.registry:
+                self._track()
+                if self._inotify is not None:
+                    self._inotify.watch(self._directories())
+            LOGGER.debug('settings changed: %s' % path)
+            events.emit('settings_changed', None, uuid=uuid, path=path)
+        return changed
+
+    def _run(self):
+        """
+        """
+        while not self._stop.is_set():
+            try:
+                if self._inotify is None:
+                    self._stop.wait(self.interval)
+                    self.check()
+                    continue
+                paths = self._inotify.read(self.interval)
+                self.check(None if paths is None else paths)
+            except Exception:
+                LOGGER.exception('settings watcher failed, retrying')
+                self._stop.wait(self.interval)
+
+    def _track(self):
+        """
+        Watch the registry and the .vbox files of the vms it lists.
+        """
+        paths = {self.registry: None}
+        try:
+            for uuid, path in settings.machines(self.registry):
+                paths[path] = uuid
+        except SettingsUnavailable as exc:
+            LOGGER.debug('watching the registry only: %s' % exc)
+        for path in paths:
+            if path not in self._stamps:
+                self._stamps[path] = _stamp(path)
+        for path in set(self._stamps) - set(paths):
+            del self._stamps[path]
+        self._paths = paths
+
+    def _directories(self):
+        """
+        """
+        return set(os.path.dirname(path) for path in self._paths)
+
+
+def _stamp(path):
+    """
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)